@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Time to load a configuration of many tasks: pure Python YAML parsing as
+before the cache, a cold load with libyaml that fills the cache, and a
+warm load from the cache.
+"""
+
+import os
+import sys
+import time
+import yaml
+import tempfile
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import Configuration, cache_path  # noqa: E402
+
+
+cla = ArgumentParser(description=__doc__)
+cla.add_argument("-n", "--tasks", type=int, default=10000)
+
+TASK = """  worker-{index}:
+    command: "sleep {index}"
+    replicas: 2
+    start_timeout: 1
+    restart: always
+    labels:
+      shard: "{shard}"
+    environment:
+      WORKER: "{index}"
+"""
+
+
+def timed(load) -> tuple[float, Configuration]:
+    start = time.perf_counter()
+    configuration = load()
+    return (time.perf_counter() - start, configuration)
+
+
+def uncached(path: str) -> Configuration:
+    with open(path, "rb") as file:
+        data = yaml.load(file, Loader=yaml.SafeLoader)
+    return Configuration.build(data)
+
+
+def main():
+    arguments = cla.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "taskmaster.yaml")
+        with open(path, "w") as file:
+            file.write("tasks:\n")
+            for index in range(arguments.tasks):
+                file.write(TASK.format(index=index, shard=index % 16))
+
+        (before, expected) = timed(lambda: uncached(path))
+        (cold, _) = timed(lambda: Configuration.load(path))
+        (warm, configuration) = timed(lambda: Configuration.load(path))
+        assert configuration == expected
+
+        size = os.path.getsize(cache_path(path)) / 1024 / 1024
+        print(f"{arguments.tasks} tasks")
+        print(f"  SafeLoader, no cache: {before:8.3f}s")
+        print(f"  cold (CSafeLoader):   {cold:8.3f}s")
+        print(f"  warm (cache):         {warm:8.3f}s ({size:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Event loop CPU used while supervising idle `sleep infinity` instances,
+with the central reaper versus one asyncio waiter per process.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import resource
+import threading
+import subprocess
+
+from signal import Signals
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import TaskDescription  # noqa: E402
+from instance import Instance  # noqa: E402
+from spawn import SpawnContext  # noqa: E402
+
+
+cla = ArgumentParser(description=__doc__)
+cla.add_argument("-n", "--instances", type=int, default=5000)
+cla.add_argument("-d", "--duration", type=float, default=10)
+cla.add_argument("mode", choices=["reaper", "asyncio"], nargs="?")
+
+
+def report(mode: str, count: int, spawn: float, cpu: float, duration: float):
+    print(
+        f"{mode:>7}: {count} instances spawned in {spawn:.2f}s, "
+        f"idle loop CPU {cpu / duration * 100:.2f}% "
+        f"({cpu:.3f}s over {duration:.0f}s), "
+        f"{threading.active_count()} threads, "
+        f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} KiB"
+    )
+
+
+async def idle(duration: float) -> float:
+    """CPU time used by the whole process while idling `duration`."""
+
+    # Let the last transitions settle
+    await asyncio.sleep(1)
+    start = time.process_time()
+    await asyncio.sleep(duration)
+    return time.process_time() - start
+
+
+async def with_reaper(count: int, duration: float):
+    desc = TaskDescription.build(
+        {
+            "command": "sleep infinity",
+            "replicas": count,
+            "start_timeout": 1,
+            "shutdown_timeout": 1,
+        }
+    )
+    context = SpawnContext.build("bench", desc)
+    logger = logging.getLogger("bench")
+
+    start = time.perf_counter()
+    instances = [Instance(context, logger) for _ in range(count)]
+    runs = [asyncio.create_task(instance.run()) for instance in instances]
+    while any(
+        not repr(instance.stage).startswith("running")
+        for instance in instances
+    ):
+        await asyncio.sleep(0.1)
+    spawn = time.perf_counter() - start
+
+    cpu = await idle(duration)
+    report("reaper", count, spawn, cpu, duration)
+
+    for instance in instances:
+        instance.shutdown()
+    await asyncio.wait(runs)
+
+
+async def with_asyncio(count: int, duration: float):
+    start = time.perf_counter()
+    processes = [
+        await asyncio.create_subprocess_exec("sleep", "infinity")
+        for _ in range(count)
+    ]
+    # What every stage used to do: a wait task and a should_stop task
+    should_stop = [asyncio.Event() for _ in range(count)]
+    waiters = [
+        asyncio.create_task(process.wait()) for process in processes
+    ] + [asyncio.create_task(event.wait()) for event in should_stop]
+    spawn = time.perf_counter() - start
+
+    cpu = await idle(duration)
+    report("asyncio", count, spawn, cpu, duration)
+
+    for process in processes:
+        process.send_signal(Signals.SIGTERM)
+    for event in should_stop:
+        event.set()
+    await asyncio.wait(waiters)
+
+
+def main():
+    arguments = cla.parse_args()
+    modes = {"reaper": with_reaper, "asyncio": with_asyncio}
+    # Each mode runs in its own interpreter so they do not share watchers
+    if arguments.mode is None:
+        for mode in modes:
+            subprocess.run(
+                [
+                    sys.executable, __file__, mode,
+                    f"--instances={arguments.instances}",
+                    f"--duration={arguments.duration}",
+                ]
+            )
+        return
+
+    run = modes[arguments.mode]
+    asyncio.run(run(arguments.instances, arguments.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Latency of restarting every instance of a task at once, from the restart
+command to each replacement process running.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from events import get_event_bus  # noqa: E402
+from instance import Running  # noqa: E402
+from task_master import TaskMaster  # noqa: E402
+
+
+cla = ArgumentParser(description=__doc__)
+cla.add_argument("-n", "--instances", type=int, default=100)
+cla.add_argument(
+    "-d",
+    "--exit-delay",
+    type=float,
+    default=0.05,
+    help="seconds each process takes to exit once asked to",
+)
+
+CONFIG = """
+tasks:
+  bench:
+    command: "trap 'sleep {exit_delay}; exit 0' TERM; sleep infinity & wait"
+    replicas: {instances}
+    start_timeout: 0
+    shutdown_timeout: 5
+    stdout: /dev/null
+    stderr: /dev/null
+"""
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def wait_running(subscription, count: int, since: float) -> dict:
+    """Time at which each instance got running after `since`."""
+
+    running: dict[int, float] = {}
+    while len(running) < count:
+        transition = await subscription.get()
+        if isinstance(transition.new_stage, Running):
+            running[transition.instance] = time.perf_counter() - since
+    return running
+
+
+async def run(instances: int, exit_delay: float):
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml") as config:
+        config.write(CONFIG.format(instances=instances, exit_delay=exit_delay))
+        config.flush()
+
+        task_master = TaskMaster(logging.getLogger("bench"), config.name)
+        subscription = get_event_bus().subscribe(max_size=instances * 10)
+        running = asyncio.create_task(task_master.run())
+
+        await wait_running(subscription, instances, time.perf_counter())
+
+        start = time.perf_counter()
+        await task_master.restart("bench", [])
+        latencies = await wait_running(subscription, instances, start)
+        values = list(latencies.values())
+        print(
+            f"{instances} parallel restarts "
+            f"({exit_delay * 1000:.0f}ms to exit): "
+            f"p50 {percentile(values, 0.5) * 1000:.1f}ms, "
+            f"p99 {percentile(values, 0.99) * 1000:.1f}ms, "
+            f"max {max(values) * 1000:.1f}ms"
+        )
+
+        subscription.close()
+        await task_master.shutdown()
+        await running
+
+
+def main():
+    arguments = cla.parse_args()
+    asyncio.run(run(arguments.instances, arguments.exit_delay))
+
+
+if __name__ == "__main__":
+    main()
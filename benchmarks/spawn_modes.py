@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Compare spawns per second through `/bin/bash -c` and direct exec."""
+
+import os
+import sys
+import time
+import asyncio
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from config import TaskDescription  # noqa: E402
+from spawn import SpawnContext  # noqa: E402
+
+
+cla = ArgumentParser(description=__doc__)
+cla.add_argument("-n", "--replicas", type=int, default=300)
+cla.add_argument("-c", "--command", type=str, default="true")
+
+
+async def spawn_all(context: SpawnContext, replicas: int) -> float:
+    """Spawn `replicas` processes and reap them, return spawns per second."""
+
+    start = time.perf_counter()
+    processes = await asyncio.gather(
+        *(context.create_subprocess() for _ in range(replicas))
+    )
+    await asyncio.gather(*(process.wait() for process in processes))
+    return replicas / (time.perf_counter() - start)
+
+
+async def run(replicas: int, command: str):
+    for mode in ("shell", "auto"):
+        desc = TaskDescription.build({"command": command, "spawn_mode": mode})
+        rate = await spawn_all(SpawnContext.build("bench", desc), replicas)
+        print(f"{mode:>6}: {rate:8.1f} spawns/s ({replicas} replicas)")
+
+
+def main():
+    arguments = cla.parse_args()
+    asyncio.run(run(arguments.replicas, arguments.command))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the supervisor's hot paths, saved as JSON so that commits can
+be compared:
+
+    benchmarks/suite.py -o before.json
+    benchmarks/suite.py -o after.json --compare before.json
+
+Each scenario runs in its own interpreter, so memory and child processes
+of one do not weigh on the next.
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import platform
+import resource
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from typing import Callable, Optional
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+from config import TaskDescription  # noqa: E402
+from events import get_event_bus  # noqa: E402
+from instance import BackingOff, Instance, Running, Starting  # noqa: E402
+from spawn import SpawnContext  # noqa: E402
+from resources import SAMPLE_TIME, ResourceSampler  # noqa: E402
+from task_master import TaskMaster  # noqa: E402
+
+
+# Relative change past which a result is reported as a regression
+REGRESSION_THRESHOLD = 0.10
+# Reloads of each kind, the median is kept
+RELOAD_REPEATS = 5
+SAMPLE_REPEATS = 5
+# Result names ending like this are better when higher
+HIGHER_IS_BETTER = ("_per_second", "_qps")
+
+cla = ArgumentParser(description=__doc__)
+cla.add_argument("scenarios", nargs="*", help="all of them when none given")
+cla.add_argument("-o", "--output", type=str, help="write the results there")
+cla.add_argument(
+    "-c", "--compare", type=str, help="results of a previous run"
+)
+cla.add_argument("--replicas", type=int, default=500)
+cla.add_argument("--crash-replicas", type=int, default=20)
+cla.add_argument("--restarts", type=int, default=500)
+cla.add_argument("--reload-sizes", type=str, default="100,1000,5000")
+cla.add_argument("--rpc-tasks", type=int, default=50)
+cla.add_argument("--rpc-calls", type=int, default=1000)
+cla.add_argument("--rpc-concurrency", type=int, default=16)
+cla.add_argument("--instances", type=int, default=10000)
+cla.add_argument("--fleet", type=int, default=1000)
+cla.add_argument("--sampled", type=int, default=5000)
+# Run a single scenario and print its results, used by the suite itself
+cla.add_argument("--child", type=str, help=SUPPRESS)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latencies(prefix: str, values: list[float]) -> dict[str, float]:
+    """p50, p99 and max in milliseconds."""
+    return {
+        f"{prefix}_p50_ms": percentile(values, 0.5) * 1000,
+        f"{prefix}_p99_ms": percentile(values, 0.99) * 1000,
+        f"{prefix}_max_ms": max(values) * 1000,
+    }
+
+
+def raise_fd_limit():
+    (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def write_config(directory: str, tasks: dict[str, str]) -> str:
+    path = os.path.join(directory, "taskmaster.yaml")
+    with open(path, "w") as file:
+        file.write("tasks:\n")
+        for name, body in tasks.items():
+            file.write(f"  {name}:\n")
+            for line in body.strip().splitlines():
+                file.write(f"    {line}\n")
+    return path
+
+
+FLEET_TASK = """
+exec: ["sleep", "infinity"]
+replicas: {replicas}
+start_timeout: 0
+shutdown_timeout: 5
+stdout: /dev/null
+stderr: /dev/null
+"""
+
+
+async def wait_for(subscription, count: int, stage: type) -> float:
+    """Time at which `count` instances entered `stage`."""
+
+    seen = 0
+    while seen < count:
+        transition = await subscription.get()
+        if isinstance(transition.new_stage, stage):
+            seen += 1
+    return time.perf_counter()
+
+
+async def start_fleet(directory: str, replicas: int, **options):
+    """A task master running `replicas` idle processes."""
+
+    path = write_config(
+        directory, {"fleet": FLEET_TASK.format(replicas=replicas)}
+    )
+    task_master = TaskMaster(logging.getLogger("bench"), path, **options)
+    subscription = get_event_bus().subscribe(max_size=replicas * 4)
+    start = time.perf_counter()
+    running = asyncio.create_task(task_master.run())
+    end = await wait_for(subscription, replicas, Running)
+    subscription.close()
+    return (task_master, running, end - start)
+
+
+async def spawn_throughput(arguments: Namespace) -> dict[str, float]:
+    """Processes of a single task started per second."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        (task_master, running, elapsed) = await start_fleet(
+            directory, arguments.replicas
+        )
+        await task_master.shutdown()
+        await running
+    return {
+        "spawn_seconds": elapsed,
+        "spawns_per_second": arguments.replicas / elapsed,
+    }
+
+
+CRASHING_TASK = """
+exec: ["false"]
+replicas: {replicas}
+restart: always
+start_timeout: 0
+restart_backoff: {{base: 0, max: 0, jitter: 0}}
+crash_loop: {{max_failures: 1000000000, window: 1, pause: 0}}
+stdout: /dev/null
+stderr: /dev/null
+"""
+
+
+async def crash_loop(arguments: Namespace) -> dict[str, float]:
+    """
+    From a process exiting to its replacement being spawned, without any
+    backoff, while every replica keeps crashing.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_config(
+            directory,
+            {
+                "crash": CRASHING_TASK.format(
+                    replicas=arguments.crash_replicas
+                )
+            },
+        )
+        task_master = TaskMaster(logging.getLogger("bench"), path)
+        subscription = get_event_bus().subscribe(
+            max_size=arguments.restarts * 8
+        )
+        running = asyncio.create_task(task_master.run())
+
+        exited: dict[int, float] = {}
+        values = []
+        start = time.perf_counter()
+        while len(values) < arguments.restarts:
+            transition = await subscription.get()
+            now = time.perf_counter()
+            if isinstance(transition.new_stage, BackingOff):
+                exited[transition.instance] = now
+            elif isinstance(transition.new_stage, Starting):
+                since = exited.pop(transition.instance, None)
+                if since is not None:
+                    values.append(now - since)
+        elapsed = time.perf_counter() - start
+
+        subscription.close()
+        await task_master.shutdown()
+        await running
+
+    results = {
+        "restarts_per_second": len(values) / elapsed,
+    }
+    results.update(latencies("restart", values))
+    return results
+
+
+IDLE_TASK = """
+exec: ["sleep", "{index}"]
+start_on_launch: false
+labels: {{shard: "{shard}"}}
+environment: {{INDEX: "{index}"}}
+"""
+
+
+async def reload_latency(arguments: Namespace) -> dict[str, float]:
+    """Reloads of configurations of growing size, unchanged or not."""
+
+    results = {}
+    for size in map(int, arguments.reload_sizes.split(",")):
+        with tempfile.TemporaryDirectory() as directory:
+            tasks = {
+                f"task-{index}": IDLE_TASK.format(
+                    index=index, shard=index % 16
+                )
+                for index in range(size)
+            }
+            path = write_config(directory, tasks)
+            task_master = TaskMaster(logging.getLogger("bench"), path)
+            running = asyncio.create_task(task_master.run())
+            # Not timed, waits for every task to have started
+            await task_master.reload()
+
+            async def timed_reload(change: Callable[[int], None]) -> float:
+                """Median of a few reloads, each after `change`."""
+                values = []
+                for attempt in range(RELOAD_REPEATS):
+                    change(attempt)
+                    start = time.perf_counter()
+                    await task_master.reload()
+                    values.append(time.perf_counter() - start)
+                return percentile(values, 0.5) * 1000
+
+            def touch(attempt: int):
+                # Same contents, but a new modification time
+                mtime = time.time_ns() + (attempt + 1) * 1_000_000
+                os.utime(path, ns=(mtime, mtime))
+
+            def edit(attempt: int):
+                index = size + attempt
+                tasks["task-0"] = IDLE_TASK.format(index=index, shard=0)
+                write_config(directory, tasks)
+
+            results[f"reload_{size}_unchanged_ms"] = await timed_reload(touch)
+            results[f"reload_{size}_one_changed_ms"] = await timed_reload(edit)
+
+            await task_master.shutdown()
+            await running
+    return results
+
+
+RPC_TASK = """
+exec: ["sleep", "infinity"]
+replicas: 2
+start_timeout: 0
+labels: {{tier: "{tier}"}}
+stdout: /dev/null
+stderr: /dev/null
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def rpc_calls(arguments: Namespace) -> dict[str, float]:
+    """Latency and throughput of a daemon's RPCs, from another process."""
+
+    import rpc
+
+    with tempfile.TemporaryDirectory() as directory:
+        tasks = {
+            f"task-{index}": RPC_TASK.format(tier=index % 4)
+            for index in range(arguments.rpc_tasks)
+        }
+        path = write_config(directory, tasks)
+        port = free_port()
+        command = [
+            sys.executable, os.path.join(SRC, "server.py"), path,
+            f"--port={port}", "--log-level=ERROR",
+        ]
+        if os.geteuid() == 0:
+            command.append("--allow-root")
+        server = subprocess.Popen(command)
+
+        results = {}
+        try:
+            client = wait_until_ready(port, arguments.rpc_tasks)
+            selector = rpc.Selector(pattern="task-*", labels="tier=1")
+            calls: dict[str, Callable[[], object]] = {
+                "status": lambda: client.snapshot([]),
+                "list": lambda: client.list(),
+                # Already running, so nothing changes
+                "batch": lambda: client.batch(rpc.Action.START, [selector]),
+            }
+            for name, call in calls.items():
+                results.update(measure_rpc(name, call, arguments))
+            client.shutdown()
+            server.wait(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.kill()
+                server.wait()
+    return results
+
+
+def wait_until_ready(port: int, tasks: int):
+    """
+    A client of the daemon once all its processes run. Connecting before
+    it listens would leave the channel backing off for seconds.
+    """
+
+    import rpc
+
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("localhost", port)).close()
+            break
+        except ConnectionRefusedError:
+            if deadline < time.monotonic():
+                raise TimeoutError("The daemon did not listen in time")
+            time.sleep(0.05)
+
+    client = rpc.Client(port=port)
+    while time.monotonic() < deadline:
+        snapshot = client.snapshot([])
+        instances = [i for t in snapshot.tasks for i in t.instances]
+        if len(snapshot.tasks) == tasks and all(
+            instance.pid != 0 for instance in instances
+        ):
+            return client
+        time.sleep(0.1)
+    raise TimeoutError("The daemon did not start its tasks in time")
+
+
+def measure_rpc(
+    name: str, call: Callable[[], object], arguments: Namespace
+) -> dict[str, float]:
+    # Warm up the channel and the server's handlers
+    for _ in range(10):
+        call()
+
+    values = []
+    for _ in range(arguments.rpc_calls):
+        start = time.perf_counter()
+        call()
+        values.append(time.perf_counter() - start)
+    results = latencies(f"rpc_{name}", values)
+
+    # Several clients at once, each waiting for its answer
+    remaining = [arguments.rpc_calls]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            call()
+
+    threads = [
+        threading.Thread(target=worker)
+        for _ in range(arguments.rpc_concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results[f"rpc_{name}_qps"] = (
+        arguments.rpc_calls / (time.perf_counter() - start)
+    )
+    return results
+
+
+async def instance_memory(arguments: Namespace) -> dict[str, float]:
+    """Python memory held by each idle `Instance` and its running loop."""
+
+    desc = TaskDescription.build(
+        {
+            "exec": ["true"],
+            "replicas": arguments.instances,
+            "start_on_launch": False,
+        }
+    )
+    context = SpawnContext.build("bench", desc)
+    logger = logging.getLogger("bench")
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [
+        Instance(context, logger) for _ in range(arguments.instances)
+    ]
+    created = tracemalloc.get_traced_memory()[0]
+    runs = [asyncio.create_task(instance.run()) for instance in instances]
+    # Let every loop reach its first wait
+    await asyncio.sleep(0.1)
+    gc.collect()
+    parked = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    for instance in instances:
+        instance.shutdown()
+    await asyncio.wait(runs)
+
+    return {
+        "instance_bytes": (created - before) / arguments.instances,
+        "instance_running_bytes": (parked - before) / arguments.instances,
+    }
+
+
+async def fleet_shutdown(arguments: Namespace) -> dict[str, float]:
+    """From the shutdown command to every process reaped."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        (task_master, running, _) = await start_fleet(
+            directory, arguments.fleet
+        )
+        start = time.perf_counter()
+        await task_master.shutdown()
+        await running
+        elapsed = time.perf_counter() - start
+    return {"shutdown_seconds": elapsed}
+
+
+async def resource_sampling(arguments: Namespace) -> dict[str, float]:
+    """Event loop and worker thread time of a /proc sample of a fleet."""
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Sampled by hand only
+        (task_master, running, _) = await start_fleet(
+            directory, arguments.sampled, sample_interval=0
+        )
+        sampler = ResourceSampler(task_master.processes)
+        (loop, read) = (SAMPLE_TIME.labels("loop"), SAMPLE_TIME.labels("read"))
+        (loop_times, read_times) = ([], [])
+        for _ in range(SAMPLE_REPEATS):
+            (loop_before, read_before) = (loop.sum, read.sum)
+            await sampler.sample_all()
+            loop_times.append(loop.sum - loop_before)
+            read_times.append(read.sum - read_before)
+        await task_master.shutdown()
+        await running
+    return {
+        **latencies("sample_loop", loop_times),
+        "sample_read_ms": percentile(read_times, 0.5) * 1000,
+    }
+
+
+SCENARIOS: dict[str, Callable] = {
+    "spawn_throughput": spawn_throughput,
+    "crash_loop": crash_loop,
+    "reload_latency": reload_latency,
+    "rpc": rpc_calls,
+    "instance_memory": instance_memory,
+    "fleet_shutdown": fleet_shutdown,
+    "resource_sampling": resource_sampling,
+}
+
+
+def run_child(arguments: Namespace):
+    logging.basicConfig(level=logging.ERROR)
+    raise_fd_limit()
+    scenario = SCENARIOS[arguments.child]
+    if asyncio.iscoroutinefunction(scenario):
+        results = asyncio.run(scenario(arguments))
+    else:
+        results = scenario(arguments)
+    results["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(results))
+
+
+def run_scenario(name: str) -> Optional[dict[str, float]]:
+    command = [
+        sys.executable, __file__, *options(sys.argv[1:]), f"--child={name}"
+    ]
+    process = subprocess.run(command, stdout=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        print(f"{name}: failed with {process.returncode}", file=sys.stderr)
+        return None
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def options(argv: list[str]) -> list[str]:
+    """The scenario parameters among `argv`, what a child needs."""
+
+    arguments = cla.parse_args(argv)
+    defaults = cla.parse_args([])
+    return [
+        f"--{name.replace('_', '-')}={value}"
+        for name, value in vars(arguments).items()
+        if name not in ("scenarios", "output", "compare", "child")
+        and value != getattr(defaults, name)
+    ]
+
+
+def git_commit() -> str:
+    process = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    return process.stdout.strip()
+
+
+def compare(results: dict, baseline: dict):
+    commit = baseline.get("commit", "?")[:12]
+    print(f"\nCompared to {commit}, positive is worse:")
+    for scenario, values in results["results"].items():
+        previous = baseline.get("results", {}).get(scenario, {})
+        for name, value in values.items():
+            before = previous.get(name)
+            if not before or name == "max_rss_kib":
+                continue
+            change = (value - before) / before
+            if name.endswith(HIGHER_IS_BETTER):
+                change = -change
+            mark = "REGRESSION" if REGRESSION_THRESHOLD < change else ""
+            print(
+                f"  {scenario}.{name}: {before:.4g} -> {value:.4g}"
+                f" ({change * 100:+.1f}%) {mark}".rstrip()
+            )
+
+
+def main():
+    arguments = cla.parse_args()
+    if arguments.child is not None:
+        run_child(arguments)
+        return
+
+    names = arguments.scenarios or list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            cla.error(f"unknown scenario {name}, one of {list(SCENARIOS)}")
+
+    results = {
+        "commit": git_commit(),
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            name: value
+            for name, value in vars(arguments).items()
+            if name not in ("scenarios", "output", "compare", "child")
+        },
+        "results": {},
+    }
+    for name in names:
+        values = run_scenario(name)
+        if values is None:
+            continue
+        results["results"][name] = values
+        print(name)
+        for key, value in values.items():
+            print(f"  {key}: {value:.4g}")
+
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import os
+import errno
+import signal
+import asyncio
+import logging
+
+from typing import Optional
+from config import CgroupLimits
+
+
+logger = logging.getLogger(__name__)
+
+# Controllers the limits need, enabled for the tasks when available
+CONTROLLERS = ("cpu", "memory", "pids")
+# Leaf taskmaster moves itself to, a group with children cannot have
+# processes of its own
+SUPERVISOR_GROUP = "supervisor"
+TASK_PREFIX = "task-"
+# Microseconds, the kernel's default
+CPU_PERIOD = 100000
+AUTO = "auto"
+NONE = "none"
+# Set by systemd on the groups of units with `Delegate=yes`, since 251
+DELEGATE_XATTRS = ("trusted.delegate", "user.delegate")
+# Seconds to wait for killed processes to leave a group before removing it
+DRAIN_TIMEOUT = 1.0
+DRAIN_POLL = 0.02
+
+
+def read_text(path: str) -> str:
+    with open(path) as file:
+        return file.read()
+
+
+def write_text(path: str, value: str):
+    with open(path, "w") as file:
+        file.write(value)
+
+
+def read_keyed(path: str) -> dict[str, int]:
+    """Files such as `cpu.stat`, a key and a number per line."""
+
+    values = {}
+    for line in read_text(path).splitlines():
+        (key, _, value) = line.partition(" ")
+        if value.isdigit():
+            values[key] = int(value)
+    return values
+
+
+def cgroup2_mount() -> Optional[str]:
+    with open("/proc/self/mountinfo") as file:
+        for line in file:
+            (mount, _, filesystem) = line.partition(" - ")
+            if filesystem.startswith("cgroup2 "):
+                return mount.split()[4]
+    return None
+
+
+def own_cgroup() -> Optional[str]:
+    """Path of our cgroup in the v2 hierarchy."""
+    with open("/proc/self/cgroup") as file:
+        for line in file:
+            if line.startswith("0::"):
+                return line[3:].strip()
+    return None
+
+
+def group_name(task: str) -> str:
+    # Anything but a slash makes a valid directory name
+    return TASK_PREFIX + task.replace("/", "_")
+
+
+class CgroupStats:
+    """Accounting of a group and everything below it."""
+
+    __slots__ = (
+        "cpu_seconds",
+        "throttled_seconds",
+        "throttled_periods",
+        "memory_bytes",
+        "memory_high",
+        "memory_max",
+        "oom",
+        "oom_kill",
+    )
+
+    cpu_seconds: float
+    throttled_seconds: float
+    throttled_periods: int
+    memory_bytes: int
+    # Times the memory went over `memory.high` or about to go over
+    # `memory.max`
+    memory_high: int
+    memory_max: int
+    oom: int
+    oom_kill: int
+
+    def __init__(self, path: str):
+        cpu = read_keyed(os.path.join(path, "cpu.stat"))
+        self.cpu_seconds = cpu.get("usage_usec", 0) / 1e6
+        self.throttled_seconds = cpu.get("throttled_usec", 0) / 1e6
+        self.throttled_periods = cpu.get("nr_throttled", 0)
+
+        # Without the memory controller
+        self.memory_bytes = 0
+        events: dict[str, int] = {}
+        try:
+            self.memory_bytes = int(
+                read_text(os.path.join(path, "memory.current"))
+            )
+            events = read_keyed(os.path.join(path, "memory.events"))
+        except FileNotFoundError:
+            pass
+        self.memory_high = events.get("high", 0)
+        self.memory_max = events.get("max", 0)
+        self.oom = events.get("oom", 0)
+        self.oom_kill = events.get("oom_kill", 0)
+
+
+class TaskGroup:
+    """
+    The cgroup of a task, with one group per replica below it that its
+    processes join before exec. Limits apply to each replica, surge
+    replacements share theirs with the instance they replace.
+    """
+
+    path: str
+    controllers: frozenset[str]
+    limits: CgroupLimits
+    # Replica groups created so far
+    replicas: set[int]
+    # Latest accounting, read by the resource sampler
+    stats: Optional[CgroupStats]
+    # Limits already warned about, their controller is not available
+    ignored: set[str]
+    logger: logging.Logger
+
+    def __init__(
+        self,
+        path: str,
+        controllers: frozenset[str],
+        limits: CgroupLimits,
+        logger: logging.Logger,
+    ):
+        self.path = path
+        self.controllers = controllers
+        self.limits = limits
+        self.replicas = set()
+        self.stats = None
+        self.ignored = set()
+        self.logger = logger
+        enable_controllers(path, controllers)
+
+    def replica_path(self, replica: int) -> str:
+        return os.path.join(self.path, str(replica))
+
+    def procs(self, replica: int) -> str:
+        """`cgroup.procs` of a replica's group, created if need be."""
+
+        path = self.replica_path(replica)
+        if replica not in self.replicas:
+            os.makedirs(path, exist_ok=True)
+            self.replicas.add(replica)
+            self.apply_limits(path)
+        return procs_path(path)
+
+    def configure(self, limits: CgroupLimits):
+        """New limits, applied to the running processes right away."""
+
+        if limits == self.limits:
+            return
+        self.limits = limits
+        for replica in self.replicas:
+            self.apply_limits(self.replica_path(replica))
+
+    def apply_limits(self, path: str):
+        limits = self.limits
+        # Whether each one was asked for, and what to write
+        values = (
+            ("cpu", "cpu.max", limits.cpu_max, cpu_max(limits.cpu_max)),
+            (
+                "memory",
+                "memory.high",
+                limits.memory_high,
+                limit(limits.memory_high),
+            ),
+            (
+                "memory",
+                "memory.max",
+                limits.memory_max,
+                limit(limits.memory_max),
+            ),
+            ("pids", "pids.max", limits.pids_max, limit(limits.pids_max)),
+        )
+        for controller, name, wanted, value in values:
+            if controller not in self.controllers:
+                if wanted is not None and name not in self.ignored:
+                    self.ignored.add(name)
+                    self.logger.warning(
+                        f"{name} ignored, no {controller} controller"
+                    )
+                continue
+            try:
+                write_text(os.path.join(path, name), value)
+            except OSError as error:
+                self.logger.error(f"Cannot set {name} to {value}: {error}")
+
+    def read_stats(self):
+        """Runs on the resource sampler's worker thread."""
+        try:
+            self.stats = CgroupStats(self.path)
+        except (OSError, ValueError):
+            self.stats = None
+
+    async def prune(self, replicas: int):
+        """
+        Remove the groups of the replicas past `replicas`, once their
+        instances are gone. Whatever is still in them escaped the process
+        group of its instance and is killed.
+        """
+
+        for replica in sorted(self.replicas):
+            if replicas < replica:
+                path = self.replica_path(replica)
+                if remove_group(path):
+                    self.replicas.discard(replica)
+                    continue
+                killed = kill_all(path)
+                if killed != 0:
+                    self.logger.warning(
+                        f"Killed {killed} processes left behind by"
+                        f" replica {replica}"
+                    )
+                if await drain(path) and remove_group(path):
+                    self.replicas.discard(replica)
+
+    async def remove(self):
+        await self.prune(0)
+        remove_group(self.path)
+
+
+def limit(value: Optional[int]) -> str:
+    return "max" if value is None else str(value)
+
+
+def cpu_max(cpus: Optional[float]) -> str:
+    """Quota and period, the kernel takes no quota under 1ms."""
+    if cpus is None:
+        return f"max {CPU_PERIOD}"
+    return f"{max(1000, int(cpus * CPU_PERIOD))} {CPU_PERIOD}"
+
+
+def remove_group(path: str) -> bool:
+    """False while processes are left in it."""
+
+    try:
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError as error:
+        if error.errno != errno.EBUSY:
+            logger.warning(f"Cannot remove cgroup {path}: {error}")
+        return False
+    return True
+
+
+def kill_all(path: str) -> int:
+    """SIGKILL every process of a group, how many there were."""
+
+    try:
+        pids = [int(pid) for pid in read_text(procs_path(path)).split()]
+    except (OSError, ValueError):
+        return 0
+    if len(pids) == 0:
+        return 0
+    try:
+        # Atomic, nothing can fork its way out of it
+        write_text(os.path.join(path, "cgroup.kill"), "1")
+        return len(pids)
+    except OSError:
+        pass
+    # Kernels before 5.14
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    return len(pids)
+
+
+async def drain(path: str) -> bool:
+    """Wait for a group to be empty, False if it still is not in time."""
+
+    events = os.path.join(path, "cgroup.events")
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DRAIN_TIMEOUT
+    while True:
+        try:
+            if read_keyed(events).get("populated", 0) == 0:
+                return True
+        except OSError:
+            return True
+        if deadline <= loop.time():
+            return False
+        await asyncio.sleep(DRAIN_POLL)
+
+
+def procs_path(path: str) -> str:
+    return os.path.join(path, "cgroup.procs")
+
+
+def is_delegated(path: str) -> bool:
+    for name in DELEGATE_XATTRS:
+        try:
+            if os.getxattr(path, name) == b"1":
+                return True
+        except OSError:
+            pass
+    return False
+
+
+def enable_controllers(path: str, controllers: frozenset[str]):
+    subtree_control = os.path.join(path, "cgroup.subtree_control")
+    for controller in controllers:
+        write_text(subtree_control, f"+{controller}")
+
+
+class CgroupTree:
+    """
+    The cgroup subtree delegated to taskmaster, a group per task in it.
+
+    With `auto`, it is the group taskmaster was started in, only when
+    systemd marked it as delegated to us (`Delegate=yes`): any other group
+    belongs to someone else, such as a user's session. Taskmaster then
+    moves itself to a leaf of it.
+    """
+
+    path: str
+    # Enabled for the task groups
+    controllers: frozenset[str]
+
+    def __init__(self, path: str, controllers: frozenset[str]):
+        self.path = path
+        self.controllers = controllers
+
+    @staticmethod
+    def create(where: str = AUTO) -> Optional[CgroupTree]:
+        """None when no subtree is available, tasks run without one."""
+
+        if where == NONE:
+            return None
+        try:
+            return CgroupTree.delegated(where)
+        except OSError as error:
+            logger.warning(f"Not using cgroups: {error}")
+            return None
+
+    @staticmethod
+    def delegated(where: str) -> Optional[CgroupTree]:
+        mount = cgroup2_mount()
+        own = own_cgroup()
+        if mount is None or own is None:
+            logger.info("Not using cgroups: no cgroup v2 hierarchy")
+            return None
+        current = os.path.join(mount, own.lstrip("/"))
+
+        if where == AUTO:
+            if own == "/" or not is_delegated(current):
+                logger.info("Not using cgroups: no subtree delegated to us")
+                return None
+            path = current
+        else:
+            path = os.path.abspath(where)
+            os.makedirs(path, exist_ok=True)
+
+        for name in ("cgroup.procs", "cgroup.subtree_control"):
+            if not os.access(os.path.join(path, name), os.W_OK):
+                logger.info(f"Not using cgroups: {path} is not ours")
+                return None
+
+        if os.path.samefile(path, current):
+            # No processes in a group with controllers enabled for children
+            leaf = os.path.join(path, SUPERVISOR_GROUP)
+            os.makedirs(leaf, exist_ok=True)
+            write_text(os.path.join(leaf, "cgroup.procs"), "0")
+
+        available = read_text(os.path.join(path, "cgroup.controllers"))
+        wanted = frozenset(available.split()).intersection(CONTROLLERS)
+        try:
+            enable_controllers(path, wanted)
+        except OSError as error:
+            logger.warning(f"Cannot enable cgroup controllers: {error}")
+        enabled = frozenset(
+            read_text(os.path.join(path, "cgroup.subtree_control")).split()
+        )
+        controllers = wanted & enabled
+        logger.info(
+            f"Tasks in cgroups under {path}, controllers:"
+            f" {', '.join(sorted(controllers)) or 'none'}"
+        )
+        return CgroupTree(path, controllers)
+
+    def task_group(
+        self, name: str, limits: CgroupLimits, logger: logging.Logger
+    ) -> Optional[TaskGroup]:
+        path = os.path.join(self.path, group_name(name))
+        try:
+            os.makedirs(path, exist_ok=True)
+            return TaskGroup(path, self.controllers, limits, logger)
+        except OSError as error:
+            logger.error(f"Running without a cgroup: {error}")
+            return None
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import os
+import ctypes
+import platform
+import resource
+import ctypes.util
+
+from functools import partial
+from typing import Callable, Optional
+from config import IoClass, TaskDescription, rlimit_constant
+from cgroups import TaskGroup
+
+
+# `ioprio_set` has no wrapper in the libc nor in `os`
+IOPRIO_SET = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "riscv64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "s390x": 282,
+}
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASSES = {
+    IoClass.REALTIME: 1,
+    IoClass.BEST_EFFORT: 2,
+    IoClass.IDLE: 3,
+}
+
+
+class ChildSetupError(Exception):
+    pass
+
+
+def load_syscall() -> Optional[Callable[..., int]]:
+    name = ctypes.util.find_library("c")
+    if name is None:
+        return None
+    return ctypes.CDLL(name, use_errno=True).syscall
+
+
+class ChildSetup:
+    """
+    Cgroup, scheduling and limits applied to a spawned process between
+    fork and exec, so that it never runs without them.
+
+    Everything is computed and checked once, when the spawn context is
+    built, and the cgroup is opened by the parent: the child only makes a
+    few system calls, as little Python as a `preexec_fn` in a threaded
+    process can afford. Only tasks asking for any of them pay for it, a
+    `preexec_fn` keeps `subprocess` from spawning with vfork.
+    """
+
+    __slots__ = (
+        "cpu_sets",
+        "nice",
+        "ioprio",
+        "rlimits",
+        "syscall",
+        "ioprio_set",
+        "cgroup",
+        "error",
+    )
+
+    # One per replica, round-robin, empty to leave the affinity alone
+    cpu_sets: list[frozenset[int]]
+    nice: Optional[int]
+    # Class and level as `ioprio_set` takes them
+    ioprio: Optional[int]
+    # Name, constant from `resource`, soft and hard limit
+    rlimits: list[tuple[str, int, int, int]]
+    syscall: Optional[Callable[..., int]]
+    # System call number, None where unknown
+    ioprio_set: Optional[int]
+    cgroup: Optional[TaskGroup]
+    # What is bound to fail in the child, raised on every spawn
+    error: Optional[ChildSetupError]
+
+    def __init__(self, desc: TaskDescription, cgroup: Optional[TaskGroup]):
+        self.cgroup = cgroup
+        self.cpu_sets = []
+        if desc.cpu_affinity is not None:
+            affinity = desc.cpu_affinity
+            cpus = affinity.cpus
+            if cpus is None:
+                cpus = sorted(os.sched_getaffinity(0))
+            if affinity.spread:
+                self.cpu_sets = [frozenset([cpu]) for cpu in cpus]
+            else:
+                self.cpu_sets = [frozenset(cpus)]
+
+        self.nice = desc.nice
+
+        self.ioprio = None
+        self.syscall = None
+        self.ioprio_set = None
+        if desc.ionice is not None:
+            io_class = IOPRIO_CLASSES[desc.ionice.io_class]
+            self.ioprio = io_class << IOPRIO_CLASS_SHIFT | desc.ionice.level
+            self.syscall = load_syscall()
+            self.ioprio_set = IOPRIO_SET.get(platform.machine())
+
+        self.rlimits = [
+            (name, getattr(resource, rlimit_constant(name)), soft, hard)
+            for name, (soft, hard) in desc.rlimits.items()
+        ]
+
+        self.error = None
+        try:
+            self.check()
+        except ChildSetupError as error:
+            self.error = error
+
+    @staticmethod
+    def build(
+        desc: TaskDescription, cgroup: Optional[TaskGroup] = None
+    ) -> Optional[ChildSetup]:
+        """None when there is nothing of the kind to do."""
+
+        uses_any = (
+            cgroup is not None
+            or desc.cpu_affinity is not None
+            or desc.nice is not None
+            or desc.ionice is not None
+            or len(desc.rlimits) != 0
+        )
+        return ChildSetup(desc, cgroup) if uses_any else None
+
+    def check(self):
+        """What is bound to fail in the child, which cannot say why."""
+
+        available = os.sched_getaffinity(0)
+        for cpus in self.cpu_sets:
+            if not cpus <= available:
+                missing = ", ".join(map(str, sorted(cpus - available)))
+                raise ChildSetupError(f"CPUs {missing} are not available")
+
+        if self.ioprio is not None:
+            if self.syscall is None:
+                raise ChildSetupError("ionice needs the C library")
+            if self.ioprio_set is None:
+                raise ChildSetupError(
+                    f"ionice is not supported on {platform.machine()}"
+                )
+
+        if os.geteuid() != 0:
+            for name, limit, _, hard in self.rlimits:
+                (_, allowed) = resource.getrlimit(limit)
+                above = hard == resource.RLIM_INFINITY or allowed < hard
+                if allowed != resource.RLIM_INFINITY and above:
+                    raise ChildSetupError(
+                        f"Cannot raise the hard {name} limit past {allowed}"
+                    )
+
+    def prepare(
+        self, replica: int
+    ) -> tuple[Callable[[], None], Optional[int]]:
+        """
+        What the child of a replica runs before exec, and the descriptor
+        of its cgroup's `cgroup.procs` to close once it is spawned.
+        """
+
+        if self.error is not None:
+            raise self.error
+        cpus = None
+        if len(self.cpu_sets) != 0:
+            cpus = self.cpu_sets[(replica - 1) % len(self.cpu_sets)]
+        procs = None
+        if self.cgroup is not None:
+            # Closed on exec, and by `close_fds` in any other child
+            procs = os.open(
+                self.cgroup.procs(replica), os.O_WRONLY | os.O_CLOEXEC
+            )
+        return (partial(self.apply, procs, cpus), procs)
+
+    def apply(self, procs: Optional[int], cpus: Optional[frozenset[int]]):
+        """Runs in the child, between fork and exec."""
+
+        try:
+            if procs is not None:
+                # 0 moves the writer, along with whatever it spawns later
+                os.write(procs, b"0")
+            if cpus is not None:
+                os.sched_setaffinity(0, cpus)
+            if self.nice is not None:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            # Never without the C library once checked
+            if self.ioprio is not None and self.syscall is not None:
+                result = self.syscall(
+                    self.ioprio_set, IOPRIO_WHO_PROCESS, 0, self.ioprio
+                )
+                if result < 0:
+                    error = ctypes.get_errno()
+                    raise OSError(error, f"ioprio_set: {os.strerror(error)}")
+            for _, limit, soft, hard in self.rlimits:
+                resource.setrlimit(limit, (soft, hard))
+        except OSError as error:
+            # Only "Exception occurred in preexec_fn" reaches the parent
+            message = f"taskmaster: cannot set up the process: {error}\n"
+            os.write(2, message.encode())
+            raise
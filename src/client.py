@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 
+import sys
 import rpc
 import grpc
 import readline
 import platform
 import os
+import time
 from typing import List
 
 
@@ -25,8 +27,14 @@ commands = [
     "stop",
     "restart",
     "status",
+    "tail",
+    "watch",
     "reload",
     "list",
+    "metrics",
+    "tasks",
+    "profile",
+    "slow",
     "shutdown",
     "quit",
 ]
@@ -99,6 +107,277 @@ class CompletionEngine:
         else:
             return None
 
+def tail(client: rpc.Client, task: str, arguments: List[str]):
+    """tail <task> [instance] [-f] [-n lines]"""
+
+    follow = "-f" in arguments
+    arguments = [argument for argument in arguments if argument != "-f"]
+    lines = 10
+    if "-n" in arguments:
+        index = arguments.index("-n")
+        lines = int(arguments[index + 1])
+        del arguments[index: index + 2]
+    instance = int(arguments[0]) if len(arguments) != 0 else 1
+
+    try:
+        if not follow:
+            for data in client.tail(task, instance, lines):
+                sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+            return
+
+        stream = client.follow(task, instance, lines)
+        try:
+            for output in stream:
+                sys.stdout.buffer.write(output.data)
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            stream.cancel()
+            print()
+    except grpc.RpcError as error:
+        if error.code() == grpc.StatusCode.UNAVAILABLE:
+            raise
+        printError(error.details())
+
+
+def describe_usage(usage) -> str:
+    return (
+        f"cpu {usage.cpu_percent:.1f}% ({usage.cpu_seconds:.2f}s),"
+        f" rss {usage.rss_bytes / 1024 / 1024:.1f} MiB,"
+        f" {usage.fds} fds, {usage.threads} threads"
+    )
+
+
+def describe_cgroup(stats) -> str:
+    description = f"cgroup: cpu {stats.cpu_seconds:.2f}s"
+    if stats.memory_bytes != 0:
+        description += f", memory {stats.memory_bytes / 1024 / 1024:.1f} MiB"
+    if stats.throttled_periods != 0:
+        description += f", throttled {stats.throttled_seconds:.2f}s"
+    if stats.oom_kill != 0:
+        description += f", {stats.oom_kill} oom kills"
+    return description
+
+
+def status(client: rpc.Client, tasks: List[str]):
+    """status [task...], every instance in a single request"""
+
+    snapshot = client.snapshot(tasks)
+    for task in snapshot.tasks:
+        breaker = f" ({task.breaker})" if task.breaker else ""
+        rollout = f" ({task.rollout})" if task.rollout else ""
+        cgroup = ""
+        if task.HasField("cgroup"):
+            cgroup = f" [{describe_cgroup(task.cgroup)}]"
+        print(f"{task.name}{breaker}{rollout}{cgroup}:")
+        for instance in task.instances:
+            exit_code = ""
+            if instance.HasField("last_exit_code"):
+                exit_code = f", last exit code {instance.last_exit_code}"
+            usage = ""
+            if instance.HasField("resources"):
+                usage = f", {describe_usage(instance.resources)}"
+            print(
+                f"\t{instance.id}: {instance.description}"
+                f" ({instance.restarts} restarts{exit_code}{usage})"
+            )
+    for name in snapshot.unknown:
+        printError("Unknown task:", name)
+
+
+def watch(client: rpc.Client, tasks: List[str]):
+    """watch [task...], until interrupted"""
+
+    stream = client.watch(tasks)
+    try:
+        for event in stream:
+            if event.HasField("snapshot"):
+                for name in event.snapshot.unknown:
+                    printError("Unknown task:", name)
+                for task in event.snapshot.tasks:
+                    for instance in task.instances:
+                        print(
+                            f"{task.name}:{instance.id}"
+                            f" {instance.description}"
+                        )
+                continue
+
+            transition = event.transition
+            lost = transition.dropped + transition.coalesced
+            if lost != 0:
+                print(
+                    f"{Colors.YELLOW}[{lost} transitions missed]"
+                    f"{Colors.RESET}"
+                )
+            timestamp = time.strftime(
+                "%H:%M:%S", time.localtime(transition.time)
+            )
+            print(
+                f"{timestamp} {transition.task}:{transition.instance}"
+                f" {transition.description}"
+            )
+    except KeyboardInterrupt:
+        stream.cancel()
+        print()
+
+
+def reload(client: rpc.Client):
+    result = client.reload()
+    if result.error != "":
+        printError("Could not reload:", result.error)
+        return
+    for label, names in (
+        ("added", result.added),
+        ("removed", result.removed),
+        ("changed", result.changed),
+    ):
+        if len(names) != 0:
+            print(f"{label}: {', '.join(names)}")
+    print(f"unchanged: {result.unchanged} tasks")
+
+
+def tasks(client: rpc.Client):
+    """Every asyncio task of the daemon with its stack."""
+
+    for dump in client.tasks().tasks:
+        print(f"{Colors.CYAN}{dump.name}{Colors.RESET} {dump.coroutine}")
+        print(dump.stack)
+
+
+def profile(client: rpc.Client, arguments: List[str]):
+    """profile [seconds] [file], collapsed stacks to a file or stdout"""
+
+    seconds = float(arguments[0]) if len(arguments) != 0 else 5
+    result = client.profile(seconds)
+    if len(arguments) < 2:
+        print(result.collapsed, end="")
+        return
+    with open(arguments[1], "w") as file:
+        file.write(result.collapsed)
+    print(f"{result.samples} samples written to {arguments[1]}")
+
+
+def slow(client: rpc.Client, arguments: List[str]):
+    """slow [threshold] [reset], slowest event loop callbacks"""
+
+    reset = "reset" in arguments
+    arguments = [argument for argument in arguments if argument != "reset"]
+    threshold = float(arguments[0]) if len(arguments) != 0 else 0
+    result = client.slow_callbacks(threshold, reset)
+    print(
+        f"{result.count} callbacks slower than"
+        f" {result.threshold * 1000:g}ms"
+    )
+    for callback in result.callbacks:
+        timestamp = time.strftime(
+            "%H:%M:%S", time.localtime(callback.time)
+        )
+        print(
+            f"{timestamp} {callback.duration * 1000:8.1f}ms"
+            f" {callback.callback}"
+        )
+
+
+ACTIONS = {
+    "start": rpc.Action.START,
+    "stop": rpc.Action.STOP,
+    "restart": rpc.Action.RESTART,
+}
+
+
+def is_batch(arguments: List[str]) -> bool:
+    """Anything but a single task name followed by instance ids."""
+    if len(arguments) == 0:
+        # A bare stop is a mistake rather than a way to stop everything
+        return False
+    if arguments[0] == "-l":
+        return True
+    if any(character in arguments[0] for character in "*?["):
+        return True
+    return not all(argument.isdigit() for argument in arguments[1:])
+
+
+def batch(client: rpc.Client, action: str, arguments: List[str]):
+    """start|stop|restart <name or glob>... [-l label selector]"""
+
+    labels = ""
+    if "-l" in arguments:
+        index = arguments.index("-l")
+        if len(arguments) <= index + 1:
+            printError("Missing label selector after -l")
+            return
+        labels = arguments[index + 1]
+        del arguments[index: index + 2]
+    if len(arguments) == 0 and labels.strip(" ,") == "":
+        printError("Nothing selected, use * for every task")
+        return
+    # The labels alone select among every task
+    patterns = arguments if len(arguments) != 0 else [""]
+
+    targets = [
+        rpc.Selector(pattern=pattern, labels=labels) for pattern in patterns
+    ]
+    result = client.batch(ACTIONS[action], targets)
+    for target in result.results:
+        selector = " ".join(
+            part for part in (target.target.pattern, target.target.labels)
+            if part != ""
+        )
+        if target.error != "":
+            printError(f"{selector}:", target.error)
+        else:
+            print(f"{selector}: {', '.join(target.tasks)}")
+
+
+def dispatch(client: rpc.Client, command_line: str) -> bool:
+    """Run a command of the REPL, False once it should quit."""
+
+    tokens = command_line.split()
+    match tokens:
+        case [
+            ("start" | "stop" | "restart") as action,
+            *arguments,
+        ] if is_batch(arguments):
+            batch(client, action, arguments)
+        case ["start", task, *instance_ids]:
+            client.start(task, list(map(int, instance_ids)))
+        case ["stop", task, *instance_ids]:
+            client.stop(task, list(map(int, instance_ids)))
+        case ["restart", task, *instance_ids]:
+            client.restart(task,  list(map(int, instance_ids)))
+        case ["status"]:
+            status(client, [])
+        case ["status", task, *instance_ids]:
+            text = client.status(task,  list(map(int, instance_ids)))
+            print(f"Status:\n\t{text}")
+        case ["watch", *names]:
+            watch(client, names)
+        case ["tail", task, *arguments]:
+            tail(client, task, arguments)
+        case ["metrics", *prefixes]:
+            for name, value in sorted(client.metrics().items()):
+                if len(prefixes) == 0 or name.startswith(tuple(prefixes)):
+                    print(f"{name} {value:g}")
+        case ["tasks"]:
+            tasks(client)
+        case ["profile", *arguments]:
+            profile(client, arguments)
+        case ["slow", *arguments]:
+            slow(client, arguments)
+        case ["list"]:
+            for task in client.list():
+                print(task)
+        case ["reload"]:
+            reload(client)
+        case ["shutdown"]:
+            client.shutdown()
+        case ["quit"]:
+            return False
+        case _:
+            printError("Invalid command:", command_line)
+    return True
+
+
 def run(client: rpc.Client):
     setup(client)
     if os.path.exists(HISTORY_FILE):
@@ -110,30 +389,13 @@ def run(client: rpc.Client):
            "🔧 Taskmaster  ❯ ",
             )
             try:
-                tokens = command_line.split()
-                match tokens:
-                    case ["start", task, *instance_ids]:
-                        client.start(task, list(map(int, instance_ids)))
-                    case ["stop", task, *instance_ids]:
-                        client.stop(task, list(map(int, instance_ids)))
-                    case ["restart", task, *instance_ids]:
-                        client.restart(task,  list(map(int, instance_ids)))
-                    case ["status", task, *instance_ids]:
-                        status = client.status(task,  list(map(int, instance_ids)))
-                        print(f"Status:\n\t{status}")
-                    case ["list"]:
-                        for task in client.list():
-                            print(task)
-                    case ["reload"]:
-                        client.reload()
-                    case ["shutdown"]:
-                        client.shutdown()
-                    case ["quit"]:
-                        break
-                    case _:
-                       printError("Invalid command:", command_line)
-            except grpc.RpcError:
-                printError("Server is not responding, is it running ?")
+                if not dispatch(client, command_line):
+                    break
+            except grpc.RpcError as error:
+                if error.code() == grpc.StatusCode.UNAVAILABLE:
+                    printError("Server is not responding, is it running ?")
+                else:
+                    printError(f"{error.code().name}:", error.details())
             except Exception as e:
                 printError("Error running command: ", e)
 
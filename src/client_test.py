@@ -0,0 +1,154 @@
+import pytest
+
+from client import dispatch, is_batch
+from rpc import (
+    Action,
+    BatchResult,
+    Output,
+    Profile,
+    ReloadResult,
+    SlowCallbacks,
+    StatusSnapshot,
+    TargetResult,
+    TaskDump,
+    TaskDumps,
+    WatchEvent,
+)
+
+
+class Stream(list):
+    def cancel(self):
+        pass
+
+
+class FakeClient:
+    """Records the calls of the REPL, answers with empty messages."""
+
+    def __init__(self):
+        self.calls = []
+
+    def record(self, name, *arguments):
+        self.calls.append((name, *arguments))
+
+    def start(self, task, instances=[]):
+        self.record("start", task, instances)
+
+    def stop(self, task, instances=[]):
+        self.record("stop", task, instances)
+
+    def restart(self, task, instances=[]):
+        self.record("restart", task, instances)
+
+    def list(self):
+        self.record("list")
+        return ["web"]
+
+    def status(self, task, instances):
+        self.record("status", task, instances)
+        return "running"
+
+    def snapshot(self, tasks=[]):
+        self.record("snapshot", tasks)
+        return StatusSnapshot()
+
+    def watch(self, tasks=[]):
+        self.record("watch", tasks)
+        return Stream([WatchEvent(snapshot=StatusSnapshot())])
+
+    def tail(self, task, instance, lines=0):
+        self.record("tail", task, instance, lines)
+        return [b"line\n"]
+
+    def follow(self, task, instance, lines=0):
+        self.record("follow", task, instance, lines)
+        return Stream([Output(data=b"line\n")])
+
+    def batch(self, action, targets):
+        self.record("batch", action, [(t.pattern, t.labels) for t in targets])
+        return BatchResult(results=[TargetResult(target=targets[0])])
+
+    def metrics(self):
+        self.record("metrics")
+        return {"tasks": 1.0}
+
+    def reload(self):
+        self.record("reload")
+        return ReloadResult()
+
+    def tasks(self):
+        self.record("tasks")
+        return TaskDumps(tasks=[TaskDump(name="main", coroutine="run")])
+
+    def profile(self, seconds, interval=0):
+        self.record("profile", seconds)
+        return Profile()
+
+    def slow_callbacks(self, threshold=0, reset=False):
+        self.record("slow_callbacks", threshold, reset)
+        return SlowCallbacks()
+
+    def shutdown(self):
+        self.record("shutdown")
+
+
+@pytest.mark.parametrize(
+    "command_line, call",
+    [
+        ("start web", ("start", "web", [])),
+        ("stop web 1 2", ("stop", "web", [1, 2])),
+        ("restart web 3", ("restart", "web", [3])),
+        ("stop web-*", ("batch", Action.STOP, [("web-*", "")])),
+        ("start -l tier=front", ("batch", Action.START, [("", "tier=front")])),
+        ("status", ("snapshot", [])),
+        ("status web 1", ("status", "web", [1])),
+        ("watch web db", ("watch", ["web", "db"])),
+        ("watch", ("watch", [])),
+        ("tail web", ("tail", "web", 1, 10)),
+        ("tail web 2 -f -n 5", ("follow", "web", 2, 5)),
+        ("metrics task", ("metrics",)),
+        ("tasks", ("tasks",)),
+        ("profile 0.1", ("profile", 0.1)),
+        ("slow 0.2 reset", ("slow_callbacks", 0.2, True)),
+        ("list", ("list",)),
+        ("reload", ("reload",)),
+        ("shutdown", ("shutdown",)),
+    ],
+)
+def test_dispatch(command_line, call, capsys):
+    client = FakeClient()
+    assert dispatch(client, command_line)
+    assert client.calls == [call]
+    assert "Invalid command" not in capsys.readouterr().out
+
+
+def test_dispatch_quit():
+    client = FakeClient()
+    assert not dispatch(client, "quit")
+    assert client.calls == []
+
+
+@pytest.mark.parametrize(
+    "command_line", ["", "frobnicate", "tail", "stop", "start", "restart"]
+)
+def test_dispatch_invalid(command_line, capsys):
+    client = FakeClient()
+    assert dispatch(client, command_line)
+    assert client.calls == []
+    assert "Invalid command" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("command_line", ["stop -l", "stop -l ,"])
+def test_dispatch_empty_selector(command_line, capsys):
+    client = FakeClient()
+    assert dispatch(client, command_line)
+    assert client.calls == []
+    assert "select" in capsys.readouterr().out
+
+
+def test_is_batch():
+    assert not is_batch([])
+    assert not is_batch(["web"])
+    assert not is_batch(["web", "1", "2"])
+    assert is_batch(["web-*"])
+    assert is_batch(["web", "db"])
+    assert is_batch(["-l", "tier=front"])
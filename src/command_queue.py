@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import deque
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+
+C = TypeVar("C")
+
+DEFAULT_COMMAND_QUEUE_SIZE = 1024
+
+
+class CommandQueueFull(Exception):
+    """Raised instead of waiting, so callers learn about it right away."""
+
+
+class CommandQueue(Generic[C]):
+    """
+    Bounded FIFO of commands.
+
+    Commands with the same key, like the ones for an instance, are merged
+    while pending so only the latest wish is carried out. Commands without
+    a key are never merged, and nothing queued before them is merged with
+    what comes after.
+    """
+
+    maxsize: int
+    key: Callable[[C], Optional[Hashable]]
+    # Returns None when both have to be kept
+    merge: Callable[[C, C], Optional[C]]
+    # Single element lists, so a pending command can be replaced in place
+    slots: deque[list[C]]
+    pending: dict[Hashable, list[C]]
+    waiter: Optional[asyncio.Future[None]]
+    coalesced: int
+    rejected: int
+
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_COMMAND_QUEUE_SIZE,
+        key: Callable[[C], Optional[Hashable]] = lambda _: None,
+        merge: Callable[[C, C], Optional[C]] = lambda _, new: new,
+    ):
+        self.maxsize = maxsize
+        self.key = key
+        self.merge = merge
+        self.slots = deque()
+        self.pending = {}
+        self.waiter = None
+        self.coalesced = 0
+        self.rejected = 0
+
+    def qsize(self) -> int:
+        return len(self.slots)
+
+    def full(self) -> bool:
+        return self.maxsize <= len(self.slots)
+
+    def put_nowait(self, command: C, force: bool = False):
+        """Queue a command, `force` to go past the limit."""
+
+        key = self.key(command)
+        if key is not None:
+            slot = self.pending.get(key)
+            if slot is not None:
+                merged = self.merge(slot[0], command)
+                if merged is not None:
+                    slot[0] = merged
+                    self.coalesced += 1
+                    return
+
+        if self.full() and not force:
+            self.rejected += 1
+            raise CommandQueueFull(
+                f"{len(self.slots)} commands already pending"
+            )
+
+        slot = [command]
+        self.slots.append(slot)
+        if key is None:
+            # Keeps what was queued before apart from what comes after
+            self.pending.clear()
+        else:
+            self.pending[key] = slot
+
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get(self) -> C:
+        while len(self.slots) == 0:
+            self.waiter = asyncio.get_running_loop().create_future()
+            await self.waiter
+        self.waiter = None
+
+        slot = self.slots.popleft()
+        key = self.key(slot[0])
+        if key is not None and self.pending.get(key) is slot:
+            del self.pending[key]
+        return slot[0]
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "command_queue_depth": len(self.slots),
+            "command_queue_size": self.maxsize,
+            "commands_coalesced_total": self.coalesced,
+            "commands_rejected_total": self.rejected,
+        }
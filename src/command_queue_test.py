@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+
+from command_queue import CommandQueue, CommandQueueFull
+from task import Restart, Shutdown, Start, Stop, instance_of, merge
+
+
+def task_queue(maxsize: int = 8) -> CommandQueue:
+    return CommandQueue(maxsize, key=instance_of, merge=merge)
+
+
+def drain(queue: CommandQueue) -> list:
+    async def get_all():
+        return [await queue.get() for _ in range(queue.qsize())]
+
+    return asyncio.run(get_all())
+
+
+def test_fifo_without_keys():
+    queue = CommandQueue()
+    for command in ("a", "b", "a"):
+        queue.put_nowait(command)
+    assert drain(queue) == ["a", "b", "a"]
+    assert queue.coalesced == 0
+
+
+def test_latest_wish_per_instance():
+    queue = task_queue()
+    queue.put_nowait(Start(1))
+    queue.put_nowait(Start(2))
+    queue.put_nowait(Stop(1))
+    queue.put_nowait(Restart(2))
+    # Merged in place, ahead of instance 2
+    assert drain(queue) == [Stop(1), Restart(2)]
+    assert queue.coalesced == 2
+
+
+def test_start_does_not_replace_restart():
+    queue = task_queue()
+    queue.put_nowait(Restart(1))
+    queue.put_nowait(Start(1))
+    queue.put_nowait(Stop(1))
+    assert drain(queue) == [Restart(1), Stop(1)]
+
+
+def test_task_wide_commands_are_barriers():
+    queue = task_queue()
+    queue.put_nowait(Stop(1))
+    shutdown = Shutdown()
+    queue.put_nowait(shutdown)
+    queue.put_nowait(Start(1))
+    queue.put_nowait(Start(1))
+    assert drain(queue) == [Stop(1), shutdown, Start(1)]
+    assert queue.coalesced == 1
+
+
+def test_taken_commands_are_not_merged_into():
+    queue = task_queue()
+    queue.put_nowait(Stop(1))
+    assert drain(queue) == [Stop(1)]
+    queue.put_nowait(Start(1))
+    assert drain(queue) == [Start(1)]
+
+
+def test_bounded():
+    queue = task_queue(maxsize=2)
+    queue.put_nowait(Start(1))
+    queue.put_nowait(Start(2))
+    with pytest.raises(CommandQueueFull):
+        queue.put_nowait(Start(3))
+    assert queue.rejected == 1
+
+    # Merging takes no room, forcing goes past the limit
+    queue.put_nowait(Stop(2))
+    queue.put_nowait(Shutdown(), force=True)
+    assert queue.qsize() == 3
+    assert queue.metrics()["command_queue_depth"] == 3
+
+
+def test_get_waits_for_a_command():
+    async def main():
+        queue = CommandQueue()
+        getter = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+        assert not getter.done()
+        queue.put_nowait("a")
+        return await getter
+
+    assert asyncio.run(main()) == "a"
@@ -1,147 +1,762 @@
 # Allow referencing a class within its own body
 from __future__ import annotations
 
+import os
+import glob
+import json
 import yaml
+import pickle
 import schema
+import fnmatch
+import hashlib
+import resource
+import tempfile
 from signal import Signals
 from typing import Optional
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from schema import Schema, And, Or, Use
 from datetime import timedelta
 
 
+# libyaml's loader when available, several times faster
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
 class RestartCondition(Enum):
     ALWAYS = "always"
     NEVER = "never"
     ON_FAILURE = "on_failure"
 
 
+class SpawnMode(Enum):
+    # Exec the command directly when it needs no shell features
+    AUTO = "auto"
+    # Always go through `/bin/bash -c`
+    SHELL = "shell"
+
+
+class IoClass(Enum):
+    REALTIME = "realtime"
+    BEST_EFFORT = "best_effort"
+    IDLE = "idle"
+
+
 PositiveInt = And(int, lambda n: 0 <= n)
+PositiveNumber = And(Or(int, float), lambda n: 0 <= n)
+StriclyPositiveNumber = And(Or(int, float), lambda n: 0 < n)
 StriclyPositiveInt = And(int, lambda n: 0 < n)
 Signal = Use(Signals.__getitem__)
 RestartSchema = Use(RestartCondition)
+SpawnModeSchema = Use(SpawnMode)
+Argv = And([str], lambda argv: 0 < len(argv))
 Path = str
 Environment = Or({str: str})
+Labels = {str: Or(str, int, float, bool)}
 Umask = And(str, Use(lambda u: int(u, base=8)))
+Fraction = And(Or(int, float), lambda f: 0 <= f <= 1)
+Cpus = And([PositiveInt], lambda cpus: 0 < len(cpus))
+Nice = And(int, lambda n: -20 <= n <= 19)
+IoClassSchema = Use(IoClass)
+IoLevel = And(int, lambda n: 0 <= n <= 7)
+RlimitName = And(str, lambda name: hasattr(resource, rlimit_constant(name)))
+RlimitValue = Or(PositiveInt, "unlimited")
+Rlimit = Or(
+    RlimitValue,
+    And(
+        [RlimitValue],
+        lambda limits: len(limits) == 2 and soft_within_hard(*limits),
+    ),
+)
+
+
+def rlimit_constant(name: str) -> str:
+    """Name in the `resource` module of a limit such as `nofile`."""
+    return f"RLIMIT_{name.upper()}"
+
+
+# The only string RlimitValue lets through is "unlimited"
+def soft_within_hard(soft: int | str, hard: int | str) -> bool:
+    if isinstance(hard, str):
+        return True
+    return isinstance(soft, int) and soft <= hard
+
+
+def rlimit_value(value: int | str) -> int:
+    return resource.RLIM_INFINITY if isinstance(value, str) else value
+
+
+def rlimits(value: int | str | list) -> tuple[int, int]:
+    """Soft and hard limits, a single value being both."""
+    if isinstance(value, list):
+        return (rlimit_value(value[0]), rlimit_value(value[1]))
+    return (rlimit_value(value), rlimit_value(value))
+
+
+def label_value(value: str | int | float | bool) -> str:
+    # As written in YAML rather than Python's `True`
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+@dataclass
+class RestartBackoff:
+    """
+    Delay before restarting after a failure, doubling from `base` up to
+    `max` for consecutive failures, randomly spread by `jitter` (a fraction
+    of the delay).
+    """
+
+    base: timedelta
+    max: timedelta
+    jitter: float
+
+    schema = Schema(
+        {
+            schema.Optional("base"): PositiveNumber,
+            schema.Optional("max"): PositiveNumber,
+            schema.Optional("jitter"): Fraction,
+        }
+    )
+
+    @staticmethod
+    def build(d: dict) -> RestartBackoff:
+        return RestartBackoff(
+            base=timedelta(seconds=d.get("base", 0.5)),
+            max=timedelta(seconds=d.get("max", 30)),
+            jitter=d.get("jitter", 0.1),
+        )
+
+
+@dataclass
+class CrashLoop:
+    """
+    Restarts of a whole task are paused for `pause` once `max_failures`
+    happened within `window`.
+    """
+
+    max_failures: int
+    window: timedelta
+    pause: timedelta
+
+    schema = Schema(
+        {
+            schema.Optional("max_failures"): StriclyPositiveInt,
+            schema.Optional("window"): StriclyPositiveNumber,
+            schema.Optional("pause"): PositiveNumber,
+        }
+    )
+
+    @staticmethod
+    def build(d: dict) -> CrashLoop:
+        return CrashLoop(
+            max_failures=d.get("max_failures", 10),
+            window=timedelta(seconds=d.get("window", 60)),
+            pause=timedelta(seconds=d.get("pause", 60)),
+        )
+
+
+@dataclass
+class LogRotation:
+    """
+    When output files are rotated, by size in bytes or age in seconds,
+    how many rotated segments are kept and if they are gzipped.
+    """
+
+    max_size: Optional[int]
+    max_age: Optional[timedelta]
+    keep: int
+    compress: bool
+
+    schema = Schema(
+        {
+            schema.Optional("max_size"): StriclyPositiveInt,
+            schema.Optional("max_age"): StriclyPositiveNumber,
+            schema.Optional("keep"): PositiveInt,
+            schema.Optional("compress"): bool,
+        }
+    )
+
+    @staticmethod
+    def build(d: dict) -> LogRotation:
+        max_age = d.get("max_age")
+        return LogRotation(
+            max_size=d.get("max_size"),
+            max_age=None if max_age is None else timedelta(seconds=max_age),
+            keep=d.get("keep", 5),
+            compress=d.get("compress", False),
+        )
+
+
+@dataclass
+class Rollout:
+    """
+    How instances are replaced on restarts and on updates that change how
+    they are spawned: up to `max_surge` replacements started ahead of the
+    instances they replace, up to `max_unavailable` instances stopped
+    before their replacement runs, every one of them when None.
+    """
+
+    max_unavailable: Optional[int]
+    max_surge: int
+
+    schema = Schema(
+        And(
+            {
+                schema.Optional("max_unavailable"): PositiveInt,
+                schema.Optional("max_surge"): PositiveInt,
+            },
+            # Otherwise nothing could ever be replaced
+            lambda d: 0 < d.get("max_unavailable", 1) + d.get("max_surge", 0),
+        )
+    )
+
+    @staticmethod
+    def build(d: dict) -> Rollout:
+        return Rollout(
+            max_unavailable=d.get("max_unavailable"),
+            max_surge=d.get("max_surge", 0),
+        )
+
+
+@dataclass
+class CgroupLimits:
+    """
+    Limits of the cgroup of each replica, when taskmaster has a cgroup
+    subtree to itself: CPUs worth of time (`cpu_max`), bytes of memory past
+    which it is throttled (`memory_high`) or killed (`memory_max`) and
+    number of processes (`pids_max`). None is no limit.
+    """
+
+    cpu_max: Optional[float]
+    memory_high: Optional[int]
+    memory_max: Optional[int]
+    pids_max: Optional[int]
+
+    schema = Schema(
+        {
+            schema.Optional("cpu_max"): StriclyPositiveNumber,
+            schema.Optional("memory_high"): StriclyPositiveInt,
+            schema.Optional("memory_max"): StriclyPositiveInt,
+            schema.Optional("pids_max"): StriclyPositiveInt,
+        }
+    )
+
+    @staticmethod
+    def build(d: dict) -> CgroupLimits:
+        return CgroupLimits(
+            cpu_max=d.get("cpu_max"),
+            memory_high=d.get("memory_high"),
+            memory_max=d.get("memory_max"),
+            pids_max=d.get("pids_max"),
+        )
+
+
+@dataclass
+class CpuAffinity:
+    """
+    CPUs the processes may run on, every CPU taskmaster may use when
+    `cpus` is None. With `spread`, each replica is pinned to a single one
+    of them, round-robin.
+    """
+
+    cpus: Optional[list[int]]
+    spread: bool
+
+    schema = Or(
+        "spread",
+        Cpus,
+        {
+            schema.Optional("cpus"): Cpus,
+            schema.Optional("spread"): bool,
+        },
+    )
+
+    @staticmethod
+    def build(d: str | list | dict) -> CpuAffinity:
+        if isinstance(d, str):
+            # "spread", the only string the schema lets through
+            return CpuAffinity(cpus=None, spread=True)
+        if isinstance(d, list):
+            return CpuAffinity(cpus=d, spread=False)
+        return CpuAffinity(cpus=d.get("cpus"), spread=d.get("spread", False))
+
+
+@dataclass
+class IoPriority:
+    """I/O scheduling class and level within it, 0 being the highest."""
+
+    io_class: IoClass
+    level: int
+
+    schema = Or(
+        IoClassSchema,
+        {
+            "class": IoClassSchema,
+            schema.Optional("level"): IoLevel,
+        },
+    )
+
+    @staticmethod
+    def build(d: str | dict) -> IoPriority:
+        if isinstance(d, str):
+            d = {"class": d}
+        return IoPriority(
+            io_class=IoClass(d["class"]), level=d.get("level", 4)
+        )
 
 
 @dataclass
 class TaskDescription:
     """
-    - Start command
+    - Start command, either a shell line or an explicit argv (`exec`)
+    - How the start command is spawned (`auto` or through a `shell`)
     - Number of process to start and keep alive
+    - Spawn priority (higher first) and maximum spawns per second
     - If program is started at launch or not
     - If program should restart
         - always
         - never
         - on unexpected exits
+    - How long to wait before restarting and when to pause crash loops
     - What return code are "unexpected exists"
     - How long a program should run for to be considered "successfully started"
     - How many restart should be attempted before aborting
     - Which signals should be used for a gracefull shutdown
+    - How instances are replaced, one by one or a few at a time
     - How long to wait for a gracefull shutdown before killing it
-    - Optional redirections of stdout/stderr files
+    - Optional redirections of stdout/stderr files, templates that can use
+      `{name}` and `{replica}`, and their rotation
+    - How many bytes of recent output to keep in memory per instance
+    - Labels, to select tasks by something else than their name
     - Environment variables
     - The working directory
     - The umask used by the program
+    - CPUs it runs on, possibly one per replica, its nice value, I/O
+      priority and resource limits
+    - Limits of each replica's cgroup
     """
 
-    command: str
+    command: Optional[str]
+    exec: Optional[list[str]]
+    spawn_mode: SpawnMode
     replicas: int
+    priority: int
+    spawn_rate: Optional[float]
     start_on_launch: bool
     restart: RestartCondition
+    restart_backoff: RestartBackoff
+    crash_loop: CrashLoop
     success_exit_codes: set[int]
     start_timeout: timedelta
     start_attempts: int
     shutdown_signal: Signals
     shutdown_timeout: timedelta
+    rollout: Rollout
     stdout: Optional[str]
     stderr: Optional[str]
+    log_rotation: LogRotation
+    output_buffer: int
+    labels: dict[str, str]
     environment: dict[str, str]
     pwd: Optional[str]
     umask: Optional[int]
+    cpu_affinity: Optional[CpuAffinity]
+    nice: Optional[int]
+    ionice: Optional[IoPriority]
+    # Soft and hard limit by name, such as `nofile`
+    rlimits: dict[str, tuple[int, int]]
+    cgroup: CgroupLimits
 
     schema = Schema(
-        {
-            "command": str,
-            schema.Optional("replicas"): StriclyPositiveInt,
-            schema.Optional("start_on_launch"): bool,
-            schema.Optional("restart"): RestartSchema,
-            schema.Optional("success_exit_codes"): [int],
-            schema.Optional("start_timeout"): PositiveInt,
-            schema.Optional("start_attempts"): StriclyPositiveInt,
-            schema.Optional("shutdown_signal"): Signal,
-            schema.Optional("shutdown_timeout"): PositiveInt,
-            schema.Optional("stdout"): Path,
-            schema.Optional("stderr"): Path,
-            schema.Optional("environment"): Environment,
-            schema.Optional("pwd"): Path,
-            schema.Optional("umask"): Umask,
-        }
+        And(
+            {
+                schema.Optional("command"): str,
+                schema.Optional("exec"): Argv,
+                schema.Optional("spawn_mode"): SpawnModeSchema,
+                schema.Optional("replicas"): StriclyPositiveInt,
+                schema.Optional("priority"): int,
+                schema.Optional("spawn_rate"): StriclyPositiveNumber,
+                schema.Optional("start_on_launch"): bool,
+                schema.Optional("restart"): RestartSchema,
+                schema.Optional("restart_backoff"): RestartBackoff.schema,
+                schema.Optional("crash_loop"): CrashLoop.schema,
+                schema.Optional("success_exit_codes"): [int],
+                schema.Optional("start_timeout"): PositiveInt,
+                schema.Optional("start_attempts"): StriclyPositiveInt,
+                schema.Optional("shutdown_signal"): Signal,
+                schema.Optional("shutdown_timeout"): PositiveInt,
+                schema.Optional("rollout"): Rollout.schema,
+                schema.Optional("stdout"): Path,
+                schema.Optional("stderr"): Path,
+                schema.Optional("log_rotation"): LogRotation.schema,
+                schema.Optional("output_buffer"): PositiveInt,
+                schema.Optional("labels"): Labels,
+                schema.Optional("environment"): Environment,
+                schema.Optional("pwd"): Path,
+                schema.Optional("umask"): Umask,
+                schema.Optional("cpu_affinity"): CpuAffinity.schema,
+                schema.Optional("nice"): Nice,
+                schema.Optional("ionice"): IoPriority.schema,
+                schema.Optional("rlimits"): {RlimitName: Rlimit},
+                schema.Optional("cgroup"): CgroupLimits.schema,
+            },
+            # Exactly one way of describing what to run
+            lambda d: ("command" in d) != ("exec" in d),
+        )
     )
 
     @staticmethod
     def build(d: dict) -> TaskDescription:
         return TaskDescription(
-            command=d["command"],
+            command=d.get("command"),
+            exec=d.get("exec"),
+            spawn_mode=SpawnMode(d.get("spawn_mode", "auto")),
             replicas=d.get("replicas", 1),
+            priority=d.get("priority", 0),
+            spawn_rate=d.get("spawn_rate"),
             start_on_launch=d.get("start_on_launch", True),
             restart=RestartCondition(d.get("restart", "on_failure")),
+            restart_backoff=RestartBackoff.build(d.get("restart_backoff", {})),
+            crash_loop=CrashLoop.build(d.get("crash_loop", {})),
             success_exit_codes=set(d.get("success_exit_codes", [0])),
             start_timeout=timedelta(seconds=d.get("start_timeout", 3)),
             start_attempts=d.get("start_attempts", 3),
             shutdown_signal=Signals[d.get("shutdown_signal", "SIGTERM")],
             shutdown_timeout=timedelta(seconds=d.get("shutdown_timeout", 10)),
+            rollout=Rollout.build(d.get("rollout", {})),
             stdout=d.get("stdout"),
             stderr=d.get("stderr"),
+            log_rotation=LogRotation.build(d.get("log_rotation", {})),
+            # Opt-in, a ring costs its size in memory for every instance
+            output_buffer=d.get("output_buffer", 0),
+            labels={
+                key: label_value(value)
+                for key, value in d.get("labels", {}).items()
+            },
             environment=d.get("environment", {}),
             pwd=d.get("pwd"),
             umask=int(d.get("umask", "644"), base=8),
+            cpu_affinity=(
+                None
+                if "cpu_affinity" not in d
+                else CpuAffinity.build(d["cpu_affinity"])
+            ),
+            nice=d.get("nice"),
+            ionice=(
+                None if "ionice" not in d else IoPriority.build(d["ionice"])
+            ),
+            rlimits={
+                name: rlimits(value)
+                for name, value in d.get("rlimits", {}).items()
+            },
+            cgroup=CgroupLimits.build(d.get("cgroup", {})),
         )
 
     def __eq__(self, other) -> bool:
         return (
             self.command == other.command
+            and self.exec == other.exec
+            and self.spawn_mode == other.spawn_mode
             and self.replicas == other.replicas
+            and self.priority == other.priority
+            and self.spawn_rate == other.spawn_rate
             and self.start_on_launch == other.start_on_launch
             and self.restart == other.restart
+            and self.restart_backoff == other.restart_backoff
+            and self.crash_loop == other.crash_loop
             and self.success_exit_codes == other.success_exit_codes
             and self.start_timeout == other.start_timeout
             and self.start_attempts == other.start_attempts
             and self.shutdown_signal == other.shutdown_signal
             and self.shutdown_timeout == other.shutdown_timeout
+            and self.rollout == other.rollout
             and self.stdout == other.stdout
             and self.stderr == other.stderr
+            and self.log_rotation == other.log_rotation
+            and self.output_buffer == other.output_buffer
+            and self.labels == other.labels
             and self.environment == other.environment
             and self.pwd == other.pwd
             and self.umask == other.umask
+            and self.cpu_affinity == other.cpu_affinity
+            and self.nice == other.nice
+            and self.ionice == other.ionice
+            and self.rlimits == other.rlimits
+            and self.cgroup == other.cgroup
         )
 
 
+def fingerprint(d: dict) -> str:
+    """Hash of a task's raw description, independent of key order."""
+    canonical = json.dumps(d, sort_keys=True, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class ConfigurationDiff:
+    added: list[str]
+    removed: list[str]
+    changed: list[str]
+    unchanged: list[str]
+
+    def any(self) -> bool:
+        return 0 != len(self.added) + len(self.removed) + len(self.changed)
+
+
 @dataclass
 class Configuration:
+    """
+    Tasks of a configuration file and of the files it includes, like
+    `include: conf.d/*.yaml`, relative to its directory.
+    """
+
     tasks: dict[str, TaskDescription]
+    # Of each task's raw description
+    fingerprints: dict[str, str] = field(default_factory=dict)
+    include: list[str] = field(default_factory=list)
+    # Of the whole file
+    digest: str = ""
+    # Inode, size and modification time the file was read with
+    version: tuple[int, ...] = ()
+    # Each file on its own by absolute path, the main one first
+    files: dict[str, Configuration] = field(default_factory=dict)
 
+    # Only the shape, each task is validated if it changed
+    outline_schema = Schema(
+        {
+            schema.Optional("tasks"): {str: dict},
+            schema.Optional("include"): Or(str, [str]),
+        }
+    )
     schema = Schema(
         {
-            "tasks": {str: Schema(TaskDescription.schema)},
+            schema.Optional("tasks"): {str: Schema(TaskDescription.schema)},
+            schema.Optional("include"): Or(str, [str]),
         }
     )
 
     @staticmethod
-    def build(d: dict) -> Configuration:
+    def build(
+        d: dict, previous: Optional[Configuration] = None
+    ) -> Configuration:
+        """Validate and build the tasks that differ from `previous`."""
+
+        Configuration.outline_schema.validate(d)
         tasks = {}
-        for name, desc in d["tasks"].items():
-            tasks[name] = TaskDescription.build(desc)
-        return Configuration(tasks)
+        fingerprints = {}
+        for name, desc in d.get("tasks", {}).items():
+            fingerprints[name] = fingerprint(desc)
+            if previous is not None and (
+                previous.fingerprints.get(name) == fingerprints[name]
+            ):
+                tasks[name] = previous.tasks[name]
+            else:
+                try:
+                    TaskDescription.schema.validate(desc)
+                except schema.SchemaError as error:
+                    raise schema.SchemaError(f"task {name}: {error}")
+                tasks[name] = TaskDescription.build(desc)
+
+        include = d.get("include", [])
+        if isinstance(include, str):
+            include = [include]
+        return Configuration(tasks, fingerprints, include)
+
+    @staticmethod
+    def load(
+        file_path: str,
+        previous: Optional[Configuration] = None,
+        changed: Optional[set[str]] = None,
+    ) -> Configuration:
+        """
+        Load a configuration file and the files it includes, or return
+        `previous` right away if none of them changed since. With
+        `changed`, other files already loaded are not even looked at.
+        """
+
+        previous_files = {} if previous is None else previous.files
+
+        def load_file(path: str) -> Configuration:
+            before = previous_files.get(path)
+            if before is not None and changed is not None:
+                if path not in changed:
+                    return before
+            return Configuration.load_file(path, before)
+
+        main_path = os.path.abspath(file_path)
+        main = load_file(main_path)
+        files = {main_path: main}
+        for path in main.included_files(main_path):
+            included = load_file(path)
+            if len(included.include) != 0:
+                raise schema.SchemaError(f"{path}: includes cannot be nested")
+            files[path] = included
+
+        if previous is not None and (
+            files.keys() == previous_files.keys()
+            and all(files[path] is previous_files[path] for path in files)
+        ):
+            return previous
+
+        tasks = {}
+        fingerprints = {}
+        sources: dict[str, str] = {}
+        for path, configuration in files.items():
+            for name, desc in configuration.tasks.items():
+                if name in sources:
+                    raise schema.SchemaError(
+                        f"task {name} is defined in both {sources[name]}"
+                        f" and {path}"
+                    )
+                sources[name] = path
+                tasks[name] = desc
+                fingerprints[name] = configuration.fingerprints[name]
+        return Configuration(tasks, fingerprints, main.include, files=files)
 
     @staticmethod
-    def load(file_path: str) -> Configuration:
-        with open(file_path, "r") as file:
-            data_dictionnary = yaml.load(file, Loader=yaml.SafeLoader)
-        Configuration.schema.validate(data_dictionnary)
-        return Configuration.build(data_dictionnary)
+    def load_file(
+        file_path: str, previous: Optional[Configuration] = None
+    ) -> Configuration:
+        """
+        Load a single file, or return `previous` right away if the file
+        did not change since.
+        """
+
+        with open(file_path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if previous is not None and previous.version == version:
+                return previous
+            content = file.read()
+
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        if previous is not None and previous.digest == digest:
+            previous.version = version
+            return previous
+
+        configuration = read_cache(file_path, digest)
+        if configuration is None:
+            data_dictionnary = yaml.load(content, Loader=YamlLoader)
+            configuration = Configuration.build(data_dictionnary, previous)
+            configuration.digest = digest
+            write_cache(file_path, configuration)
+        configuration.version = version
+        return configuration
+
+    def included_files(self, file_path: str) -> list[str]:
+        """Absolute paths of the files included by the one at `file_path`."""
+
+        directory = os.path.dirname(os.path.abspath(file_path))
+        paths = []
+        for pattern in self.include:
+            for path in sorted(glob.glob(os.path.join(directory, pattern))):
+                path = os.path.abspath(path)
+                if path != os.path.abspath(file_path) and path not in paths:
+                    paths.append(path)
+        return paths
+
+    def watched_directories(self) -> set[str]:
+        """Directories whose changes may change the configuration."""
+
+        (main_path, *_) = self.files
+        directory = os.path.dirname(main_path)
+        directories = {directory}
+        for pattern in self.include:
+            parent = os.path.dirname(os.path.join(directory, pattern))
+            if not glob.has_magic(parent):
+                directories.add(os.path.normpath(parent))
+        return directories
+
+    def is_watched(self, path: str) -> bool:
+        """Whether `path` is the main file or matches an include."""
+
+        (main_path, *_) = self.files
+        if path == main_path:
+            return True
+        directory = os.path.dirname(main_path)
+        return any(
+            fnmatch.fnmatch(path, os.path.normpath(os.path.join(directory, p)))
+            for p in self.include
+        )
+
+    def diff(self, previous: Configuration) -> ConfigurationDiff:
+        """What changed since `previous`, by task fingerprint."""
+
+        if self is previous:
+            return ConfigurationDiff([], [], [], list(self.fingerprints))
+
+        diff = ConfigurationDiff([], [], [], [])
+        for name, current in self.fingerprints.items():
+            before = previous.fingerprints.get(name)
+            if before is None:
+                diff.added.append(name)
+            elif before != current:
+                diff.changed.append(name)
+            else:
+                diff.unchanged.append(name)
+        for name in previous.fingerprints:
+            if name not in self.fingerprints:
+                diff.removed.append(name)
+        return diff
 
     def __eq__(self, other) -> bool:
         return self.tasks == other.tasks
+
+
+# Bumped whenever what gets pickled changes in a way field names miss,
+# defaults included
+CACHE_FORMAT = 4
+
+
+def cache_path(file_path: str) -> str:
+    (directory, name) = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{name}.cache")
+
+
+def cache_key(digest: str) -> tuple:
+    fields = tuple(TaskDescription.__dataclass_fields__)
+    return (CACHE_FORMAT, fields, digest)
+
+
+def read_cache(file_path: str, digest: str) -> Optional[Configuration]:
+    """
+    Configuration compiled from the file content with `digest`, if cached.
+
+    The cache is unpickled, so it is only trusted when we wrote it: owned
+    by us and writable by nobody else.
+    """
+
+    try:
+        with open(cache_path(file_path), "rb") as file:
+            stat = os.fstat(file.fileno())
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022 != 0:
+                return None
+            (key, configuration) = pickle.load(file)
+    except Exception:
+        return None
+
+    if key != cache_key(digest):
+        return None
+    return configuration
+
+
+def write_cache(file_path: str, configuration: Configuration):
+    """Best effort, the cache is only there to speed up loading."""
+
+    path = cache_path(file_path)
+    try:
+        (fd, temporary) = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=os.path.basename(path)
+        )
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as file:
+            entry = (cache_key(configuration.digest), configuration)
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except Exception:
+        os.unlink(temporary)
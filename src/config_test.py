@@ -0,0 +1,165 @@
+import os
+import hashlib
+
+import pytest
+import schema
+
+from config import (
+    Configuration,
+    Rollout,
+    cache_path,
+    fingerprint,
+    read_cache,
+    write_cache,
+)
+
+
+def write(path, content: str):
+    path.write_text(content)
+    # A new modification time even within the clock's resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+
+def digest(path) -> str:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({"command": "a", "replicas": 2}) == fingerprint(
+        {"replicas": 2, "command": "a"}
+    )
+    assert fingerprint({"command": "a"}) != fingerprint({"command": "b"})
+
+
+def test_rollout_defaults_to_stop_then_start():
+    rollout = Rollout.build(Rollout.schema.validate({}))
+    assert (rollout.max_surge, rollout.max_unavailable) == (0, None)
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [{"max_unavailable": 0}, {"max_unavailable": 0, "max_surge": 0}],
+)
+def test_rollout_must_replace_something(settings):
+    with pytest.raises(schema.SchemaError):
+        Rollout.schema.validate(settings)
+
+
+def test_build_reuses_unchanged_tasks():
+    previous = Configuration.build(
+        {"tasks": {"web": {"command": "a"}, "db": {"command": "b"}}}
+    )
+    current = Configuration.build(
+        {"tasks": {"web": {"command": "a"}, "db": {"command": "c"}}},
+        previous,
+    )
+    assert current.tasks["web"] is previous.tasks["web"]
+    assert current.tasks["db"] is not previous.tasks["db"]
+
+
+def test_diff():
+    previous = Configuration.build(
+        {
+            "tasks": {
+                "same": {"command": "a"},
+                "changed": {"command": "a"},
+                "removed": {"command": "a"},
+            }
+        }
+    )
+    current = Configuration.build(
+        {
+            "tasks": {
+                "same": {"command": "a"},
+                "changed": {"command": "b"},
+                "added": {"command": "a"},
+            }
+        },
+        previous,
+    )
+    diff = current.diff(previous)
+    assert (diff.added, diff.removed) == (["added"], ["removed"])
+    assert (diff.changed, diff.unchanged) == (["changed"], ["same"])
+    assert diff.any()
+    assert not previous.diff(previous).any()
+
+
+def test_load_unchanged_file(tmp_path):
+    path = tmp_path / "taskmaster.yaml"
+    write(path, "tasks:\n  web:\n    command: a\n")
+    first = Configuration.load(str(path))
+    assert Configuration.load(str(path), first) is first
+
+    # Touched, same content
+    write(path, "tasks:\n  web:\n    command: a\n")
+    assert Configuration.load(str(path), first) is first
+
+    write(path, "tasks:\n  web:\n    command: b\n")
+    second = Configuration.load(str(path), first)
+    assert second is not first
+    assert second.tasks["web"].command == "b"
+
+
+def test_load_only_changed_includes(tmp_path):
+    main = tmp_path / "taskmaster.yaml"
+    (tmp_path / "conf.d").mkdir()
+    web = tmp_path / "conf.d" / "web.yaml"
+    db = tmp_path / "conf.d" / "db.yaml"
+    write(main, "include: conf.d/*.yaml\n")
+    write(web, "tasks:\n  web:\n    command: a\n")
+    write(db, "tasks:\n  db:\n    command: a\n")
+    first = Configuration.load(str(main))
+    assert sorted(first.tasks) == ["db", "web"]
+
+    write(db, "tasks:\n  db:\n    command: b\n")
+    second = Configuration.load(str(main), first, {str(db)})
+    assert second.files[str(main)] is first.files[str(main)]
+    assert second.files[str(web)] is first.files[str(web)]
+    assert second.diff(first).changed == ["db"]
+
+
+def test_cache_written_and_read(tmp_path):
+    path = tmp_path / "taskmaster.yaml"
+    write(path, "tasks:\n  web:\n    command: a\n")
+    loaded = Configuration.load(str(path))
+    assert os.path.exists(cache_path(str(path)))
+
+    cached = read_cache(str(path), digest(path))
+    assert cached is not None and cached is not loaded
+    assert cached == loaded
+    assert cached.fingerprints == loaded.fingerprints
+
+
+def test_cache_invalidated_by_content(tmp_path):
+    path = tmp_path / "taskmaster.yaml"
+    write(path, "tasks:\n  web:\n    command: a\n")
+    Configuration.load(str(path))
+    write(path, "tasks:\n  web:\n    command: b\n")
+    assert read_cache(str(path), digest(path)) is None
+    # Compiled again, not taken from the stale cache
+    assert Configuration.load(str(path)).tasks["web"].command == "b"
+
+
+def test_cache_not_trusted_when_writable_by_others(tmp_path):
+    path = tmp_path / "taskmaster.yaml"
+    write(path, "tasks:\n  web:\n    command: a\n")
+    Configuration.load(str(path))
+    os.chmod(cache_path(str(path)), 0o666)
+    assert read_cache(str(path), digest(path)) is None
+
+
+def test_cache_ignores_garbage(tmp_path):
+    path = tmp_path / "taskmaster.yaml"
+    write(path, "tasks:\n  web:\n    command: a\n")
+    with open(cache_path(str(path)), "wb") as file:
+        file.write(b"not a pickle")
+    os.chmod(cache_path(str(path)), 0o644)
+    assert read_cache(str(path), digest(path)) is None
+
+    # Compiled again and the cache replaced
+    configuration = Configuration.load_file(str(path))
+    assert read_cache(str(path), digest(path)) == configuration
+    os.unlink(cache_path(str(path)))
+    write_cache(str(path), configuration)
+    assert read_cache(str(path), digest(path)) == configuration
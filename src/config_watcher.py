@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import os
+import errno
+import struct
+import ctypes
+import asyncio
+import logging
+import ctypes.util
+
+from typing import Callable, Optional
+from timer_wheel import Timer, get_timer_wheel
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds without changes before reloading, editors write in several steps
+DEBOUNCE_DELAY = 0.2
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCHED_EVENTS = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+# wd, mask, cookie, len
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def load_libc() -> Optional[ctypes.CDLL]:
+    name = ctypes.util.find_library("c")
+    if name is None:
+        return None
+    libc = ctypes.CDLL(name, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    return libc
+
+
+class ConfigWatcher:
+    """
+    Watches the directories of the configuration files with inotify and
+    reports which files changed, once they stop changing for a while.
+    """
+
+    libc: ctypes.CDLL
+    fd: int
+    # Watched directory by watch descriptor
+    directories: dict[int, str]
+    is_watched: Callable[[str], bool]
+    # Called with the changed files, None when events were lost
+    on_change: Callable[[Optional[set[str]]], None]
+    changed: set[str]
+    overflowed: bool
+    debounce: Optional[Timer]
+
+    def __init__(
+        self,
+        libc: ctypes.CDLL,
+        fd: int,
+        is_watched: Callable[[str], bool],
+        on_change: Callable[[Optional[set[str]]], None],
+    ):
+        self.libc = libc
+        self.fd = fd
+        self.directories = {}
+        self.is_watched = is_watched
+        self.on_change = on_change
+        self.changed = set()
+        self.overflowed = False
+        self.debounce = None
+        asyncio.get_running_loop().add_reader(fd, self.on_readable)
+
+    @staticmethod
+    def create(
+        is_watched: Callable[[str], bool],
+        on_change: Callable[[Optional[set[str]]], None],
+    ) -> Optional[ConfigWatcher]:
+        """None where inotify is not available."""
+
+        libc = load_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            error = ctypes.get_errno()
+            logger.warning(f"inotify_init1: {os.strerror(error)}")
+            return None
+        return ConfigWatcher(libc, fd, is_watched, on_change)
+
+    def watch(self, directories: set[str]):
+        """Watch exactly these directories."""
+
+        for wd, directory in list(self.directories.items()):
+            if directory not in directories:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.directories[wd]
+
+        watched = set(self.directories.values())
+        for directory in directories - watched:
+            wd = self.libc.inotify_add_watch(
+                self.fd, os.fsencode(directory), WATCHED_EVENTS
+            )
+            if wd < 0:
+                error = ctypes.get_errno()
+                message = os.strerror(error)
+                logger.warning(f"Cannot watch {directory}: {message}")
+            else:
+                self.directories[wd] = directory
+
+    def on_readable(self):
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except OSError as error:
+            if error.errno != errno.EAGAIN:
+                logger.error(f"Reading inotify events: {error}")
+            return
+
+        offset = 0
+        while offset < len(data):
+            (wd, mask, _, length) = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset: offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Lost track, look at everything again
+                self.overflowed = True
+                continue
+
+            directory = self.directories.get(wd)
+            if directory is None or len(name) == 0:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if self.is_watched(path):
+                self.changed.add(path)
+
+        if len(self.changed) != 0 or self.overflowed:
+            if self.debounce is not None:
+                self.debounce.cancel()
+            timer_wheel = get_timer_wheel()
+            self.debounce = timer_wheel.schedule(DEBOUNCE_DELAY, self.flush)
+
+    def flush(self):
+        self.debounce = None
+        (changed, self.changed) = (self.changed, set())
+        if self.overflowed:
+            self.overflowed = False
+            self.on_change(None)
+        else:
+            self.on_change(changed)
+
+    def close(self):
+        if self.debounce is not None:
+            self.debounce.cancel()
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
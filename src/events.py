@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import time
+import asyncio
+
+from collections import deque
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from instance import Stage
+
+
+# Transitions a subscriber may lag behind before they are coalesced
+WATCH_QUEUE_SIZE = 1024
+
+
+class Transition:
+    """An instance going from one stage to another."""
+
+    __slots__ = ("task", "instance", "old_stage", "new_stage", "time")
+
+    task: str
+    instance: int
+    old_stage: Stage
+    new_stage: Stage
+    # Unix time
+    time: float
+
+    def __init__(
+        self, task: str, instance: int, old_stage: Stage, new_stage: Stage
+    ):
+        self.task = task
+        self.instance = instance
+        self.old_stage = old_stage
+        self.new_stage = new_stage
+        self.time = time.time()
+
+    @property
+    def exit_code(self) -> Optional[int]:
+        return getattr(self.new_stage, "exit_code", None)
+
+
+class Subscription:
+    """
+    Transitions waiting to be sent to one subscriber.
+
+    Once the queue is full, a transition of an instance that already has
+    one pending is merged into it, keeping the older stage it left, and
+    any other evicts the oldest pending transition.
+    """
+
+    bus: EventBus
+    # Only these tasks, every task when None
+    tasks: Optional[frozenset[str]]
+    max_size: int
+    queue: deque[Transition]
+    # Most recent queued transition of each instance
+    latest: dict[tuple[str, int], Transition]
+    waiter: Optional[asyncio.Future[None]]
+    # Since the last transition handed out
+    dropped: int
+    coalesced: int
+
+    def __init__(
+        self,
+        bus: EventBus,
+        tasks: Optional[frozenset[str]],
+        max_size: int,
+    ):
+        self.bus = bus
+        self.tasks = tasks
+        self.max_size = max_size
+        self.queue = deque()
+        self.latest = {}
+        self.waiter = None
+        self.dropped = 0
+        self.coalesced = 0
+
+    def push(self, transition: Transition):
+        if self.tasks is not None and transition.task not in self.tasks:
+            return
+
+        key = (transition.task, transition.instance)
+        if self.max_size <= len(self.queue):
+            pending = self.latest.get(key)
+            if pending is not None:
+                pending.new_stage = transition.new_stage
+                pending.time = transition.time
+                self.coalesced += 1
+                return
+
+            self.forget(self.queue.popleft())
+            self.dropped += 1
+
+        # Copied, as coalescing modifies queued transitions
+        transition = Transition(
+            transition.task,
+            transition.instance,
+            transition.old_stage,
+            transition.new_stage,
+        )
+        self.queue.append(transition)
+        self.latest[key] = transition
+
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def forget(self, transition: Transition):
+        key = (transition.task, transition.instance)
+        if self.latest.get(key) is transition:
+            del self.latest[key]
+
+    async def get(self) -> Transition:
+        while len(self.queue) == 0:
+            self.waiter = asyncio.get_running_loop().create_future()
+            await self.waiter
+        self.waiter = None
+
+        transition = self.queue.popleft()
+        self.forget(transition)
+        return transition
+
+    def close(self):
+        self.bus.subscriptions.discard(self)
+
+
+class EventBus:
+    """Fans stage transitions out to every subscriber, without blocking."""
+
+    subscriptions: set[Subscription]
+
+    def __init__(self):
+        self.subscriptions = set()
+
+    def subscribe(
+        self,
+        tasks: Optional[frozenset[str]] = None,
+        max_size: int = WATCH_QUEUE_SIZE,
+    ) -> Subscription:
+        subscription = Subscription(self, tasks, max_size)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def publish(self, transition: Transition):
+        for subscription in self.subscriptions:
+            subscription.push(transition)
+
+
+event_buses: dict[asyncio.AbstractEventLoop, EventBus] = {}
+
+
+def get_event_bus() -> EventBus:
+    """Event bus of the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    event_bus = event_buses.get(loop)
+    if event_bus is None:
+        event_bus = EventBus()
+        event_buses[loop] = event_bus
+    return event_bus
@@ -1,62 +1,137 @@
 from __future__ import annotations
 
-import os
+import time
 import asyncio
 
-from typing import Any
+from enum import IntEnum
 from logging import Logger
+from typing import Optional
 from signal import Signals
-from datetime import datetime
+from reaper import Child
+from spawn import SpawnContext
+from events import Transition, get_event_bus
+from timer_wheel import get_timer_wheel
+from metrics import Counter, Histogram, registry
+from spawn_scheduler import SpawnPermit, get_spawn_scheduler
+from restart_policy import BreakerState, backoff_delay
 from config import TaskDescription, RestartCondition
 from abc import ABC, abstractmethod
-from asyncio.subprocess import Process, create_subprocess_exec
 
 
-async def create_subprocess(desc: TaskDescription) -> Process:
-    arguments: dict[str, Any] = {}
-    if desc.environment is not None:
-        env = os.environ.copy()
-        env.update(desc.environment)
-        arguments["env"] = env
-
-    if desc.pwd is not None:
-        # In the arguments it is called `cwd` for current working directory
-        arguments["cwd"] = desc.pwd
-
-    if desc.umask is not None:
-        arguments["umask"] = desc.umask
-
-    try:
-        if desc.stdout is not None:
-            arguments["stdout"] = open(desc.stdout, mode="w+b")
-
-        if desc.stderr is not None:
-            arguments["stderr"] = open(desc.stderr, mode="w+b")
-    except Exception:
-        if arguments.get("stdout") is not None:
-            arguments["stdout"].close()
-
-        if arguments.get("stderr") is not None:
-            arguments["stderr"].close()
-
-        raise
-
-    return await create_subprocess_exec(
-        "/bin/bash", "-c", desc.command, **arguments
-    )
+SPAWN_LATENCY = registry.histogram(
+    "spawn_duration_seconds", "Time to create a process"
+)
+STAGE_TIME = registry.family(
+    "stage_duration_seconds",
+    "Time instances spent in each stage",
+    "stage",
+    Histogram,
+)
+RESTARTS = registry.family(
+    "restarts_total", "Processes spawned again, by task", "task", Counter
+)
+
+
+class State(IntEnum):
+    NOT_STARTED = 0
+    STARTING = 1
+    RUNNING = 2
+    BACKING_OFF = 3
+    EXITING = 4
+    EXITED = 5
+    OUT_OF_START_ATTEMPTS = 6
+    FATAL = 7
+
+
+# Metric labels, computed once
+STATE_NAMES: dict[State, str] = {state: state.name.lower() for state in State}
+ACTIVE_STATES = frozenset(
+    (State.STARTING, State.RUNNING, State.BACKING_OFF, State.EXITING)
+)
+
+
+def first_done(*futures: asyncio.Future) -> asyncio.Future[None]:
+    """
+    Resolved once any of `futures` is done, like `asyncio.wait` returning
+    on the first completed but without a coroutine nor a copy of the
+    futures. Cancelling it leaves `futures` alone.
+    """
+
+    waiter = asyncio.get_running_loop().create_future()
+    for future in futures:
+        if future.done():
+            waiter.set_result(None)
+            return waiter
+
+    def on_done(_):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def forget(_):
+        for future in futures:
+            future.remove_done_callback(on_done)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    waiter.add_done_callback(forget)
+    return waiter
+
+
+class Flag:
+    """
+    One shot event, backed by a future once someone waits for it, so it
+    can be waited on together with other futures without creating a task.
+    """
+
+    __slots__ = ("flagged", "waiter")
+
+    flagged: bool
+    # Most flags are never waited on
+    waiter: Optional[asyncio.Future[None]]
+
+    def __init__(self):
+        self.flagged = False
+        self.waiter = None
+
+    @property
+    def future(self) -> asyncio.Future[None]:
+        if self.waiter is None:
+            self.waiter = asyncio.get_running_loop().create_future()
+            if self.flagged:
+                self.waiter.set_result(None)
+        return self.waiter
+
+    def set(self):
+        self.flagged = True
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def is_set(self) -> bool:
+        return self.flagged
+
+    async def wait(self):
+        if not self.flagged:
+            await first_done(self.future)
 
 
 class Stage(ABC):
     """Absctract base status class for polymorphism."""
 
-    desc: TaskDescription
-    should_start: asyncio.Event
-    should_stop: asyncio.Event
+    __slots__ = ("context", "should_start", "should_stop")
+
+    state: State
+    context: SpawnContext
+    should_start: Flag
+    should_stop: Flag
 
-    def __init__(self, desc: TaskDescription):
-        self.desc = desc
-        self.should_start = asyncio.Event()
-        self.should_stop = asyncio.Event()
+    def __init__(self, context: SpawnContext):
+        self.context = context
+        self.should_start = Flag()
+        self.should_stop = Flag()
+
+    @property
+    def desc(self) -> TaskDescription:
+        return self.context.desc
 
     async def next(self) -> Stage:
         """Go to next stage."""
@@ -65,30 +140,62 @@ class Stage(ABC):
 
         return await self.attempt_start()
 
-    async def attempt_start(self, attempt: int = 1) -> Stage:
+    async def attempt_start(
+        self, attempt: int = 1, failures: int = 0
+    ) -> Stage:
         """Try to make the start stage and fallback to Fatal otherwise."""
         if self.desc.start_attempts < attempt:
-            return OutOfStartAttempts(self.desc)
+            return OutOfStartAttempts(self.context)
 
-        subprocess_creation = asyncio.create_task(create_subprocess(self.desc))
-        should_stop_task = asyncio.create_task(self.should_stop.wait())
-        await asyncio.wait(
-            (subprocess_creation, should_stop_task),
-            return_when=asyncio.FIRST_COMPLETED,
+        # Wait for our turn, unless asked to stop in the meantime
+        permit_request = get_spawn_scheduler().acquire(
+            self.context.spawn_queue
         )
+        try:
+            await first_done(permit_request, self.should_stop.future)
+        except asyncio.CancelledError:
+            # The instance is done with, do not keep the spawn slot
+            if not permit_request.done():
+                permit_request.cancel()
+            elif not permit_request.cancelled():
+                permit_request.result().release()
+            raise
+
+        if not permit_request.done():
+            permit_request.cancel()
+            # Process creation was interrupted
+            return NotStarted(self.context)
+
+        permit = permit_request.result()
+        if self.should_stop.is_set():
+            permit.release()
+            return NotStarted(self.context)
 
-        if not should_stop_task.done():
-            should_stop_task.cancel()
+        spawn_start = time.perf_counter()
+        try:
+            process = await self.context.create_subprocess()
+        except Exception as exception:
+            permit.release()
+            return Fatal(self.context, exception)
+        SPAWN_LATENCY.observe(time.perf_counter() - spawn_start)
 
-        if subprocess_creation.done():
-            exception = subprocess_creation.exception()
-            if isinstance(exception, Exception):
-                return Fatal(self.desc, exception)
-            process = subprocess_creation.result()
-            return Starting(self.desc, process, attempt)
+        return Starting(self.context, process, attempt, permit, failures)
 
-        # Process creation was interrupted
-        return NotStarted(self.desc)
+    def back_off(self, exit_code: int, attempt: int, failures: int) -> Stage:
+        """Wait before the next start attempt after a failure."""
+        if self.desc.start_attempts < attempt:
+            return OutOfStartAttempts(self.context)
+
+        now = get_timer_wheel().now()
+        circuit_breaker = self.context.circuit_breaker
+        circuit_breaker.record_failure(now)
+        delay = max(
+            backoff_delay(self.desc.restart_backoff, failures),
+            circuit_breaker.remaining_pause(now),
+        )
+        return BackingOff(
+            self.context, exit_code, attempt, failures, now + delay
+        )
 
     @abstractmethod
     def __repr__(self) -> str:
@@ -98,10 +205,12 @@ class Stage(ABC):
 class StageWithProcess(Stage):
     """Stage with a running process attached to it"""
 
-    process: Process
+    __slots__ = ("process",)
+
+    process: Child
 
-    def __init__(self, desc: TaskDescription, process: Process):
-        super().__init__(desc)
+    def __init__(self, context: SpawnContext, process: Child):
+        super().__init__(context)
         self.process = process
 
     def stop(self):
@@ -114,8 +223,11 @@ class StageWithProcess(Stage):
 class NotStarted(Stage):
     """Task has not been started yet."""
 
-    def __init__(self, desc: TaskDescription):
-        super().__init__(desc)
+    __slots__ = ()
+    state = State.NOT_STARTED
+
+    def __init__(self, context: SpawnContext):
+        super().__init__(context)
 
     async def next(self) -> Stage:
         if not self.desc.start_on_launch:
@@ -130,47 +242,71 @@ class NotStarted(Stage):
 class Starting(StageWithProcess):
     """Task is attempting to start."""
 
-    attempt: int
-    start_time: datetime
+    __slots__ = ("attempt", "start_time", "permit", "failures")
+    state = State.STARTING
 
-    def __init__(self, desc: TaskDescription, process: Process, attempt: int):
-        super().__init__(desc, process)
+    attempt: int
+    # Monotonic, from the event loop's clock
+    start_time: float
+    # Held until the process is running or has failed to start
+    permit: SpawnPermit
+    # Consecutive failures, for the restart backoff
+    failures: int
+
+    def __init__(
+        self,
+        context: SpawnContext,
+        process: Child,
+        attempt: int,
+        permit: SpawnPermit,
+        failures: int,
+    ):
+        super().__init__(context, process)
         self.attempt = attempt
-        self.start_time = datetime.now()
+        self.start_time = get_timer_wheel().now()
+        self.permit = permit
+        self.failures = failures
+
+    def running(self) -> Running:
+        now = get_timer_wheel().now()
+        self.context.circuit_breaker.record_success(now)
+        return Running(
+            self.context, self.process, self.failures, self.start_time
+        )
 
     async def next(self) -> Stage:
+        timer_wheel = get_timer_wheel()
+
         # Check if time has already elapsed
-        elapsed = datetime.now() - self.start_time
-        if self.desc.start_timeout < elapsed:
-            return Running(self.desc, self.process)
-
-        remainig_wait = (self.desc.start_timeout - elapsed).total_seconds()
-        process_stopped = asyncio.create_task(self.process.wait())
-        wait_start = asyncio.create_task(asyncio.sleep(remainig_wait))
-        should_stop_task = asyncio.create_task(self.should_stop.wait())
-
-        await asyncio.wait(
-            (
-                wait_start,
-                process_stopped,
-                should_stop_task,
-            ),
-            return_when=asyncio.FIRST_COMPLETED,
+        elapsed = timer_wheel.now() - self.start_time
+        remaining_wait = self.desc.start_timeout.total_seconds() - elapsed
+        if remaining_wait <= 0:
+            self.permit.release()
+            return self.running()
+
+        process_stopped = self.process.exited
+        wait_start = timer_wheel.deadline(remaining_wait)
+
+        await first_done(
+            wait_start, process_stopped, self.should_stop.future
         )
 
-        if not should_stop_task.done():
-            should_stop_task.cancel()
+        wait_start.cancel()
+        self.permit.release()
 
         if process_stopped.done():
+            exit_code = process_stopped.result()
             if self.should_stop.is_set():
-                return Exited(self.desc, process_stopped.result())
-            return await self.attempt_start(self.attempt + 1)
+                return Exited(self.context, exit_code)
+            return self.back_off(
+                exit_code, self.attempt + 1, self.failures + 1
+            )
 
         if self.should_stop.is_set():
             self.stop()
-            return Exiting(self.desc, self.process)
+            return Exiting(self.context, self.process)
 
-        return Running(self.desc, self.process)
+        return self.running()
 
     def __repr__(self) -> str:
         return f"starting attempt n˚{self.attempt}"
@@ -179,45 +315,127 @@ class Starting(StageWithProcess):
 class OutOfStartAttempts(Stage):
     """Task has been attempted to start too many unsuccessful times."""
 
-    def __init__(self, desc: TaskDescription):
-        super().__init__(desc)
+    __slots__ = ()
+    state = State.OUT_OF_START_ATTEMPTS
+
+    def __init__(self, context: SpawnContext):
+        super().__init__(context)
 
     def __repr__(self) -> str:
         return "out of start attempts"
 
 
+class BackingOff(Stage):
+    """Task is waiting before attempting to start again after a failure."""
+
+    __slots__ = ("exit_code", "attempt", "failures", "restart_time")
+    state = State.BACKING_OFF
+
+    exit_code: int
+    attempt: int
+    failures: int
+    # Monotonic, from the event loop's clock
+    restart_time: float
+
+    def __init__(
+        self,
+        context: SpawnContext,
+        exit_code: int,
+        attempt: int,
+        failures: int,
+        restart_time: float,
+    ):
+        super().__init__(context)
+        self.exit_code = exit_code
+        self.attempt = attempt
+        self.failures = failures
+        self.restart_time = restart_time
+
+    async def next(self) -> Stage:
+        timer_wheel = get_timer_wheel()
+
+        remaining_wait = self.restart_time - timer_wheel.now()
+        if 0 < remaining_wait:
+            wait_restart = timer_wheel.deadline(remaining_wait)
+            await first_done(wait_restart, self.should_stop.future)
+            wait_restart.cancel()
+
+        if self.should_stop.is_set():
+            return Exited(self.context, self.exit_code)
+
+        # Other instances may have tripped the breaker in the meantime
+        now = timer_wheel.now()
+        pause = self.context.circuit_breaker.remaining_pause(now)
+        if 0 < pause:
+            return BackingOff(
+                self.context,
+                self.exit_code,
+                self.attempt,
+                self.failures,
+                now + pause,
+            )
+
+        return await self.attempt_start(self.attempt, self.failures)
+
+    def __repr__(self) -> str:
+        now = get_timer_wheel().now()
+        remaining = max(0, self.restart_time - now)
+        state = self.context.circuit_breaker.state(now)
+        if state == BreakerState.OPEN:
+            return f"crash loop, restarting in {remaining:.1f}s"
+        return f"backing off, restarting in {remaining:.1f}s"
+
+
 class Running(StageWithProcess):
     """Task is running as it should be."""
 
-    def __init__(self, desc: TaskDescription, process: Process):
-        super().__init__(desc, process)
+    __slots__ = ("failures", "start_time")
+    state = State.RUNNING
 
-    async def next(self) -> Stage:
-        process_wait = asyncio.create_task(self.process.wait())
-        should_stop_task = asyncio.create_task(self.should_stop.wait())
-        await asyncio.wait(
-            (process_wait, should_stop_task),
-            return_when=asyncio.FIRST_COMPLETED,
-        )
+    failures: int
+    # Monotonic, from the event loop's clock
+    start_time: float
+
+    def __init__(
+        self,
+        context: SpawnContext,
+        process: Child,
+        failures: int,
+        start_time: float,
+    ):
+        super().__init__(context, process)
+        self.failures = failures
+        self.start_time = start_time
 
-        if not should_stop_task.done():
-            should_stop_task.cancel()
+    async def next(self) -> Stage:
+        process_wait = self.process.exited
+        await first_done(process_wait, self.should_stop.future)
 
         if process_wait.done():
             exit_code = process_wait.result()
             match self.desc.restart:
                 case RestartCondition.NEVER:
-                    return Exited(self.desc, exit_code)
+                    return Exited(self.context, exit_code)
                 case RestartCondition.ON_FAILURE:
                     if exit_code in self.desc.success_exit_codes:
-                        return Exited(self.desc, exit_code)
+                        return Exited(self.context, exit_code)
 
         if self.should_stop.is_set():
             self.stop()
-            return Exiting(self.desc, self.process)
+            return Exiting(self.context, self.process)
+
+        exit_code = process_wait.result()
+        if exit_code in self.desc.success_exit_codes:
+            # Done with its job, not failing: no backoff nor crash loop
+            return await self.attempt_start()
 
         # Conditions are met to restart
-        return await self.attempt_start()
+        failures = self.failures
+        uptime = get_timer_wheel().now() - self.start_time
+        if self.desc.restart_backoff.max.total_seconds() <= uptime:
+            # Ran long enough for the previous failures to be forgotten
+            failures = 0
+        return self.back_off(exit_code, 1, failures + 1)
 
     def __repr__(self) -> str:
         return f"running (pid: {self.process.pid})"
@@ -226,30 +444,34 @@ class Running(StageWithProcess):
 class Exiting(StageWithProcess):
     """Task is exciting."""
 
-    start_exiting_time: datetime
+    __slots__ = ("start_exiting_time",)
+    state = State.EXITING
+
+    # Monotonic, from the event loop's clock
+    start_exiting_time: float
 
-    def __init__(self, desc: TaskDescription, process: Process):
-        super().__init__(desc, process)
-        self.start_exiting_time = datetime.now()
+    def __init__(self, context: SpawnContext, process: Child):
+        super().__init__(context, process)
+        self.start_exiting_time = get_timer_wheel().now()
 
-    # TODO: support events
-    # TODO: manage stdout & stderr (maybe)
     async def next(self) -> Stage:
+        timer_wheel = get_timer_wheel()
+
         # Check if time has already elapsed
-        elapsed = datetime.now() - self.start_exiting_time
-        if self.desc.start_timeout < elapsed:
-            return Running(self.desc, self.process)
+        elapsed = timer_wheel.now() - self.start_exiting_time
+        to_wait = self.desc.shutdown_timeout.total_seconds() - elapsed
 
-        to_wait = (self.desc.shutdown_timeout - elapsed).total_seconds()
+        if 0 < to_wait:
+            shutdown_timeout = timer_wheel.deadline(to_wait)
+            await first_done(self.process.exited, shutdown_timeout)
+            shutdown_timeout.cancel()
 
-        try:
-            exit_code = await asyncio.wait_for(self.process.wait(), to_wait)
-        except asyncio.TimeoutError:
+        if not self.process.exited.done():
             # Forceful exit
             self.process.kill()
-            exit_code = await self.process.wait()
 
-        return Exited(self.desc, exit_code)
+        exit_code = await self.process.wait()
+        return Exited(self.context, exit_code)
 
     def __repr__(self) -> str:
         return f"exiting (pid: {self.process.pid})"
@@ -258,10 +480,13 @@ class Exiting(StageWithProcess):
 class Exited(Stage):
     """Task has excited, gracefully or forcefully."""
 
+    __slots__ = ("exit_code",)
+    state = State.EXITED
+
     exit_code: int
 
-    def __init__(self, desc: TaskDescription, exit_code: int):
-        super().__init__(desc)
+    def __init__(self, context: SpawnContext, exit_code: int):
+        super().__init__(context)
         self.exit_code = exit_code
 
     def __repr__(self) -> str:
@@ -275,10 +500,13 @@ class Exited(Stage):
 class Fatal(Stage):
     """Faced a fatal error trying to start."""
 
+    __slots__ = ("exception",)
+    state = State.FATAL
+
     exception: Exception
 
-    def __init__(self, desc: TaskDescription, exception: Exception):
-        super().__init__(desc)
+    def __init__(self, context: SpawnContext, exception: Exception):
+        super().__init__(context)
         self.exception = exception
 
     def __repr__(self) -> str:
@@ -286,26 +514,106 @@ class Fatal(Stage):
 
 
 class Instance:
+    """
+    Runs the stages of one replica, in the task it is run in. Events are
+    only allocated for what is waited on, so idle instances stay small.
+    """
+
+    __slots__ = (
+        "stage",
+        "stage_time",
+        "shutting_down",
+        "finished",
+        "logger",
+        "spawns",
+        "last_exit_code",
+        "wants_start",
+        "started",
+        "started_waiter",
+        "restart_counter",
+        "runner",
+        "pid",
+    )
+
     stage: Stage
+    # Monotonic, when the current stage was entered
+    stage_time: float
     shutting_down: bool
-    finished: asyncio.Event
+    # Shutting down and no process left, the run is over
+    finished: bool
     logger: Logger
-
-    def __init__(self, desc: TaskDescription, logger: Logger):
-        self.stage = NotStarted(desc)
+    # Processes spawned so far
+    spawns: int
+    last_exit_code: Optional[int]
+    # Asked to start since the last stop, not acted upon yet
+    wants_start: bool
+    # Whether the first process got running, None until known
+    started: Optional[bool]
+    started_waiter: Optional[asyncio.Future[bool]]
+    # Restarts of the task's instances, shared with them
+    restart_counter: Counter
+    # Task executing `run`, while it waits for the next stage
+    runner: Optional[asyncio.Task[None]]
+    # Process of the current stage, 0 without one
+    pid: int
+
+    def __init__(self, context: SpawnContext, logger: Logger):
+        self.stage = NotStarted(context)
+        self.stage_time = get_timer_wheel().now()
         self.logger = logger
         self.shutting_down = False
-        self.finished = asyncio.Event()
+        self.finished = False
+        self.spawns = 0
+        self.last_exit_code = None
+        self.wants_start = False
+        self.started = None
+        self.started_waiter = None
+        self.restart_counter = RESTARTS.labels(context.name)
+        self.runner = None
+        self.pid = 0
+
+    @property
+    def restarts(self) -> int:
+        return max(0, self.spawns - 1)
+
+    def record(self, stage: Stage):
+        """Keep track of what happened to the instance's processes."""
+        match stage.state:
+            case State.STARTING:
+                self.spawns += 1
+                if 1 < self.spawns:
+                    self.restart_counter.inc()
+                self.wants_start = False
+        if isinstance(stage, (Exited, BackingOff)):
+            self.last_exit_code = stage.exit_code
+
+        if self.started is None:
+            match stage.state:
+                case State.RUNNING:
+                    self.set_started(True)
+                case State.EXITED | State.OUT_OF_START_ATTEMPTS | State.FATAL:
+                    self.set_started(False)
+
+        # Asked to start while exiting, only the last wish counts
+        if self.wants_start and stage.state == State.EXITED:
+            stage.should_start.set()
+
+    def set_started(self, started: bool):
+        self.started = started
+        if self.started_waiter is not None:
+            self.started_waiter.set_result(started)
 
     def start(self):
         if self.shutting_down:
             self.logger.warn("Asked to stop while shutting down")
         else:
             self.logger.info("Starting")
+            self.wants_start = True
             self.stage.should_start.set()
 
     def stop(self):
         self.logger.info("Stopping")
+        self.wants_start = False
         self.stage.should_stop.set()
 
     def shutdown(self):
@@ -316,26 +624,65 @@ class Instance:
 
     def update_finished(self):
         has_no_process = not isinstance(self.stage, StageWithProcess)
-        if self.shutting_down and has_no_process:
-            self.finished.set()
-
-    def update_description(self, desc: TaskDescription):
-        self.stage.desc = desc
+        if self.shutting_down and has_no_process and not self.finished:
+            self.finished = True
+            # Nothing left to wait for in the current stage
+            if self.runner is not None:
+                self.runner.cancel()
+
+    def is_active(self) -> bool:
+        """Running or on its way to, as opposed to stopped or given up."""
+        return self.stage.state in ACTIVE_STATES
+
+    async def wait_started(self) -> bool:
+        if self.started is not None:
+            return self.started
+        if self.started_waiter is None:
+            loop = asyncio.get_running_loop()
+            self.started_waiter = loop.create_future()
+        return await asyncio.shield(self.started_waiter)
+
+    def update_context(self, context: SpawnContext):
+        self.stage.context = context
+
+    def enter(self, stage: Stage):
+        previous = self.stage
+        self.stage = stage
+        now = get_timer_wheel().now()
+        STAGE_TIME.labels(STATE_NAMES[previous.state]).observe(
+            now - self.stage_time
+        )
+        self.stage_time = now
+        if isinstance(stage, StageWithProcess):
+            self.pid = stage.process.pid
+        else:
+            self.pid = 0
+        self.record(stage)
+        context = stage.context
+        get_event_bus().publish(
+            Transition(context.name, context.replica, previous, stage)
+        )
+        self.logger.info(f"{stage}")
 
     async def run(self) -> None:
-        wait_until_finished = asyncio.create_task(self.finished.wait())
-        wait_for_next_stage = asyncio.create_task(self.stage.next())
-        while not self.finished.is_set():
-            await asyncio.wait(
-                (wait_until_finished, wait_for_next_stage),
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            if wait_for_next_stage.done():
-                self.stage = wait_for_next_stage.result()
-                wait_for_next_stage = asyncio.create_task(self.stage.next())
-                self.logger.info(f"{self.stage}")
-
-            self.update_finished()
-
+        # Stages are awaited right here rather than in a task of their own,
+        # finishing cancels the wait instead
+        try:
+            while not self.finished:
+                self.runner = asyncio.current_task()
+                stage = await self.stage.next()
+                self.runner = None
+                self.enter(stage)
+                self.update_finished()
+        except asyncio.CancelledError:
+            if not self.finished:
+                raise
+            task = asyncio.current_task()
+            if task is not None:
+                task.uncancel()
+        finally:
+            self.runner = None
+
+        if self.started is None:
+            self.set_started(False)
         self.logger.debug("Quitting loop")
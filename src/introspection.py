@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import heapq
+import linecache
+import asyncio
+import threading
+
+from asyncio import format_helpers
+from collections import Counter
+from types import FrameType
+from typing import Optional
+from metrics import registry
+
+
+# Seconds between two samples of the profiler
+DEFAULT_PROFILE_INTERVAL = 0.005
+MAX_PROFILE_SECONDS = 60.0
+# Frames of a task's stack in a dump
+STACK_LIMIT = 32
+# Callbacks slower than that many seconds are reported
+DEFAULT_SLOW_CALLBACK = 0.05
+SLOW_CALLBACKS_KEPT = 20
+
+SLOW_CALLBACKS = registry.counter(
+    "slow_callbacks_total", "Event loop callbacks slower than the threshold"
+)
+
+
+class ProfilerBusy(Exception):
+    """Only one profile at a time, they would skew each other."""
+
+
+class TaskDump:
+    name: str
+    coroutine: str
+    stack: str
+
+    def __init__(self, name: str, coroutine: str, stack: str):
+        self.name = name
+        self.coroutine = coroutine
+        self.stack = stack
+
+
+def dump_tasks() -> list[TaskDump]:
+    """Every task of the running event loop, with where it is waiting."""
+
+    dumps = []
+    for task in asyncio.all_tasks():
+        coroutine = task.get_coro()
+        name = getattr(coroutine, "__qualname__", repr(coroutine))
+        stack = format_stack(task.get_stack(limit=STACK_LIMIT))
+        dumps.append(TaskDump(task.get_name(), name, stack))
+    dumps.sort(key=lambda dump: dump.coroutine)
+    return dumps
+
+
+def format_stack(frames: list[FrameType]) -> str:
+    """
+    Like `Task.print_stack`, which fails on the frames that have no line
+    number, as the ones suspended in some extension modules.
+    """
+
+    lines = []
+    for frame in frames:
+        code = frame.f_code
+        lineno = frame.f_lineno
+        lines.append(
+            f'  File "{code.co_filename}", line {lineno}, in {code.co_name}\n'
+        )
+        if lineno is not None:
+            source = linecache.getline(code.co_filename, lineno).strip()
+            if source != "":
+                lines.append(f"    {source}\n")
+    return "".join(lines)
+
+
+def frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_qualname}"
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """Stack as `outermost;...;innermost`, the flame graph format."""
+
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+class Profiler:
+    """
+    Samples the stack of a thread from another one, so the event loop is
+    only slowed down by the sampling thread taking the GIL.
+    """
+
+    lock: threading.Lock
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def sample(
+        self, thread_id: int, seconds: float, interval: float
+    ) -> tuple[Counter[str], int]:
+        """Collapsed stacks and how many samples were taken."""
+
+        if not self.lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already being taken")
+        try:
+            stacks: Counter[str] = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is None:
+                    break
+                stacks[collapse(frame)] += 1
+                samples += 1
+                # The frame keeps every local variable of the stack alive
+                del frame
+                time.sleep(interval)
+            return (stacks, samples)
+        finally:
+            self.lock.release()
+
+    async def profile(
+        self, seconds: float, interval: float = DEFAULT_PROFILE_INTERVAL
+    ) -> tuple[Counter[str], int]:
+        """Profile the thread of the running event loop for a while."""
+        thread_id = threading.get_ident()
+        return await asyncio.to_thread(
+            self.sample, thread_id, seconds, interval
+        )
+
+
+profiler = Profiler()
+
+
+class SlowCallback:
+    duration: float
+    # Unix time it started at
+    time: float
+    callback: str
+
+    def __init__(self, duration: float, when: float, callback: str):
+        self.duration = duration
+        self.time = when
+        self.callback = callback
+
+    def __lt__(self, other: SlowCallback) -> bool:
+        return self.duration < other.duration
+
+
+def describe(handle: asyncio.Handle) -> str:
+    # Private and missing from the stubs, like asyncio's own debug uses
+    callback = handle._callback  # type: ignore[attr-defined]
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        # A step of a task, more telling than the step method
+        coroutine = owner.get_coro()
+        name = getattr(coroutine, "__qualname__", repr(coroutine))
+        return f"task {owner.get_name()} ({name})"
+    return format_helpers._format_callback_source(callback, handle._args)
+
+
+class SlowCallbackMonitor:
+    """
+    Times every callback run by the event loops of the process and keeps
+    the slowest ones, as asyncio's debug mode would but without its other
+    costs: about 0.4µs per callback once installed, which only happens
+    when asked to.
+    """
+
+    threshold: float
+    # Min-heap, the fastest of the slowest first
+    slowest: list[SlowCallback]
+    count: int
+    installed: bool
+
+    def __init__(self, threshold: float = DEFAULT_SLOW_CALLBACK):
+        self.threshold = threshold
+        self.slowest = []
+        self.count = 0
+        self.installed = False
+
+    def install(self):
+        if self.installed:
+            return
+        self.installed = True
+        run = asyncio.Handle._run
+        monitor = self
+
+        def timed_run(handle: asyncio.Handle):
+            start = time.perf_counter()
+            run(handle)
+            duration = time.perf_counter() - start
+            if monitor.threshold <= duration:
+                monitor.record(handle, duration)
+
+        asyncio.Handle._run = timed_run
+
+    def record(self, handle: asyncio.Handle, duration: float):
+        self.count += 1
+        SLOW_CALLBACKS.inc()
+        slow = SlowCallback(duration, time.time() - duration, describe(handle))
+        if len(self.slowest) < SLOW_CALLBACKS_KEPT:
+            heapq.heappush(self.slowest, slow)
+        elif self.slowest[0] < slow:
+            heapq.heapreplace(self.slowest, slow)
+
+    def report(self) -> list[SlowCallback]:
+        """Slowest first."""
+        return sorted(self.slowest, reverse=True)
+
+    def reset(self):
+        self.slowest = []
+        self.count = 0
+
+
+slow_callbacks = SlowCallbackMonitor()
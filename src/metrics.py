@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import math
+import asyncio
+import logging
+
+from bisect import bisect_left
+from typing import Callable, Generic, Iterator, Optional, TypeVar, Union
+
+
+logger = logging.getLogger(__name__)
+
+# Prefix of every metric name exposed to Prometheus
+NAMESPACE = "taskmaster"
+# Upper bounds, in seconds
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+# Seconds between two event loop lag measurements
+LAG_INTERVAL = 0.5
+# Seconds a client has to send its request
+HTTP_TIMEOUT = 5.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[tuple[str, str], ...]
+# Suffix of the metric name, labels and value
+Sample = tuple[str, Labels, float]
+
+
+class Counter:
+    """Only ever goes up."""
+
+    __slots__ = ("value",)
+    kind = "counter"
+
+    value: float
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def samples(self, labels: Labels) -> Iterator[Sample]:
+        yield ("", labels, self.value)
+
+
+class Gauge:
+    """Goes up and down."""
+
+    __slots__ = ("value",)
+    kind = "gauge"
+
+    value: float
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def samples(self, labels: Labels) -> Iterator[Sample]:
+        yield ("", labels, self.value)
+
+
+class Histogram:
+    """
+    Count of observations in each bucket, allocated up front. Buckets are
+    only made cumulative when exposed, so observing is a bisection and a
+    few additions.
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    bounds: tuple[float, ...]
+    # One more than bounds, for the values above all of them
+    counts: list[int]
+    sum: float
+    count: int
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, labels: Labels) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            le = (("le", format_value(bound)),)
+            yield ("_bucket", labels + le, cumulative)
+        yield ("_bucket", labels + (("le", "+Inf"),), self.count)
+        yield ("_sum", labels, self.sum)
+        yield ("_count", labels, self.count)
+
+
+Metric = Union[Counter, Gauge, Histogram]
+M = TypeVar("M", Counter, Gauge, Histogram)
+
+
+class Family(Generic[M]):
+    """
+    Metrics told apart by the value of one label, like the task name.
+
+    Children are created on first use and kept, so holding on to one or
+    looking it up by an existing object does not allocate.
+    """
+
+    label: str
+    factory: Callable[[], M]
+    kind: str
+    children: dict[object, M]
+
+    def __init__(self, label: str, factory: Callable[[], M]):
+        self.label = label
+        self.factory = factory
+        self.kind = factory().kind
+        self.children = {}
+
+    def labels(self, value: object) -> M:
+        child = self.children.get(value)
+        if child is None:
+            child = self.factory()
+            self.children[value] = child
+        return child
+
+    def remove(self, value: object):
+        self.children.pop(value, None)
+
+    def samples(self, labels: Labels) -> Iterator[Sample]:
+        for value, child in list(self.children.items()):
+            yield from child.samples(labels + ((self.label, str(value)),))
+
+
+class Registry:
+    """
+    Named metrics, and collectors returning the values kept elsewhere, like
+    the queue depths, when they are asked for.
+    """
+
+    metrics: dict[str, tuple[str, Union[Metric, Family]]]
+    collectors: list[Callable[[], dict[str, float]]]
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def register(self, name: str, help: str, metric):
+        if name in self.metrics:
+            raise ValueError(f"Metric {name} is already registered")
+        self.metrics[name] = (help, metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(name, help, Counter())
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self.register(name, help, Gauge())
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        bounds: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(name, help, Histogram(bounds))
+
+    def family(
+        self, name: str, help: str, label: str, factory: Callable[[], M]
+    ) -> Family[M]:
+        return self.register(name, help, Family(label, factory))
+
+    def add_collector(self, collector: Callable[[], dict[str, float]]):
+        self.collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], dict[str, float]]):
+        if collector in self.collectors:
+            self.collectors.remove(collector)
+
+    def collect(self) -> dict[str, float]:
+        values = {}
+        for collector in self.collectors:
+            values.update(collector())
+        return values
+
+    def values(self) -> dict[str, float]:
+        """Every sample by name and labels, as in the text format."""
+
+        values = {}
+        for name, (_, metric) in self.metrics.items():
+            for suffix, labels, value in metric.samples(()):
+                values[f"{name}{suffix}{format_labels(labels)}"] = value
+        values.update(self.collect())
+        return values
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+
+        lines = []
+        for name, (help, metric) in self.metrics.items():
+            name = f"{NAMESPACE}_{name}"
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for suffix, labels, value in metric.samples(()):
+                lines.append(
+                    f"{name}{suffix}{format_labels(labels)}"
+                    f" {format_value(value)}"
+                )
+        for name, value in sorted(self.collect().items()):
+            name = f"{NAMESPACE}_{name}"
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {format_value(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+def format_labels(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape(value)}"' for name, value in labels
+    )
+    return f"{{{pairs}}}"
+
+
+def escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if 0 < value else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = Registry()
+
+LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay of event loop callbacks past their due time",
+)
+RPC_LATENCY: Family[Histogram] = registry.family(
+    "rpc_duration_seconds",
+    "Time to handle an RPC, by method",
+    "method",
+    Histogram,
+)
+
+
+class LoopLagMonitor:
+    """
+    Schedules a callback at a fixed interval and measures how late it runs,
+    which is how long the event loop was kept busy by something else.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    interval: float
+    # Loop time the next callback is due at
+    due: float
+    handle: Optional[asyncio.TimerHandle]
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.loop = asyncio.get_running_loop()
+        self.interval = interval
+        self.due = 0.0
+        self.handle = None
+
+    def start(self):
+        self.due = self.loop.time() + self.interval
+        self.handle = self.loop.call_at(self.due, self.tick)
+
+    def tick(self):
+        now = self.loop.time()
+        LOOP_LAG.observe(max(0.0, now - self.due))
+        self.due = now + self.interval
+        self.handle = self.loop.call_at(self.due, self.tick)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+
+async def handle_http(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+):
+    try:
+        async with asyncio.timeout(HTTP_TIMEOUT):
+            request = await reader.readline()
+            # Headers are of no use
+            while (await reader.readline()).strip() != b"":
+                pass
+
+        parts = request.split()
+        path = parts[1].split(b"?")[0] if len(parts) > 1 else b""
+        if parts[:1] == [b"GET"] and path in (b"/", b"/metrics"):
+            (status, body) = ("200 OK", registry.render().encode())
+        else:
+            (status, body) = ("404 Not Found", b"Not found\n")
+
+        writer.write(
+            f"HTTP/1.0 {status}\r\n"
+            f"Content-Type: {CONTENT_TYPE}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+    except (TimeoutError, ConnectionError) as error:
+        logger.debug(f"Metrics request: {error!r}")
+    finally:
+        writer.close()
+
+
+async def serve_http(port: int, host: str = "localhost") -> asyncio.Server:
+    """Expose the registry to Prometheus on `http://host:port/metrics`."""
+    return await asyncio.start_server(handle_http, host, port)
@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import os
+import gzip
+import time
+import fcntl
+import shutil
+import asyncio
+import logging
+import threading
+
+from queue import SimpleQueue
+from typing import BinaryIO, Optional
+from config import LogRotation
+from timer_wheel import Timer, get_timer_wheel
+
+
+logger = logging.getLogger(__name__)
+
+# Handed to the writer thread once that much is buffered
+BATCH_SIZE = 64 * 1024
+# ... or once the oldest buffered output is that old
+BATCH_DELAY = 0.05
+# Output waiting for the writer thread above this is dropped
+MAX_QUEUED_BYTES = 64 * 1024 * 1024
+READ_SIZE = 64 * 1024
+# Linux's F_SETPIPE_SZ, so bursts do not fill the pipe before we read
+F_SETPIPE_SZ = 1031
+PIPE_SIZE = 1024 * 1024
+
+
+class OutputRing:
+    """
+    Most recent output of an instance, in a buffer allocated once so its
+    memory use never grows.
+    """
+
+    buffer: bytearray
+    # Bytes ever written, the buffer holds the last `len(buffer)` of them
+    written: int
+    waiters: list[asyncio.Future[None]]
+
+    def __init__(self, capacity: int):
+        self.buffer = bytearray(capacity)
+        self.written = 0
+        self.waiters = []
+
+    @property
+    def capacity(self) -> int:
+        return len(self.buffer)
+
+    @property
+    def oldest(self) -> int:
+        """Offset of the oldest byte still in the buffer."""
+        return max(0, self.written - self.capacity)
+
+    def write(self, data: bytes):
+        if self.capacity < len(data):
+            # Only the end would survive anyway
+            self.written += len(data) - self.capacity
+            data = data[-self.capacity:]
+
+        start = self.written % self.capacity
+        end = start + len(data)
+        if end <= self.capacity:
+            self.buffer[start:end] = data
+        else:
+            split = self.capacity - start
+            self.buffer[start:] = data[:split]
+            self.buffer[: end - self.capacity] = data[split:]
+        self.written += len(data)
+
+        for waiter in self.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self.waiters.clear()
+
+    def read(self, offset: int) -> bytes:
+        """Everything from `offset`, or from the oldest byte still there."""
+
+        offset = max(offset, self.oldest)
+        start = offset % self.capacity
+        end = self.written % self.capacity
+        size = self.written - offset
+        if size == 0:
+            return b""
+        if start < end:
+            return bytes(self.buffer[start:end])
+        return bytes(self.buffer[start:]) + bytes(self.buffer[:end])
+
+    def tail_offset(self, lines: int) -> int:
+        """Offset of the start of the last `lines` lines."""
+
+        content = self.read(self.oldest)
+        position = len(content)
+        # A trailing newline ends the last line rather than starting one
+        if content.endswith(b"\n"):
+            position -= 1
+        for _ in range(lines):
+            position = content.rfind(b"\n", 0, position)
+            if position == -1:
+                return self.oldest
+        return self.written - len(content) + position + 1
+
+    async def wait_beyond(self, offset: int):
+        """Wait for output past `offset`."""
+
+        if offset < self.written:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        await waiter
+
+
+class LogFile:
+    """
+    Output file of one or more replicas.
+
+    Output is buffered on the event loop and written in batches by the
+    writer thread, which also takes care of rotation.
+    """
+
+    path: str
+    rotation: LogRotation
+    writer: OutputWriter
+    # Event loop side
+    pending: list[bytes]
+    pending_size: int
+    flush_timer: Optional[Timer]
+    captures: int
+    closing: bool
+    dropped: int
+    # Writer thread side
+    file: BinaryIO
+    size: int
+    opened_at: float
+
+    def __init__(
+        self,
+        path: str,
+        rotation: LogRotation,
+        writer: OutputWriter,
+        file: Optional[BinaryIO] = None,
+    ):
+        self.path = path
+        self.rotation = rotation
+        self.writer = writer
+        self.pending = []
+        self.pending_size = 0
+        self.flush_timer = None
+        self.captures = 0
+        self.closing = False
+        self.dropped = 0
+        if file is None:
+            # Appending, restarts keep what previous processes wrote
+            file = open(path, mode="ab")
+        self.file = file
+        self.size = 0 if not file.seekable() else file.tell()
+        self.opened_at = time.monotonic()
+
+    def write(self, data: bytes):
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if BATCH_SIZE <= self.pending_size:
+            self.flush()
+        elif self.flush_timer is None:
+            timer_wheel = get_timer_wheel()
+            self.flush_timer = timer_wheel.schedule(BATCH_DELAY, self.flush)
+
+    def flush(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+
+        if self.pending_size == 0:
+            return
+
+        data = b"".join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+
+        if self.dropped != 0:
+            message = f"\n[taskmaster: dropped {self.dropped} bytes]\n"
+            data = message.encode() + data
+
+        if self.writer.submit(self, data):
+            self.dropped = 0
+        else:
+            self.dropped += len(data)
+
+    def close(self):
+        """Close once every capture writing to it is done."""
+        self.closing = True
+        if self.captures == 0:
+            self.flush()
+            self.writer.submit_close(self)
+
+    # Writer thread side
+
+    def append(self, data: bytes):
+        if self.should_rotate():
+            self.rotate()
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+
+    def should_rotate(self) -> bool:
+        if self.size == 0 or not self.file.seekable():
+            return False
+        max_size = self.rotation.max_size
+        if max_size is not None and max_size <= self.size:
+            return True
+        max_age = self.rotation.max_age
+        age = time.monotonic() - self.opened_at
+        return max_age is not None and max_age.total_seconds() <= age
+
+    def segment(self, index: int) -> str:
+        suffix = ".gz" if self.rotation.compress else ""
+        return f"{self.path}.{index}{suffix}"
+
+    def rotate(self):
+        self.file.close()
+
+        keep = self.rotation.keep
+        if keep == 0:
+            os.remove(self.path)
+        else:
+            # Oldest segment falls off
+            for index in range(keep - 1, 0, -1):
+                if os.path.exists(self.segment(index)):
+                    os.replace(self.segment(index), self.segment(index + 1))
+
+            if self.rotation.compress:
+                with open(self.path, "rb") as source:
+                    with gzip.open(self.segment(1), "wb") as destination:
+                        shutil.copyfileobj(source, destination)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.segment(1))
+
+        self.file = open(self.path, mode="ab")
+        self.size = 0
+        self.opened_at = time.monotonic()
+
+
+class OutputWriter:
+    """Thread writing batches of output, so the event loop never waits."""
+
+    queue: SimpleQueue[tuple[LogFile, Optional[bytes]]]
+    thread: Optional[threading.Thread]
+    lock: threading.Lock
+    queued_bytes: int
+    # Taskmaster's own stdout/stderr, for output that is not redirected
+    inherited: dict[int, LogFile]
+
+    def __init__(self):
+        self.queue = SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.queued_bytes = 0
+        self.inherited = {}
+
+    def inherited_log_file(self, fd: int) -> LogFile:
+        log_file = self.inherited.get(fd)
+        if log_file is None:
+            file = os.fdopen(os.dup(fd), mode="ab", buffering=0)
+            rotation = LogRotation.build({})
+            log_file = LogFile(f"<fd {fd}>", rotation, self, file)
+            self.inherited[fd] = log_file
+        return log_file
+
+    def submit(self, log_file: LogFile, data: bytes) -> bool:
+        """Queue data to write, False if dropped because of backlog."""
+
+        with self.lock:
+            if MAX_QUEUED_BYTES < self.queued_bytes + len(data):
+                return False
+            self.queued_bytes += len(data)
+
+        self.start()
+        self.queue.put((log_file, data))
+        return True
+
+    def submit_close(self, log_file: LogFile):
+        self.start()
+        self.queue.put((log_file, None))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run, name="output-writer", daemon=True
+            )
+            self.thread.start()
+
+    def run(self):
+        while True:
+            (log_file, data) = self.queue.get()
+            if log_file is None:
+                return
+
+            if data is None:
+                log_file.file.close()
+                continue
+
+            with self.lock:
+                self.queued_bytes -= len(data)
+
+            try:
+                log_file.append(data)
+            except Exception as exception:
+                logger.error(f"Could not write {log_file.path}: {exception}")
+
+    async def close(self):
+        """Write everything queued and stop the thread."""
+
+        if self.thread is not None:
+            self.queue.put((None, None))  # type: ignore
+            await asyncio.to_thread(self.thread.join)
+            self.thread = None
+
+
+class OutputCapture:
+    """
+    Reads a child's pipe from the event loop into a `LogFile` and the
+    instance's `OutputRing`.
+    """
+
+    fd: int
+    log_file: LogFile
+    ring: Optional[OutputRing]
+
+    def __init__(
+        self, fd: int, log_file: LogFile, ring: Optional[OutputRing]
+    ):
+        self.fd = fd
+        self.log_file = log_file
+        self.ring = ring
+        log_file.captures += 1
+        os.set_blocking(fd, False)
+        asyncio.get_running_loop().add_reader(fd, self.on_readable)
+
+    def on_readable(self):
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if len(data) != 0:
+            self.log_file.write(data)
+            if self.ring is not None:
+                self.ring.write(data)
+            return
+
+        # Every writer closed its end of the pipe
+        asyncio.get_running_loop().remove_reader(self.fd)
+        os.close(self.fd)
+        self.log_file.captures -= 1
+        self.log_file.flush()
+        if self.log_file.closing:
+            self.log_file.close()
+
+
+def capture_pipe(log_file: LogFile, ring: Optional[OutputRing]) -> int:
+    """Pipe captured into `log_file`, returns the end to give the child."""
+
+    (read_end, write_end) = os.pipe()
+    try:
+        fcntl.fcntl(write_end, F_SETPIPE_SZ, PIPE_SIZE)
+    except OSError:
+        # Over the user limit, keep the default size
+        pass
+    OutputCapture(read_end, log_file, ring)
+    return write_end
+
+
+output_writers: dict[asyncio.AbstractEventLoop, OutputWriter] = {}
+
+
+def get_output_writer() -> OutputWriter:
+    """Output writer of the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    output_writer = output_writers.get(loop)
+    if output_writer is None:
+        output_writer = OutputWriter()
+        output_writers[loop] = output_writer
+    return output_writer
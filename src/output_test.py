@@ -0,0 +1,50 @@
+from output import OutputRing
+
+
+def test_write_and_read():
+    ring = OutputRing(8)
+    ring.write(b"abc")
+    assert ring.read(0) == b"abc"
+    assert ring.read(1) == b"bc"
+    assert ring.read(3) == b""
+
+
+def test_wraparound():
+    ring = OutputRing(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghij")
+    assert ring.written == 10
+    assert ring.oldest == 2
+    assert ring.read(0) == b"cdefghij"
+    assert ring.read(7) == b"hij"
+    assert ring.buffer == bytearray(b"ijcdefgh")
+
+
+def test_write_larger_than_capacity():
+    ring = OutputRing(4)
+    ring.write(b"ab")
+    ring.write(b"0123456789")
+    assert ring.written == 12
+    assert ring.read(0) == b"6789"
+
+
+def test_wraparound_many_times():
+    ring = OutputRing(5)
+    data = bytes(range(256)) * 3
+    for start in range(0, len(data), 7):
+        ring.write(data[start: start + 7])
+    assert ring.read(0) == data[-5:]
+
+
+def test_tail_offset():
+    ring = OutputRing(16)
+    ring.write(b"one\ntwo\nthree\n")
+    assert ring.read(ring.tail_offset(1)) == b"three\n"
+    assert ring.read(ring.tail_offset(2)) == b"two\nthree\n"
+    assert ring.read(ring.tail_offset(10)) == b"one\ntwo\nthree\n"
+
+    # "one" is overwritten, only its newline is left
+    ring.write(b"four\n")
+    assert ring.read(ring.tail_offset(10)) == b"\ntwo\nthree\nfour\n"
+    assert ring.read(ring.tail_offset(3)) == b"two\nthree\nfour\n"
+    assert ring.read(ring.tail_offset(0)) == b""
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+
+from signal import Signals
+from subprocess import Popen
+from typing import Optional
+from metrics import Counter, registry
+
+
+logger = logging.getLogger(__name__)
+
+EXITS = registry.family(
+    "exits_total", "Processes reaped, by exit code", "code", Counter
+)
+
+
+ORPHAN_SWEEPS = registry.counter(
+    "orphan_sweeps_total",
+    "Process groups that still had processes once their leader was reaped",
+)
+
+
+def kill_group(pgid: int) -> bool:
+    """SIGKILL a process group, False when it is already empty."""
+    try:
+        os.killpg(pgid, Signals.SIGKILL)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class Child:
+    """
+    A spawned process reaped by the `Reaper` instead of asyncio's child
+    watcher.
+
+    It leads a session of its own, so that its signals reach everything it
+    spawned: the pid is also the id of the process group.
+    """
+
+    popen: Popen
+    exited: asyncio.Future[int]
+    # Unix time
+    start_time: float
+
+    def __init__(self, popen: Popen, exited: asyncio.Future[int]):
+        self.popen = popen
+        self.exited = exited
+        self.start_time = time.time()
+
+    @property
+    def pid(self) -> int:
+        return self.popen.pid
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.popen.returncode
+
+    def send_signal(self, signal: Signals):
+        """Signal the whole process group."""
+
+        # Once reaped the pid may belong to someone else
+        if self.returncode is not None:
+            raise ProcessLookupError()
+        os.killpg(self.pid, signal)
+
+    def kill(self):
+        self.send_signal(Signals.SIGKILL)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self.exited)
+
+
+class Reaper:
+    """
+    Reaps every child of the event loop and resolves the matching
+    `Child.exited` future, without any task or thread per process.
+
+    Each child is watched through a pidfd when the platform supports it,
+    otherwise every SIGCHLD triggers a `waitpid(-1)` sweep.
+
+    Whatever is left in the process group of a child once it is reaped is
+    killed right away: orphans would otherwise keep running, holding ports
+    and cgroups, with nothing supervising them. The group id cannot be
+    reused while anything is left in it.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    children: dict[int, Child]
+    pidfds: dict[int, int]
+    # Children we could not open a pidfd for, polled on SIGCHLD
+    unwatched: set[int]
+    use_pidfd: bool
+    handling_sigchld: bool
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.children = {}
+        self.pidfds = {}
+        self.unwatched = set()
+        self.use_pidfd = hasattr(os, "pidfd_open")
+        self.handling_sigchld = False
+
+        if not self.use_pidfd:
+            self.handle_sigchld()
+
+    def handle_sigchld(self):
+        if not self.handling_sigchld:
+            self.loop.add_signal_handler(Signals.SIGCHLD, self.on_sigchld)
+            self.handling_sigchld = True
+
+    def register(self, popen: Popen) -> Child:
+        child = Child(popen, self.loop.create_future())
+        self.children[popen.pid] = child
+
+        if self.use_pidfd:
+            try:
+                pidfd = os.pidfd_open(popen.pid)
+            except OSError as error:
+                logger.warning(f"pidfd_open({popen.pid}): {error}")
+                self.unwatched.add(popen.pid)
+                self.handle_sigchld()
+                # It may already have exited
+                self.poll(popen.pid)
+            else:
+                self.pidfds[popen.pid] = pidfd
+                self.loop.add_reader(pidfd, self.poll, popen.pid)
+
+        return child
+
+    def on_sigchld(self):
+        if not self.use_pidfd:
+            self.sweep()
+        else:
+            for pid in list(self.unwatched):
+                self.poll(pid)
+
+    def sweep(self):
+        """Reap every exited child."""
+
+        while True:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+
+            if pid == 0:
+                return
+
+            self.exited(pid, os.waitstatus_to_exitcode(status))
+
+    def poll(self, pid: int):
+        """Reap a single child if it has exited."""
+
+        try:
+            (reaped, status) = os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            # Reaped behind our back, its status is lost
+            logger.warning(f"Child {pid} was reaped by someone else")
+            self.exited(pid, 255)
+            return
+
+        if reaped != 0:
+            self.exited(pid, os.waitstatus_to_exitcode(status))
+
+    def exited(self, pid: int, exit_code: int):
+        child = self.children.pop(pid, None)
+        if child is None:
+            logger.debug(f"Reaped unknown child {pid}")
+            return
+
+        pidfd = self.pidfds.pop(pid, None)
+        if pidfd is not None:
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self.unwatched.discard(pid)
+
+        child.popen.returncode = exit_code
+        if kill_group(pid):
+            ORPHAN_SWEEPS.inc()
+            logger.debug(f"Killed the processes left behind by {pid}")
+        EXITS.labels(exit_code).inc()
+        if not child.exited.done():
+            child.exited.set_result(exit_code)
+
+    def close(self):
+        for pidfd in self.pidfds.values():
+            self.loop.remove_reader(pidfd)
+            os.close(pidfd)
+        self.pidfds.clear()
+
+        if self.handling_sigchld:
+            self.loop.remove_signal_handler(Signals.SIGCHLD)
+            self.handling_sigchld = False
+
+
+reapers: dict[asyncio.AbstractEventLoop, Reaper] = {}
+
+
+def get_reaper() -> Reaper:
+    """Reaper of the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    reaper = reapers.get(loop)
+    if reaper is None:
+        reaper = Reaper(loop)
+        reapers[loop] = reaper
+    return reaper
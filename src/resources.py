@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+
+from array import array
+from typing import Callable, Iterable, Optional
+from metrics import Family, Gauge, Histogram, registry
+from cgroups import TaskGroup
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two samples of every process
+DEFAULT_SAMPLE_INTERVAL = 5.0
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+# Fields of `/proc/<pid>/stat` past the command name, from the state
+UTIME = 14 - 3
+STIME = 15 - 3
+NUM_THREADS = 20 - 3
+STARTTIME = 22 - 3
+STAT_SIZE = 1024
+
+
+def task_gauges(name: str, help: str) -> Family[Gauge]:
+    return registry.family(name, help, "task", Gauge)
+
+
+CPU_SECONDS = task_gauges(
+    "process_cpu_seconds", "CPU time used by the running processes of a task"
+)
+RESIDENT_BYTES = task_gauges(
+    "process_resident_bytes",
+    "Resident memory of the running processes of a task",
+)
+OPEN_FDS = task_gauges(
+    "process_open_fds",
+    "File descriptors open by the running processes of a task",
+)
+THREAD_COUNT = task_gauges(
+    "process_threads", "Threads of the running processes of a task"
+)
+SAMPLE_TIME: Family[Histogram] = registry.family(
+    "resource_sample_seconds",
+    "Time to sample every process, reading /proc or on the event loop",
+    "part",
+    Histogram,
+)
+TASK_FAMILIES = (CPU_SECONDS, RESIDENT_BYTES, OPEN_FDS, THREAD_COUNT)
+
+# Read from the cgroup of each task, for all its processes at once
+CGROUP_CPU_SECONDS = task_gauges(
+    "cgroup_cpu_seconds", "CPU time used in the cgroup of a task"
+)
+CGROUP_THROTTLED_SECONDS = task_gauges(
+    "cgroup_throttled_seconds",
+    "Time the cgroup of a task was throttled by cpu.max",
+)
+CGROUP_MEMORY_BYTES = task_gauges(
+    "cgroup_memory_bytes", "Memory used in the cgroup of a task"
+)
+CGROUP_MEMORY_HIGH = task_gauges(
+    "cgroup_memory_high_events",
+    "Times the cgroup of a task was throttled by memory.high",
+)
+CGROUP_MEMORY_MAX = task_gauges(
+    "cgroup_memory_max_events",
+    "Times the cgroup of a task was about to go over memory.max",
+)
+CGROUP_OOM_KILLS = task_gauges(
+    "cgroup_oom_kills", "Processes of a task killed by the OOM killer"
+)
+CGROUP_FAMILIES = (
+    CGROUP_CPU_SECONDS,
+    CGROUP_THROTTLED_SECONDS,
+    CGROUP_MEMORY_BYTES,
+    CGROUP_MEMORY_HIGH,
+    CGROUP_MEMORY_MAX,
+    CGROUP_OOM_KILLS,
+)
+
+
+def read_file(path: str) -> bytes:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, STAT_SIZE)
+    finally:
+        os.close(fd)
+
+
+class TaskResources:
+    """
+    Latest usage of each replica of a task, in arrays indexed by replica
+    and only reallocated when the task scales.
+    """
+
+    __slots__ = (
+        "pids",
+        "cpu_seconds",
+        "cpu_percent",
+        "rss_bytes",
+        "fds",
+        "threads",
+    )
+
+    # Process sampled, 0 when there was none
+    pids: array
+    cpu_seconds: array
+    cpu_percent: array
+    rss_bytes: array
+    fds: array
+    threads: array
+
+    def __init__(self, replicas: int = 0):
+        self.pids = array("i")
+        self.cpu_seconds = array("d")
+        self.cpu_percent = array("d")
+        self.rss_bytes = array("q")
+        self.fds = array("i")
+        self.threads = array("i")
+        self.resize(replicas)
+
+    def columns(self) -> tuple[array, ...]:
+        return (
+            self.pids,
+            self.cpu_seconds,
+            self.cpu_percent,
+            self.rss_bytes,
+            self.fds,
+            self.threads,
+        )
+
+    def resize(self, replicas: int):
+        for column in self.columns():
+            if replicas < len(column):
+                del column[replicas:]
+            elif len(column) < replicas:
+                column.extend([0] * (replicas - len(column)))
+
+    def copy_from(self, source: TaskResources, offset: int):
+        """Take the values of as many replicas from `offset` in `source`."""
+        end = offset + len(self.pids)
+        for column, values in zip(self.columns(), source.columns()):
+            column[:] = values[offset:end]
+
+    def sampled(self, index: int, pid: int) -> bool:
+        """Whether the values of a replica are about that process."""
+        return index < len(self.pids) and self.pids[index] == pid != 0
+
+
+# CPU ticks and start time by pid, as of the previous sample
+History = dict[int, tuple[int, int]]
+
+
+def read_all(
+    pids: array,
+    count: int,
+    sample: TaskResources,
+    history: History,
+    elapsed: float,
+) -> History:
+    """
+    Read the first `count` processes of `pids` into the same rows of
+    `sample`, zeros for no pid or a process that is gone. Runs on a worker
+    thread, all the arithmetic included.
+    """
+
+    current: History = {}
+    for index in range(count):
+        pid = pids[index]
+        if pid == 0:
+            sample_none(sample, index)
+            continue
+        try:
+            stat = read_file(f"/proc/{pid}/stat")
+            statm = read_file(f"/proc/{pid}/statm")
+            fds = len(os.listdir(f"/proc/{pid}/fd"))
+            # The command name is in parentheses and may contain anything
+            fields = stat[stat.rindex(b")") + 2:].split()
+            ticks = int(fields[UTIME]) + int(fields[STIME])
+            started = int(fields[STARTTIME])
+            rss_pages = int(statm.split(None, 2)[1])
+            threads = int(fields[NUM_THREADS])
+        except (OSError, ValueError, IndexError):
+            sample_none(sample, index)
+            continue
+
+        previous = history.get(pid)
+        if previous is not None and previous[1] == started and 0 < elapsed:
+            used = (ticks - previous[0]) / CLOCK_TICKS
+            sample.cpu_percent[index] = 100 * used / elapsed
+        else:
+            # First sample of that process
+            sample.cpu_percent[index] = 0.0
+        current[pid] = (ticks, started)
+
+        sample.pids[index] = pid
+        sample.cpu_seconds[index] = ticks / CLOCK_TICKS
+        sample.rss_bytes[index] = rss_pages * PAGE_SIZE
+        sample.fds[index] = fds
+        sample.threads[index] = threads
+    return current
+
+
+def sample_none(sample: TaskResources, index: int):
+    for column in sample.columns():
+        column[index] = 0
+
+
+# Name, usage, pid of each replica of a task (0 for those without a
+# process) and its cgroup
+Processes = tuple[str, TaskResources, list[int], Optional[TaskGroup]]
+ProcessSource = Callable[[], Iterable[Processes]]
+
+
+class ResourceSampler:
+    """
+    Samples the CPU, memory, file descriptors and threads of every running
+    process at a fixed interval.
+
+    Pids are gathered on the event loop, then `/proc` is read for all of
+    them at once on a worker thread, into rows laid out as the replicas of
+    the tasks and kept from one pass to the next. Back on the loop each
+    task copies its rows over. The accounting of the tasks' cgroups is read
+    in the same pass.
+    """
+
+    interval: float
+    processes: ProcessSource
+    pids: array
+    sample: TaskResources
+    history: History
+    # Monotonic time of the previous pass, for the CPU percentage
+    sampled_at: float
+    runner: Optional[asyncio.Task[None]]
+
+    def __init__(
+        self,
+        processes: ProcessSource,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.interval = interval
+        self.processes = processes
+        self.pids = array("i")
+        self.sample = TaskResources()
+        self.history = {}
+        self.sampled_at = 0.0
+        self.runner = None
+
+    def start(self):
+        self.runner = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.runner is not None:
+            self.runner.cancel()
+            self.runner = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sample_all()
+            except Exception as error:
+                logger.error(f"Sampling resources: {error!r}")
+
+    def reserve(self, count: int):
+        if len(self.pids) < count:
+            size = max(count, 2 * len(self.pids))
+            self.pids = array("i", bytes(self.pids.itemsize * size))
+            self.sample.resize(size)
+
+    async def sample_all(self):
+        start = time.perf_counter()
+        tasks = list(self.processes())
+        count = 0
+        for _, _, pids, _ in tasks:
+            count += len(pids)
+        self.reserve(count)
+        offset = 0
+        groups = []
+        for _, _, pids, group in tasks:
+            self.pids[offset: offset + len(pids)] = array("i", pids)
+            offset += len(pids)
+            if group is not None:
+                groups.append(group)
+        gathered = time.perf_counter()
+
+        now = time.monotonic()
+        elapsed = now - self.sampled_at
+        self.sampled_at = now
+        self.history = await asyncio.to_thread(
+            self.read, count, elapsed, groups
+        )
+        read = time.perf_counter()
+
+        self.spread(tasks)
+        done = time.perf_counter()
+
+        SAMPLE_TIME.labels("read").observe(read - gathered)
+        SAMPLE_TIME.labels("loop").observe((gathered - start) + (done - read))
+
+    def read(
+        self, count: int, elapsed: float, groups: list[TaskGroup]
+    ) -> History:
+        """Runs on the worker thread."""
+        history = read_all(
+            self.pids, count, self.sample, self.history, elapsed
+        )
+        for group in groups:
+            group.read_stats()
+        return history
+
+    def spread(self, tasks: list[Processes]):
+        offset = 0
+        names = set()
+        grouped = set()
+        for name, resources, pids, group in tasks:
+            names.add(name)
+            resources.resize(len(pids))
+            resources.copy_from(self.sample, offset)
+            offset += len(pids)
+
+            CPU_SECONDS.labels(name).set(sum(resources.cpu_seconds))
+            RESIDENT_BYTES.labels(name).set(sum(resources.rss_bytes))
+            OPEN_FDS.labels(name).set(sum(resources.fds))
+            THREAD_COUNT.labels(name).set(sum(resources.threads))
+
+            stats = None if group is None else group.stats
+            if stats is not None:
+                grouped.add(name)
+                CGROUP_CPU_SECONDS.labels(name).set(stats.cpu_seconds)
+                CGROUP_THROTTLED_SECONDS.labels(name).set(
+                    stats.throttled_seconds
+                )
+                CGROUP_MEMORY_BYTES.labels(name).set(stats.memory_bytes)
+                CGROUP_MEMORY_HIGH.labels(name).set(stats.memory_high)
+                CGROUP_MEMORY_MAX.labels(name).set(stats.memory_max)
+                CGROUP_OOM_KILLS.labels(name).set(stats.oom_kill)
+
+        # Tasks removed since the previous pass
+        forget(TASK_FAMILIES, names)
+        forget(CGROUP_FAMILIES, grouped)
+
+
+def forget(families: tuple[Family, ...], names: set[str]):
+    """Drop the children of the tasks not in `names`."""
+    for family in families:
+        for name in list(family.children):
+            if name not in names:
+                family.remove(name)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import random
+
+from enum import Enum
+from collections import deque
+from config import CrashLoop, RestartBackoff
+
+
+def backoff_delay(backoff: RestartBackoff, failures: int) -> float:
+    """Seconds to wait before the restart following `failures` failures."""
+
+    if failures <= 0:
+        return 0
+
+    base = backoff.base.total_seconds()
+    maximum = backoff.max.total_seconds()
+    # Cap the exponent so the power does not overflow
+    delay = base * 2 ** min(failures - 1, 64)
+    delay *= 1 + random.uniform(-backoff.jitter, backoff.jitter)
+    # Jitter spreads restarts out, never past the maximum
+    return min(maximum, delay)
+
+
+class BreakerState(Enum):
+    # Restarts allowed
+    CLOSED = "closed"
+    # Restarts paused
+    OPEN = "open"
+    # Pause is over, the next failure opens it again right away
+    HALF_OPEN = "half open"
+
+
+class CircuitBreaker:
+    """Crash loop detection shared by all the instances of a task."""
+
+    crash_loop: CrashLoop
+    failures: deque[float]
+    opened_until: float
+    half_open: bool
+
+    def __init__(self, crash_loop: CrashLoop):
+        self.crash_loop = crash_loop
+        self.failures = deque()
+        self.opened_until = 0
+        self.half_open = False
+
+    def state(self, now: float) -> BreakerState:
+        if now < self.opened_until:
+            return BreakerState.OPEN
+        if self.half_open:
+            return BreakerState.HALF_OPEN
+        return BreakerState.CLOSED
+
+    def remaining_pause(self, now: float) -> float:
+        return max(0, self.opened_until - now)
+
+    def record_failure(self, now: float):
+        match self.state(now):
+            case BreakerState.OPEN:
+                return
+            case BreakerState.HALF_OPEN:
+                self.open(now)
+                return
+
+        window = self.crash_loop.window.total_seconds()
+        self.failures.append(now)
+        while self.failures[0] < now - window:
+            self.failures.popleft()
+
+        if self.crash_loop.max_failures <= len(self.failures):
+            self.open(now)
+
+    def record_success(self, now: float):
+        if self.state(now) == BreakerState.HALF_OPEN:
+            self.half_open = False
+
+    def open(self, now: float):
+        self.opened_until = now + self.crash_loop.pause.total_seconds()
+        self.half_open = True
+        self.failures.clear()
+
+    def describe(self, now: float) -> str:
+        match self.state(now):
+            case BreakerState.OPEN:
+                remaining = self.remaining_pause(now)
+                return f"crash loop, restarts paused for {remaining:.1f}s"
+            case state:
+                return f"crash loop breaker {state.value}"
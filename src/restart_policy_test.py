@@ -0,0 +1,75 @@
+import pytest
+
+from config import CrashLoop, RestartBackoff
+from restart_policy import BreakerState, CircuitBreaker, backoff_delay
+
+
+def backoff(**fields) -> RestartBackoff:
+    return RestartBackoff.build({"base": 1, "max": 10, **fields})
+
+
+def breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        CrashLoop.build({"max_failures": 3, "window": 10, "pause": 30})
+    )
+
+
+@pytest.mark.parametrize(
+    "failures, delay", [(0, 0), (1, 1), (2, 2), (3, 4), (4, 8), (5, 10)]
+)
+def test_backoff_doubles_up_to_max(failures, delay):
+    assert backoff_delay(backoff(jitter=0), failures) == delay
+
+
+def test_backoff_huge_failure_count():
+    assert backoff_delay(backoff(jitter=0), 10**6) == 10
+
+
+def test_backoff_jitter_bounds():
+    for failures in range(1, 10):
+        expected = min(10, 2 ** (failures - 1))
+        for _ in range(100):
+            delay = backoff_delay(backoff(jitter=0.5), failures)
+            assert expected * 0.5 <= delay <= min(10, expected * 1.5)
+
+
+def test_breaker_opens_after_failures_in_window():
+    circuit_breaker = breaker()
+    circuit_breaker.record_failure(0)
+    circuit_breaker.record_failure(1)
+    assert circuit_breaker.state(1) == BreakerState.CLOSED
+    circuit_breaker.record_failure(2)
+    assert circuit_breaker.state(2) == BreakerState.OPEN
+    assert circuit_breaker.remaining_pause(12) == 20
+
+
+def test_breaker_forgets_old_failures():
+    circuit_breaker = breaker()
+    circuit_breaker.record_failure(0)
+    circuit_breaker.record_failure(1)
+    circuit_breaker.record_failure(20)
+    assert circuit_breaker.state(20) == BreakerState.CLOSED
+
+
+def test_breaker_half_open():
+    circuit_breaker = breaker()
+    for now in range(3):
+        circuit_breaker.record_failure(now)
+    # Failures while open are not counted
+    circuit_breaker.record_failure(5)
+    assert circuit_breaker.state(32) == BreakerState.HALF_OPEN
+
+    # The first failure once the pause is over opens it again
+    circuit_breaker.record_failure(33)
+    assert circuit_breaker.state(33) == BreakerState.OPEN
+    assert circuit_breaker.remaining_pause(33) == 30
+
+
+def test_breaker_closes_on_success():
+    circuit_breaker = breaker()
+    for now in range(3):
+        circuit_breaker.record_failure(now)
+    circuit_breaker.record_success(40)
+    assert circuit_breaker.state(40) == BreakerState.CLOSED
+    circuit_breaker.record_failure(41)
+    assert circuit_breaker.state(41) == BreakerState.CLOSED
@@ -1,12 +1,79 @@
+import time
 import grpc
 
 from rpc import command_pb2_grpc
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Iterator, NoReturn
+from output import OutputRing
+from task import Task
 from task_master import TaskMaster
-from rpc.command_pb2 import Target, TaskStatus, Empty
+from timer_wheel import get_timer_wheel
+from restart_policy import BreakerState
+from events import Transition, get_event_bus
+from resources import TaskResources
+from selector import SelectorError
+from command_queue import CommandQueueFull
+from metrics import RPC_LATENCY, registry
+from introspection import (
+    DEFAULT_PROFILE_INTERVAL,
+    MAX_PROFILE_SECONDS,
+    ProfilerBusy,
+    dump_tasks,
+    profiler,
+    slow_callbacks,
+)
+from instance import (
+    Instance,
+    State,
+    StageWithProcess,
+    Starting,
+    BackingOff,
+)
+from rpc.command_pb2 import (
+    Target,
+    TaskStatus,
+    Empty,
+    OutputRequest,
+    Output,
+    StatusFilter,
+    StatusSnapshot,
+    TaskSnapshot,
+    CgroupStats,
+    InstanceStatus,
+    ResourceUsage,
+    WatchEvent,
+    Action,
+    Selector,
+    BatchRequest,
+    BatchResult,
+    TargetResult,
+    Metrics,
+    ReloadResult,
+    TaskDump,
+    TaskDumps,
+    ProfileRequest,
+    Profile,
+    SlowCallbacksRequest,
+    SlowCallback,
+    SlowCallbacks,
+)
+from rpc.command_pb2 import Transition as TransitionMessage
+from rpc.command_pb2 import Stage as StageCode
 from rpc.command_pb2_grpc import RunnerStub, RunnerServicer
 
 DEFAULT_PORT: int = 50051
+# Largest piece of output per streamed message
+OUTPUT_CHUNK_SIZE: int = 64 * 1024
+
+STAGE_CODES: dict[State, StageCode] = {
+    State.NOT_STARTED: StageCode.NOT_STARTED,
+    State.STARTING: StageCode.STARTING,
+    State.RUNNING: StageCode.RUNNING,
+    State.BACKING_OFF: StageCode.BACKING_OFF,
+    State.EXITING: StageCode.EXITING,
+    State.EXITED: StageCode.EXITED,
+    State.OUT_OF_START_ATTEMPTS: StageCode.OUT_OF_START_ATTEMPTS,
+    State.FATAL: StageCode.FATAL,
+}
 
 
 class Client:
@@ -33,8 +100,53 @@ class Client:
     def status(self, task: str, intances: List[int]) -> str:
         return self.stub.status(Target(name=task, instances=intances)).status
 
-    def reload(self):
-        self.stub.reload(Empty())
+    def snapshot(self, tasks: List[str] = []) -> StatusSnapshot:
+        """Status of every instance of `tasks`, or of every task."""
+        return self.stub.snapshot(StatusFilter(names=tasks))
+
+    def watch(self, tasks: List[str] = []):
+        """
+        Stream of `WatchEvent`, a snapshot then every stage transition of
+        `tasks`, or of every task. Cancel it to stop watching.
+        """
+        return self.stub.watch(StatusFilter(names=tasks))
+
+    def tail(
+        self, task: str, instance: int, lines: int = 0
+    ) -> Iterator[bytes]:
+        request = OutputRequest(name=task, instance=instance, lines=lines)
+        for output in self.stub.tail(request):
+            yield output.data
+
+    def follow(self, task: str, instance: int, lines: int = 0):
+        """Stream of `Output`, cancel it to stop following."""
+        request = OutputRequest(name=task, instance=instance, lines=lines)
+        return self.stub.follow(request)
+
+    def batch(self, action: Action, targets: List[Selector]) -> BatchResult:
+        """Apply `action` to every task matching any of `targets`."""
+        return self.stub.batch(BatchRequest(action=action, targets=targets))
+
+    def metrics(self) -> dict[str, float]:
+        return dict(self.stub.metrics(Empty()).values)
+
+    def reload(self) -> ReloadResult:
+        return self.stub.reload(Empty())
+
+    def tasks(self) -> TaskDumps:
+        """Every asyncio task of the daemon, with its stack."""
+        return self.stub.tasks(Empty())
+
+    def profile(self, seconds: float, interval: float = 0) -> Profile:
+        """Sample the daemon's stacks for a while, collapsed."""
+        request = ProfileRequest(seconds=seconds, interval=interval)
+        return self.stub.profile(request, timeout=seconds + 10)
+
+    def slow_callbacks(
+        self, threshold: float = 0, reset: bool = False
+    ) -> SlowCallbacks:
+        request = SlowCallbacksRequest(threshold=threshold, reset=reset)
+        return self.stub.slow_callbacks(request)
 
     def shutdown(self):
         self.stub.shutdown(Empty())
@@ -47,30 +159,91 @@ class Client:
         self.channel.close()
 
 
+async def abort(context, code: grpc.StatusCode, details: str) -> NoReturn:
+    """Fail the call, which `context.abort` does by raising."""
+    await context.abort(code, details)
+    raise AssertionError("context.abort returned")
+
+
 class TaskMasterRunner(RunnerServicer):
     task_master: TaskMaster
 
     def __init__(self, task_master: TaskMaster):
         self.task_master = task_master
 
-    async def start(self, target: Target, _context) -> Empty:
-        await self.task_master.start(target.name, target.instances)
+    async def start(self, target: Target, context) -> Empty:
+        try:
+            await self.task_master.start(target.name, target.instances)
+        except CommandQueueFull as error:
+            await abort(
+                context, grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+            )
         return Empty()
 
-    async def stop(self, target: Target, _context) -> Empty:
-        await self.task_master.stop(target.name, target.instances)
+    async def stop(self, target: Target, context) -> Empty:
+        try:
+            await self.task_master.stop(target.name, target.instances)
+        except CommandQueueFull as error:
+            await abort(
+                context, grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+            )
         return Empty()
 
-    async def restart(self, target: Target, _context) -> Empty:
-        await self.task_master.restart(target.name, target.instances)
+    async def restart(self, target: Target, context) -> Empty:
+        try:
+            await self.task_master.restart(target.name, target.instances)
+        except CommandQueueFull as error:
+            await abort(
+                context, grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+            )
         return Empty()
 
+    async def batch(self, request: BatchRequest, context) -> BatchResult:
+        if len(request.targets) == 0:
+            await abort(
+                context, grpc.StatusCode.INVALID_ARGUMENT, "no task selected"
+            )
+        action = {
+            Action.START: self.task_master.start,
+            Action.STOP: self.task_master.stop,
+            Action.RESTART: self.task_master.restart,
+        }[request.action]
+
+        result = BatchResult()
+        for target in request.targets:
+            target_result = TargetResult(target=target)
+            try:
+                names = self.task_master.select(target.pattern, target.labels)
+            except SelectorError as error:
+                target_result.error = f"invalid selector: {error}"
+                names = []
+            else:
+                if len(names) == 0:
+                    target_result.error = "no matching task"
+
+            for name in names:
+                try:
+                    await action(name, list(target.instances))
+                except CommandQueueFull as error:
+                    target_result.error = str(error)
+                    break
+                target_result.tasks.append(name)
+            result.results.append(target_result)
+        return result
+
     async def status(self, target: Target, _context) -> TaskStatus:
         messages = []
         task = self.task_master.task(target.name)
         if task is None:
             return TaskStatus(status=f"unknown task {target.name}")
 
+        circuit_breaker = task.spawn_context.circuit_breaker
+        now = get_timer_wheel().now()
+        if circuit_breaker.state(now) != BreakerState.CLOSED:
+            messages.append(circuit_breaker.describe(now))
+        if task.halted is not None:
+            messages.append(task.halted)
+
         to_report = target.instances
         if len(to_report) == 0:
             to_report = range(1, len(task.instances) + 1)
@@ -84,6 +257,108 @@ class TaskMasterRunner(RunnerServicer):
 
         return TaskStatus(status=", ".join(messages))
 
+    async def snapshot(
+        self, status_filter: StatusFilter, _context
+    ) -> StatusSnapshot:
+        return self.status_snapshot(status_filter)
+
+    def status_snapshot(self, status_filter: StatusFilter) -> StatusSnapshot:
+        names = status_filter.names
+        if len(names) == 0:
+            names = self.task_master.tasks
+
+        snapshot = StatusSnapshot()
+        for name in names:
+            task = self.task_master.tasks.get(name)
+            if task is None:
+                snapshot.unknown.append(name)
+            else:
+                snapshot.tasks.append(task_snapshot(task))
+        return snapshot
+
+    async def watch(
+        self, status_filter: StatusFilter, _context
+    ) -> AsyncGenerator[WatchEvent, None]:
+        tasks = None
+        if len(status_filter.names) != 0:
+            tasks = frozenset(status_filter.names)
+
+        # Nothing can happen in between, so no transition is missed
+        subscription = get_event_bus().subscribe(tasks)
+        try:
+            yield WatchEvent(snapshot=self.status_snapshot(status_filter))
+
+            while True:
+                transition = await subscription.get()
+                message = transition_message(transition)
+                message.dropped = subscription.dropped
+                message.coalesced = subscription.coalesced
+                subscription.dropped = 0
+                subscription.coalesced = 0
+                yield WatchEvent(transition=message)
+        finally:
+            subscription.close()
+
+    async def output_ring(
+        self, request: OutputRequest, context
+    ) -> OutputRing:
+        task = self.task_master.task(request.name)
+        if task is None:
+            await abort(
+                context,
+                grpc.StatusCode.NOT_FOUND,
+                f"unknown task {request.name}",
+            )
+
+        instance = max(request.instance, 1)
+        if task.instance(instance) is None:
+            await abort(
+                context,
+                grpc.StatusCode.NOT_FOUND,
+                f"unknown instance {instance}",
+            )
+
+        ring = task.spawn_context.for_replica(instance).output_ring()
+        if ring is None:
+            await abort(
+                context,
+                grpc.StatusCode.FAILED_PRECONDITION,
+                f"output of {request.name} is not kept, see output_buffer",
+            )
+        return ring
+
+    async def tail(
+        self, request: OutputRequest, context
+    ) -> AsyncGenerator[Output, None]:
+        ring = await self.output_ring(request, context)
+        offset = ring.oldest
+        if request.lines != 0:
+            offset = ring.tail_offset(request.lines)
+
+        data = ring.read(offset)
+        for start in range(0, len(data), OUTPUT_CHUNK_SIZE):
+            yield Output(data=data[start: start + OUTPUT_CHUNK_SIZE])
+
+    async def follow(
+        self, request: OutputRequest, context
+    ) -> AsyncGenerator[Output, None]:
+        ring = await self.output_ring(request, context)
+        offset = ring.oldest
+        if request.lines != 0:
+            offset = ring.tail_offset(request.lines)
+
+        while True:
+            if offset < ring.oldest:
+                skipped = ring.oldest - offset
+                message = f"\n[taskmaster: skipped {skipped} bytes]\n"
+                yield Output(data=message.encode())
+
+            data = ring.read(offset)
+            offset = ring.written
+            for start in range(0, len(data), OUTPUT_CHUNK_SIZE):
+                yield Output(data=data[start: start + OUTPUT_CHUNK_SIZE])
+
+            await ring.wait_beyond(offset)
 
     async def list(
         self, _arg: Empty, _context
@@ -91,15 +366,201 @@ class TaskMasterRunner(RunnerServicer):
         for name in self.task_master.tasks:
             yield Target(name=name)
 
-    async def reload(self, _arg: Empty, _context) -> Empty:
-        await self.task_master.reload()
-        return Empty()
+    async def metrics(self, _arg: Empty, _context) -> Metrics:
+        return Metrics(values=registry.values())
+
+    async def reload(self, _arg: Empty, context) -> ReloadResult:
+        try:
+            diff = await self.task_master.reload()
+        except CommandQueueFull as error:
+            await abort(
+                context, grpc.StatusCode.RESOURCE_EXHAUSTED, str(error)
+            )
+        except Exception as error:
+            return ReloadResult(error=str(error))
+        return ReloadResult(
+            added=diff.added,
+            removed=diff.removed,
+            changed=diff.changed,
+            unchanged=len(diff.unchanged),
+        )
+
+    async def tasks(self, _arg: Empty, _context) -> TaskDumps:
+        return TaskDumps(
+            tasks=[
+                TaskDump(
+                    name=dump.name, coroutine=dump.coroutine, stack=dump.stack
+                )
+                for dump in dump_tasks()
+            ]
+        )
+
+    async def profile(self, request: ProfileRequest, context) -> Profile:
+        if not 0 < request.seconds <= MAX_PROFILE_SECONDS:
+            await abort(
+                context,
+                grpc.StatusCode.INVALID_ARGUMENT,
+                f"seconds must be in ]0, {MAX_PROFILE_SECONDS}]",
+            )
+        interval = request.interval or DEFAULT_PROFILE_INTERVAL
+        try:
+            (stacks, samples) = await profiler.profile(
+                request.seconds, interval
+            )
+        except ProfilerBusy as error:
+            await abort(context, grpc.StatusCode.ABORTED, str(error))
+        collapsed = "".join(
+            f"{stack} {count}\n" for stack, count in stacks.most_common()
+        )
+        return Profile(collapsed=collapsed, samples=samples)
+
+    async def slow_callbacks(
+        self, request: SlowCallbacksRequest, _context
+    ) -> SlowCallbacks:
+        if request.threshold != 0:
+            slow_callbacks.threshold = request.threshold
+            slow_callbacks.install()
+        result = SlowCallbacks(
+            callbacks=[
+                SlowCallback(
+                    duration=slow.duration,
+                    time=slow.time,
+                    callback=slow.callback,
+                )
+                for slow in slow_callbacks.report()
+            ],
+            count=slow_callbacks.count,
+            threshold=slow_callbacks.threshold,
+        )
+        if request.reset:
+            slow_callbacks.reset()
+        return result
 
     async def shutdown(self, _arg: Empty, _context) -> Empty:
         await self.task_master.shutdown()
         return Empty()
 
 
+def task_snapshot(task: Task) -> TaskSnapshot:
+    snapshot = TaskSnapshot(name=task.name)
+
+    circuit_breaker = task.spawn_context.circuit_breaker
+    now = get_timer_wheel().now()
+    if circuit_breaker.state(now) != BreakerState.CLOSED:
+        snapshot.breaker = circuit_breaker.describe(now)
+    if task.halted is not None:
+        snapshot.rollout = task.halted
+
+    stats = None if task.cgroup is None else task.cgroup.stats
+    if stats is not None:
+        snapshot.cgroup.CopyFrom(
+            CgroupStats(
+                cpu_seconds=stats.cpu_seconds,
+                throttled_seconds=stats.throttled_seconds,
+                throttled_periods=stats.throttled_periods,
+                memory_bytes=stats.memory_bytes,
+                memory_high=stats.memory_high,
+                memory_max=stats.memory_max,
+                oom=stats.oom,
+                oom_kill=stats.oom_kill,
+            )
+        )
+
+    for id, instance in enumerate(task.instances, start=1):
+        status = instance_status(id, instance)
+        if status.pid != 0:
+            add_resources(status, task.resources, id - 1)
+        snapshot.instances.append(status)
+    return snapshot
+
+
+def add_resources(
+    status: InstanceStatus, resources: TaskResources, index: int
+):
+    """Usage of the status' process, if that is the one last sampled."""
+
+    if not resources.sampled(index, status.pid):
+        return
+    status.resources.CopyFrom(
+        ResourceUsage(
+            cpu_seconds=resources.cpu_seconds[index],
+            cpu_percent=resources.cpu_percent[index],
+            rss_bytes=resources.rss_bytes[index],
+            fds=resources.fds[index],
+            threads=resources.threads[index],
+        )
+    )
+
+
+def instance_status(id: int, instance: Instance) -> InstanceStatus:
+    stage = instance.stage
+    status = InstanceStatus(
+        id=id,
+        stage=STAGE_CODES[stage.state],
+        restarts=instance.restarts,
+        description=repr(stage),
+    )
+    if isinstance(stage, StageWithProcess):
+        status.pid = stage.process.pid
+        status.start_time = stage.process.start_time
+    if isinstance(stage, (Starting, BackingOff)):
+        status.attempt = stage.attempt
+    if instance.last_exit_code is not None:
+        status.last_exit_code = instance.last_exit_code
+    return status
+
+
+def transition_message(transition: Transition) -> TransitionMessage:
+    message = TransitionMessage(
+        task=transition.task,
+        instance=transition.instance,
+        old_stage=STAGE_CODES[transition.old_stage.state],
+        new_stage=STAGE_CODES[transition.new_stage.state],
+        time=transition.time,
+        description=repr(transition.new_stage),
+    )
+    if transition.exit_code is not None:
+        message.exit_code = transition.exit_code
+    return message
+
+
+class LatencyInterceptor(grpc.aio.ServerInterceptor):
+    """Times the methods answering with a single message."""
+
+    # Wrapped once per method
+    handlers: dict[str, grpc.RpcMethodHandler]
+
+    def __init__(self):
+        self.handlers = {}
+
+    async def intercept_service(self, continuation, details):
+        handler = self.handlers.get(details.method)
+        if handler is None:
+            handler = await continuation(details)
+            if handler is None:
+                return None
+            if not handler.response_streaming:
+                handler = timed(handler, details.method.rsplit("/", 1)[-1])
+            self.handlers[details.method] = handler
+        return handler
+
+
+def timed(handler: grpc.RpcMethodHandler, method: str):
+    histogram = RPC_LATENCY.labels(method)
+    behavior = handler.unary_unary or handler.stream_unary
+
+    async def timed_behavior(request, context):
+        start = time.perf_counter()
+        try:
+            return await behavior(request, context)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    if handler.unary_unary is not None:
+        return handler._replace(unary_unary=timed_behavior)
+    return handler._replace(stream_unary=timed_behavior)
+
+
 class Server:
     runner: TaskMasterRunner
 
@@ -107,7 +568,7 @@ class Server:
         self.runner = TaskMasterRunner(task_master)
 
     async def serve(self, port: int = DEFAULT_PORT):
-        server = grpc.aio.server()
+        server = grpc.aio.server(interceptors=(LatencyInterceptor(),))
         command_pb2_grpc.add_RunnerServicer_to_server(self.runner, server)
         server.add_insecure_port(f"localhost:{port}")
         await server.start()
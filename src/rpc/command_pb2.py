@@ -26,17 +26,71 @@ from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 from google.protobuf.empty_pb2 import *
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11rpc/command.proto\x12\nTaskMaster\x1a\x1bgoogle/protobuf/empty.proto\")\n\x06Target\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x11\n\tinstances\x18\x02 \x03(\r\"\x1c\n\nTaskStatus\x12\x0e\n\x06status\x18\x01 \x01(\t2\x8a\x03\n\x06Runner\x12\x33\n\x05start\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12\x32\n\x04stop\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12\x35\n\x07restart\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12\x38\n\x06reload\x12\x16.google.protobuf.Empty\x1a\x16.google.protobuf.Empty\x12:\n\x08shutdown\x12\x16.google.protobuf.Empty\x1a\x16.google.protobuf.Empty\x12\x34\n\x04list\x12\x16.google.protobuf.Empty\x1a\x12.TaskMaster.Target0\x01\x12\x34\n\x06status\x12\x12.TaskMaster.Target\x1a\x16.TaskMaster.TaskStatusP\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11rpc/command.proto\x12\nTaskMaster\x1a\x1bgoogle/protobuf/empty.proto\")\n\x06Target\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x11\n\tinstances\x18\x02 \x03(\r\"\x1c\n\nTaskStatus\x12\x0e\n\x06status\x18\x01 \x01(\t\">\n\rOutputRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08instance\x18\x02 \x01(\r\x12\r\n\x05lines\x18\x03 \x01(\r\"\x16\n\x06Output\x12\x0c\n\x04\x64\x61ta\x18\x01 \x01(\x0c\"\x1d\n\x0cStatusFilter\x12\r\n\x05names\x18\x01 \x03(\t\"\xf5\x01\n\x0eInstanceStatus\x12\n\n\x02id\x18\x01 \x01(\r\x12 \n\x05stage\x18\x02 \x01(\x0e\x32\x11.TaskMaster.Stage\x12\x0b\n\x03pid\x18\x03 \x01(\r\x12\x0f\n\x07\x61ttempt\x18\x04 \x01(\r\x12\x12\n\nstart_time\x18\x05 \x01(\x01\x12\x1b\n\x0elast_exit_code\x18\x06 \x01(\x11H\x00\x88\x01\x01\x12\x10\n\x08restarts\x18\x07 \x01(\r\x12\x13\n\x0b\x64\x65scription\x18\x08 \x01(\t\x12,\n\tresources\x18\t \x01(\x0b\x32\x19.TaskMaster.ResourceUsageB\x11\n\x0f_last_exit_code\"j\n\rResourceUsage\x12\x13\n\x0b\x63pu_seconds\x18\x01 \x01(\x01\x12\x13\n\x0b\x63pu_percent\x18\x02 \x01(\x01\x12\x11\n\trss_bytes\x18\x03 \x01(\x04\x12\x0b\n\x03\x66\x64s\x18\x04 \x01(\r\x12\x0f\n\x07threads\x18\x05 \x01(\r\"\x96\x01\n\x0cTaskSnapshot\x12\x0c\n\x04name\x18\x01 \x01(\t\x12-\n\tinstances\x18\x02 \x03(\x0b\x32\x1a.TaskMaster.InstanceStatus\x12\x0f\n\x07\x62reaker\x18\x03 \x01(\t\x12\'\n\x06\x63group\x18\x04 \x01(\x0b\x32\x17.TaskMaster.CgroupStats\x12\x0f\n\x07rollout\x18\x05 \x01(\t\"\xb6\x01\n\x0b\x43groupStats\x12\x13\n\x0b\x63pu_seconds\x18\x01 \x01(\x01\x12\x19\n\x11throttled_seconds\x18\x02 \x01(\x01\x12\x19\n\x11throttled_periods\x18\x03 \x01(\x04\x12\x14\n\x0cmemory_bytes\x18\x04 \x01(\x04\x12\x13\n\x0bmemory_high\x18\x05 \x01(\x04\x12\x12\n\nmemory_max\x18\x06 \x01(\x04\x12\x0b\n\x03oom\x18\x07 \x01(\x04\x12\x10\n\x08oom_kill\x18\x08 \x01(\x04\"J\n\x0eStatusSnapshot\x12\'\n\x05tasks\x18\x01 \x03(\x0b\x32\x18.TaskMaster.TaskSnapshot\x12\x0f\n\x07unknown\x18\x02 \x03(\t\"\xe5\x01\n\nTransition\x12\x0c\n\x04task\x18\x01 \x01(\t\x12\x10\n\x08instance\x18\x02 \x01(\r\x12$\n\told_stage\x18\x03 \x01(\x0e\x32\x11.TaskMaster.Stage\x12$\n\tnew_stage\x18\x04 \x01(\x0e\x32\x11.TaskMaster.Stage\x12\x0c\n\x04time\x18\x05 \x01(\x01\x12\x16\n\texit_code\x18\x06 \x01(\x11H\x00\x88\x01\x01\x12\x13\n\x0b\x64\x65scription\x18\x07 \x01(\t\x12\x0f\n\x07\x64ropped\x18\x08 \x01(\r\x12\x11\n\tcoalesced\x18\t \x01(\rB\x0c\n\n_exit_code\"s\n\nWatchEvent\x12.\n\x08snapshot\x18\x01 \x01(\x0b\x32\x1a.TaskMaster.StatusSnapshotH\x00\x12,\n\ntransition\x18\x02 \x01(\x0b\x32\x16.TaskMaster.TransitionH\x00\x42\x07\n\x05\x65vent\">\n\x08Selector\x12\x0f\n\x07pattern\x18\x01 \x01(\t\x12\x0e\n\x06labels\x18\x02 \x01(\t\x12\x11\n\tinstances\x18\x03 \x03(\r\"Y\n\x0c\x42\x61tchRequest\x12\"\n\x06\x61\x63tion\x18\x01 \x01(\x0e\x32\x12.TaskMaster.Action\x12%\n\x07targets\x18\x02 \x03(\x0b\x32\x14.TaskMaster.Selector\"R\n\x0cTargetResult\x12$\n\x06target\x18\x01 \x01(\x0b\x32\x14.TaskMaster.Selector\x12\r\n\x05tasks\x18\x02 \x03(\t\x12\r\n\x05\x65rror\x18\x03 \x01(\t\"8\n\x0b\x42\x61tchResult\x12)\n\x07results\x18\x01 \x03(\x0b\x32\x18.TaskMaster.TargetResult\"i\n\x07Metrics\x12/\n\x06values\x18\x01 \x03(\x0b\x32\x1f.TaskMaster.Metrics.ValuesEntry\x1a-\n\x0bValuesEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x01:\x02\x38\x01\"a\n\x0cReloadResult\x12\r\n\x05\x61\x64\x64\x65\x64\x18\x01 \x03(\t\x12\x0f\n\x07removed\x18\x02 \x03(\t\x12\x0f\n\x07\x63hanged\x18\x03 \x03(\t\x12\x11\n\tunchanged\x18\x04 \x01(\r\x12\r\n\x05\x65rror\x18\x05 \x01(\t\":\n\x08TaskDump\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x11\n\tcoroutine\x18\x02 \x01(\t\x12\r\n\x05stack\x18\x03 \x01(\t\"0\n\tTaskDumps\x12#\n\x05tasks\x18\x01 \x03(\x0b\x32\x14.TaskMaster.TaskDump\"3\n\x0eProfileRequest\x12\x0f\n\x07seconds\x18\x01 \x01(\x01\x12\x10\n\x08interval\x18\x02 \x01(\x01\"-\n\x07Profile\x12\x11\n\tcollapsed\x18\x01 \x01(\t\x12\x0f\n\x07samples\x18\x02 \x01(\r\"8\n\x14SlowCallbacksRequest\x12\x11\n\tthreshold\x18\x01 \x01(\x01\x12\r\n\x05reset\x18\x02 \x01(\x08\"@\n\x0cSlowCallback\x12\x10\n\x08\x64uration\x18\x01 \x01(\x01\x12\x0c\n\x04time\x18\x02 \x01(\x01\x12\x10\n\x08\x63\x61llback\x18\x03 \x01(\t\"^\n\rSlowCallbacks\x12+\n\tcallbacks\x18\x01 \x03(\x0b\x32\x18.TaskMaster.SlowCallback\x12\r\n\x05\x63ount\x18\x02 \x01(\x04\x12\x11\n\tthreshold\x18\x03 \x01(\x01*\x83\x01\n\x05Stage\x12\x0f\n\x0bNOT_STARTED\x10\x00\x12\x0c\n\x08STARTING\x10\x01\x12\x0b\n\x07RUNNING\x10\x02\x12\x0f\n\x0b\x42\x41\x43KING_OFF\x10\x03\x12\x0b\n\x07\x45XITING\x10\x04\x12\n\n\x06\x45XITED\x10\x05\x12\x19\n\x15OUT_OF_START_ATTEMPTS\x10\x06\x12\t\n\x05\x46\x41TAL\x10\x07**\n\x06\x41\x63tion\x12\t\n\x05START\x10\x00\x12\x08\n\x04STOP\x10\x01\x12\x0b\n\x07RESTART\x10\x02\x32\xb6\x07\n\x06Runner\x12\x33\n\x05start\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12\x32\n\x04stop\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12\x35\n\x07restart\x12\x12.TaskMaster.Target\x1a\x16.google.protobuf.Empty\x12:\n\x06reload\x12\x16.google.protobuf.Empty\x1a\x18.TaskMaster.ReloadResult\x12:\n\x08shutdown\x12\x16.google.protobuf.Empty\x1a\x16.google.protobuf.Empty\x12\x34\n\x04list\x12\x16.google.protobuf.Empty\x1a\x12.TaskMaster.Target0\x01\x12\x34\n\x06status\x12\x12.TaskMaster.Target\x1a\x16.TaskMaster.TaskStatus\x12\x37\n\x04tail\x12\x19.TaskMaster.OutputRequest\x1a\x12.TaskMaster.Output0\x01\x12\x39\n\x06\x66ollow\x12\x19.TaskMaster.OutputRequest\x1a\x12.TaskMaster.Output0\x01\x12@\n\x08snapshot\x12\x18.TaskMaster.StatusFilter\x1a\x1a.TaskMaster.StatusSnapshot\x12;\n\x05watch\x12\x18.TaskMaster.StatusFilter\x1a\x16.TaskMaster.WatchEvent0\x01\x12:\n\x05\x62\x61tch\x12\x18.TaskMaster.BatchRequest\x1a\x17.TaskMaster.BatchResult\x12\x36\n\x07metrics\x12\x16.google.protobuf.Empty\x1a\x13.TaskMaster.Metrics\x12\x36\n\x05tasks\x12\x16.google.protobuf.Empty\x1a\x15.TaskMaster.TaskDumps\x12:\n\x07profile\x12\x1a.TaskMaster.ProfileRequest\x1a\x13.TaskMaster.Profile\x12M\n\x0eslow_callbacks\x12 .TaskMaster.SlowCallbacksRequest\x1a\x19.TaskMaster.SlowCallbacksP\x00\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'rpc.command_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_METRICS_VALUESENTRY']._loaded_options = None
+  _globals['_METRICS_VALUESENTRY']._serialized_options = b'8\001'
+  _globals['_STAGE']._serialized_start=2307
+  _globals['_STAGE']._serialized_end=2438
+  _globals['_ACTION']._serialized_start=2440
+  _globals['_ACTION']._serialized_end=2482
   _globals['_TARGET']._serialized_start=62
   _globals['_TARGET']._serialized_end=103
   _globals['_TASKSTATUS']._serialized_start=105
   _globals['_TASKSTATUS']._serialized_end=133
-  _globals['_RUNNER']._serialized_start=136
-  _globals['_RUNNER']._serialized_end=530
+  _globals['_OUTPUTREQUEST']._serialized_start=135
+  _globals['_OUTPUTREQUEST']._serialized_end=197
+  _globals['_OUTPUT']._serialized_start=199
+  _globals['_OUTPUT']._serialized_end=221
+  _globals['_STATUSFILTER']._serialized_start=223
+  _globals['_STATUSFILTER']._serialized_end=252
+  _globals['_INSTANCESTATUS']._serialized_start=255
+  _globals['_INSTANCESTATUS']._serialized_end=500
+  _globals['_RESOURCEUSAGE']._serialized_start=502
+  _globals['_RESOURCEUSAGE']._serialized_end=608
+  _globals['_TASKSNAPSHOT']._serialized_start=611
+  _globals['_TASKSNAPSHOT']._serialized_end=761
+  _globals['_CGROUPSTATS']._serialized_start=764
+  _globals['_CGROUPSTATS']._serialized_end=946
+  _globals['_STATUSSNAPSHOT']._serialized_start=948
+  _globals['_STATUSSNAPSHOT']._serialized_end=1022
+  _globals['_TRANSITION']._serialized_start=1025
+  _globals['_TRANSITION']._serialized_end=1254
+  _globals['_WATCHEVENT']._serialized_start=1256
+  _globals['_WATCHEVENT']._serialized_end=1371
+  _globals['_SELECTOR']._serialized_start=1373
+  _globals['_SELECTOR']._serialized_end=1435
+  _globals['_BATCHREQUEST']._serialized_start=1437
+  _globals['_BATCHREQUEST']._serialized_end=1526
+  _globals['_TARGETRESULT']._serialized_start=1528
+  _globals['_TARGETRESULT']._serialized_end=1610
+  _globals['_BATCHRESULT']._serialized_start=1612
+  _globals['_BATCHRESULT']._serialized_end=1668
+  _globals['_METRICS']._serialized_start=1670
+  _globals['_METRICS']._serialized_end=1775
+  _globals['_METRICS_VALUESENTRY']._serialized_start=1730
+  _globals['_METRICS_VALUESENTRY']._serialized_end=1775
+  _globals['_RELOADRESULT']._serialized_start=1777
+  _globals['_RELOADRESULT']._serialized_end=1874
+  _globals['_TASKDUMP']._serialized_start=1876
+  _globals['_TASKDUMP']._serialized_end=1934
+  _globals['_TASKDUMPS']._serialized_start=1936
+  _globals['_TASKDUMPS']._serialized_end=1984
+  _globals['_PROFILEREQUEST']._serialized_start=1986
+  _globals['_PROFILEREQUEST']._serialized_end=2037
+  _globals['_PROFILE']._serialized_start=2039
+  _globals['_PROFILE']._serialized_end=2084
+  _globals['_SLOWCALLBACKSREQUEST']._serialized_start=2086
+  _globals['_SLOWCALLBACKSREQUEST']._serialized_end=2142
+  _globals['_SLOWCALLBACK']._serialized_start=2144
+  _globals['_SLOWCALLBACK']._serialized_end=2208
+  _globals['_SLOWCALLBACKS']._serialized_start=2210
+  _globals['_SLOWCALLBACKS']._serialized_end=2304
+  _globals['_RUNNER']._serialized_start=2485
+  _globals['_RUNNER']._serialized_end=3435
 # @@protoc_insertion_point(module_scope)
@@ -1,12 +1,41 @@
 from google.protobuf import empty_pb2 as _empty_pb2
 from google.protobuf.internal import containers as _containers
+from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Iterable as _Iterable, Optional as _Optional
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 from google.protobuf.empty_pb2 import Empty as Empty
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
+class Stage(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = ()
+    NOT_STARTED: _ClassVar[Stage]
+    STARTING: _ClassVar[Stage]
+    RUNNING: _ClassVar[Stage]
+    BACKING_OFF: _ClassVar[Stage]
+    EXITING: _ClassVar[Stage]
+    EXITED: _ClassVar[Stage]
+    OUT_OF_START_ATTEMPTS: _ClassVar[Stage]
+    FATAL: _ClassVar[Stage]
+
+class Action(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
+    __slots__ = ()
+    START: _ClassVar[Action]
+    STOP: _ClassVar[Action]
+    RESTART: _ClassVar[Action]
+NOT_STARTED: Stage
+STARTING: Stage
+RUNNING: Stage
+BACKING_OFF: Stage
+EXITING: Stage
+EXITED: Stage
+OUT_OF_START_ATTEMPTS: Stage
+FATAL: Stage
+START: Action
+STOP: Action
+RESTART: Action
+
 class Target(_message.Message):
     __slots__ = ("name", "instances")
     NAME_FIELD_NUMBER: _ClassVar[int]
@@ -20,3 +49,254 @@ class TaskStatus(_message.Message):
     STATUS_FIELD_NUMBER: _ClassVar[int]
     status: str
     def __init__(self, status: _Optional[str] = ...) -> None: ...
+
+class OutputRequest(_message.Message):
+    __slots__ = ("name", "instance", "lines")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    INSTANCE_FIELD_NUMBER: _ClassVar[int]
+    LINES_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    instance: int
+    lines: int
+    def __init__(self, name: _Optional[str] = ..., instance: _Optional[int] = ..., lines: _Optional[int] = ...) -> None: ...
+
+class Output(_message.Message):
+    __slots__ = ("data",)
+    DATA_FIELD_NUMBER: _ClassVar[int]
+    data: bytes
+    def __init__(self, data: _Optional[bytes] = ...) -> None: ...
+
+class StatusFilter(_message.Message):
+    __slots__ = ("names",)
+    NAMES_FIELD_NUMBER: _ClassVar[int]
+    names: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, names: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class InstanceStatus(_message.Message):
+    __slots__ = ("id", "stage", "pid", "attempt", "start_time", "last_exit_code", "restarts", "description", "resources")
+    ID_FIELD_NUMBER: _ClassVar[int]
+    STAGE_FIELD_NUMBER: _ClassVar[int]
+    PID_FIELD_NUMBER: _ClassVar[int]
+    ATTEMPT_FIELD_NUMBER: _ClassVar[int]
+    START_TIME_FIELD_NUMBER: _ClassVar[int]
+    LAST_EXIT_CODE_FIELD_NUMBER: _ClassVar[int]
+    RESTARTS_FIELD_NUMBER: _ClassVar[int]
+    DESCRIPTION_FIELD_NUMBER: _ClassVar[int]
+    RESOURCES_FIELD_NUMBER: _ClassVar[int]
+    id: int
+    stage: Stage
+    pid: int
+    attempt: int
+    start_time: float
+    last_exit_code: int
+    restarts: int
+    description: str
+    resources: ResourceUsage
+    def __init__(self, id: _Optional[int] = ..., stage: _Optional[_Union[Stage, str]] = ..., pid: _Optional[int] = ..., attempt: _Optional[int] = ..., start_time: _Optional[float] = ..., last_exit_code: _Optional[int] = ..., restarts: _Optional[int] = ..., description: _Optional[str] = ..., resources: _Optional[_Union[ResourceUsage, _Mapping]] = ...) -> None: ...
+
+class ResourceUsage(_message.Message):
+    __slots__ = ("cpu_seconds", "cpu_percent", "rss_bytes", "fds", "threads")
+    CPU_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    CPU_PERCENT_FIELD_NUMBER: _ClassVar[int]
+    RSS_BYTES_FIELD_NUMBER: _ClassVar[int]
+    FDS_FIELD_NUMBER: _ClassVar[int]
+    THREADS_FIELD_NUMBER: _ClassVar[int]
+    cpu_seconds: float
+    cpu_percent: float
+    rss_bytes: int
+    fds: int
+    threads: int
+    def __init__(self, cpu_seconds: _Optional[float] = ..., cpu_percent: _Optional[float] = ..., rss_bytes: _Optional[int] = ..., fds: _Optional[int] = ..., threads: _Optional[int] = ...) -> None: ...
+
+class TaskSnapshot(_message.Message):
+    __slots__ = ("name", "instances", "breaker", "cgroup", "rollout")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    INSTANCES_FIELD_NUMBER: _ClassVar[int]
+    BREAKER_FIELD_NUMBER: _ClassVar[int]
+    CGROUP_FIELD_NUMBER: _ClassVar[int]
+    ROLLOUT_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    instances: _containers.RepeatedCompositeFieldContainer[InstanceStatus]
+    breaker: str
+    cgroup: CgroupStats
+    rollout: str
+    def __init__(self, name: _Optional[str] = ..., instances: _Optional[_Iterable[_Union[InstanceStatus, _Mapping]]] = ..., breaker: _Optional[str] = ..., cgroup: _Optional[_Union[CgroupStats, _Mapping]] = ..., rollout: _Optional[str] = ...) -> None: ...
+
+class CgroupStats(_message.Message):
+    __slots__ = ("cpu_seconds", "throttled_seconds", "throttled_periods", "memory_bytes", "memory_high", "memory_max", "oom", "oom_kill")
+    CPU_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    THROTTLED_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    THROTTLED_PERIODS_FIELD_NUMBER: _ClassVar[int]
+    MEMORY_BYTES_FIELD_NUMBER: _ClassVar[int]
+    MEMORY_HIGH_FIELD_NUMBER: _ClassVar[int]
+    MEMORY_MAX_FIELD_NUMBER: _ClassVar[int]
+    OOM_FIELD_NUMBER: _ClassVar[int]
+    OOM_KILL_FIELD_NUMBER: _ClassVar[int]
+    cpu_seconds: float
+    throttled_seconds: float
+    throttled_periods: int
+    memory_bytes: int
+    memory_high: int
+    memory_max: int
+    oom: int
+    oom_kill: int
+    def __init__(self, cpu_seconds: _Optional[float] = ..., throttled_seconds: _Optional[float] = ..., throttled_periods: _Optional[int] = ..., memory_bytes: _Optional[int] = ..., memory_high: _Optional[int] = ..., memory_max: _Optional[int] = ..., oom: _Optional[int] = ..., oom_kill: _Optional[int] = ...) -> None: ...
+
+class StatusSnapshot(_message.Message):
+    __slots__ = ("tasks", "unknown")
+    TASKS_FIELD_NUMBER: _ClassVar[int]
+    UNKNOWN_FIELD_NUMBER: _ClassVar[int]
+    tasks: _containers.RepeatedCompositeFieldContainer[TaskSnapshot]
+    unknown: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, tasks: _Optional[_Iterable[_Union[TaskSnapshot, _Mapping]]] = ..., unknown: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class Transition(_message.Message):
+    __slots__ = ("task", "instance", "old_stage", "new_stage", "time", "exit_code", "description", "dropped", "coalesced")
+    TASK_FIELD_NUMBER: _ClassVar[int]
+    INSTANCE_FIELD_NUMBER: _ClassVar[int]
+    OLD_STAGE_FIELD_NUMBER: _ClassVar[int]
+    NEW_STAGE_FIELD_NUMBER: _ClassVar[int]
+    TIME_FIELD_NUMBER: _ClassVar[int]
+    EXIT_CODE_FIELD_NUMBER: _ClassVar[int]
+    DESCRIPTION_FIELD_NUMBER: _ClassVar[int]
+    DROPPED_FIELD_NUMBER: _ClassVar[int]
+    COALESCED_FIELD_NUMBER: _ClassVar[int]
+    task: str
+    instance: int
+    old_stage: Stage
+    new_stage: Stage
+    time: float
+    exit_code: int
+    description: str
+    dropped: int
+    coalesced: int
+    def __init__(self, task: _Optional[str] = ..., instance: _Optional[int] = ..., old_stage: _Optional[_Union[Stage, str]] = ..., new_stage: _Optional[_Union[Stage, str]] = ..., time: _Optional[float] = ..., exit_code: _Optional[int] = ..., description: _Optional[str] = ..., dropped: _Optional[int] = ..., coalesced: _Optional[int] = ...) -> None: ...
+
+class WatchEvent(_message.Message):
+    __slots__ = ("snapshot", "transition")
+    SNAPSHOT_FIELD_NUMBER: _ClassVar[int]
+    TRANSITION_FIELD_NUMBER: _ClassVar[int]
+    snapshot: StatusSnapshot
+    transition: Transition
+    def __init__(self, snapshot: _Optional[_Union[StatusSnapshot, _Mapping]] = ..., transition: _Optional[_Union[Transition, _Mapping]] = ...) -> None: ...
+
+class Selector(_message.Message):
+    __slots__ = ("pattern", "labels", "instances")
+    PATTERN_FIELD_NUMBER: _ClassVar[int]
+    LABELS_FIELD_NUMBER: _ClassVar[int]
+    INSTANCES_FIELD_NUMBER: _ClassVar[int]
+    pattern: str
+    labels: str
+    instances: _containers.RepeatedScalarFieldContainer[int]
+    def __init__(self, pattern: _Optional[str] = ..., labels: _Optional[str] = ..., instances: _Optional[_Iterable[int]] = ...) -> None: ...
+
+class BatchRequest(_message.Message):
+    __slots__ = ("action", "targets")
+    ACTION_FIELD_NUMBER: _ClassVar[int]
+    TARGETS_FIELD_NUMBER: _ClassVar[int]
+    action: Action
+    targets: _containers.RepeatedCompositeFieldContainer[Selector]
+    def __init__(self, action: _Optional[_Union[Action, str]] = ..., targets: _Optional[_Iterable[_Union[Selector, _Mapping]]] = ...) -> None: ...
+
+class TargetResult(_message.Message):
+    __slots__ = ("target", "tasks", "error")
+    TARGET_FIELD_NUMBER: _ClassVar[int]
+    TASKS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    target: Selector
+    tasks: _containers.RepeatedScalarFieldContainer[str]
+    error: str
+    def __init__(self, target: _Optional[_Union[Selector, _Mapping]] = ..., tasks: _Optional[_Iterable[str]] = ..., error: _Optional[str] = ...) -> None: ...
+
+class BatchResult(_message.Message):
+    __slots__ = ("results",)
+    RESULTS_FIELD_NUMBER: _ClassVar[int]
+    results: _containers.RepeatedCompositeFieldContainer[TargetResult]
+    def __init__(self, results: _Optional[_Iterable[_Union[TargetResult, _Mapping]]] = ...) -> None: ...
+
+class Metrics(_message.Message):
+    __slots__ = ("values",)
+    class ValuesEntry(_message.Message):
+        __slots__ = ("key", "value")
+        KEY_FIELD_NUMBER: _ClassVar[int]
+        VALUE_FIELD_NUMBER: _ClassVar[int]
+        key: str
+        value: float
+        def __init__(self, key: _Optional[str] = ..., value: _Optional[float] = ...) -> None: ...
+    VALUES_FIELD_NUMBER: _ClassVar[int]
+    values: _containers.ScalarMap[str, float]
+    def __init__(self, values: _Optional[_Mapping[str, float]] = ...) -> None: ...
+
+class ReloadResult(_message.Message):
+    __slots__ = ("added", "removed", "changed", "unchanged", "error")
+    ADDED_FIELD_NUMBER: _ClassVar[int]
+    REMOVED_FIELD_NUMBER: _ClassVar[int]
+    CHANGED_FIELD_NUMBER: _ClassVar[int]
+    UNCHANGED_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    added: _containers.RepeatedScalarFieldContainer[str]
+    removed: _containers.RepeatedScalarFieldContainer[str]
+    changed: _containers.RepeatedScalarFieldContainer[str]
+    unchanged: int
+    error: str
+    def __init__(self, added: _Optional[_Iterable[str]] = ..., removed: _Optional[_Iterable[str]] = ..., changed: _Optional[_Iterable[str]] = ..., unchanged: _Optional[int] = ..., error: _Optional[str] = ...) -> None: ...
+
+class TaskDump(_message.Message):
+    __slots__ = ("name", "coroutine", "stack")
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    COROUTINE_FIELD_NUMBER: _ClassVar[int]
+    STACK_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    coroutine: str
+    stack: str
+    def __init__(self, name: _Optional[str] = ..., coroutine: _Optional[str] = ..., stack: _Optional[str] = ...) -> None: ...
+
+class TaskDumps(_message.Message):
+    __slots__ = ("tasks",)
+    TASKS_FIELD_NUMBER: _ClassVar[int]
+    tasks: _containers.RepeatedCompositeFieldContainer[TaskDump]
+    def __init__(self, tasks: _Optional[_Iterable[_Union[TaskDump, _Mapping]]] = ...) -> None: ...
+
+class ProfileRequest(_message.Message):
+    __slots__ = ("seconds", "interval")
+    SECONDS_FIELD_NUMBER: _ClassVar[int]
+    INTERVAL_FIELD_NUMBER: _ClassVar[int]
+    seconds: float
+    interval: float
+    def __init__(self, seconds: _Optional[float] = ..., interval: _Optional[float] = ...) -> None: ...
+
+class Profile(_message.Message):
+    __slots__ = ("collapsed", "samples")
+    COLLAPSED_FIELD_NUMBER: _ClassVar[int]
+    SAMPLES_FIELD_NUMBER: _ClassVar[int]
+    collapsed: str
+    samples: int
+    def __init__(self, collapsed: _Optional[str] = ..., samples: _Optional[int] = ...) -> None: ...
+
+class SlowCallbacksRequest(_message.Message):
+    __slots__ = ("threshold", "reset")
+    THRESHOLD_FIELD_NUMBER: _ClassVar[int]
+    RESET_FIELD_NUMBER: _ClassVar[int]
+    threshold: float
+    reset: bool
+    def __init__(self, threshold: _Optional[float] = ..., reset: bool = ...) -> None: ...
+
+class SlowCallback(_message.Message):
+    __slots__ = ("duration", "time", "callback")
+    DURATION_FIELD_NUMBER: _ClassVar[int]
+    TIME_FIELD_NUMBER: _ClassVar[int]
+    CALLBACK_FIELD_NUMBER: _ClassVar[int]
+    duration: float
+    time: float
+    callback: str
+    def __init__(self, duration: _Optional[float] = ..., time: _Optional[float] = ..., callback: _Optional[str] = ...) -> None: ...
+
+class SlowCallbacks(_message.Message):
+    __slots__ = ("callbacks", "count", "threshold")
+    CALLBACKS_FIELD_NUMBER: _ClassVar[int]
+    COUNT_FIELD_NUMBER: _ClassVar[int]
+    THRESHOLD_FIELD_NUMBER: _ClassVar[int]
+    callbacks: _containers.RepeatedCompositeFieldContainer[SlowCallback]
+    count: int
+    threshold: float
+    def __init__(self, callbacks: _Optional[_Iterable[_Union[SlowCallback, _Mapping]]] = ..., count: _Optional[int] = ..., threshold: _Optional[float] = ...) -> None: ...
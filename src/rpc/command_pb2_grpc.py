@@ -53,7 +53,7 @@ class RunnerStub(object):
         self.reload = channel.unary_unary(
                 '/TaskMaster.Runner/reload',
                 request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
-                response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                response_deserializer=rpc_dot_command__pb2.ReloadResult.FromString,
                 _registered_method=True)
         self.shutdown = channel.unary_unary(
                 '/TaskMaster.Runner/shutdown',
@@ -70,6 +70,51 @@ class RunnerStub(object):
                 request_serializer=rpc_dot_command__pb2.Target.SerializeToString,
                 response_deserializer=rpc_dot_command__pb2.TaskStatus.FromString,
                 _registered_method=True)
+        self.tail = channel.unary_stream(
+                '/TaskMaster.Runner/tail',
+                request_serializer=rpc_dot_command__pb2.OutputRequest.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.Output.FromString,
+                _registered_method=True)
+        self.follow = channel.unary_stream(
+                '/TaskMaster.Runner/follow',
+                request_serializer=rpc_dot_command__pb2.OutputRequest.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.Output.FromString,
+                _registered_method=True)
+        self.snapshot = channel.unary_unary(
+                '/TaskMaster.Runner/snapshot',
+                request_serializer=rpc_dot_command__pb2.StatusFilter.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.StatusSnapshot.FromString,
+                _registered_method=True)
+        self.watch = channel.unary_stream(
+                '/TaskMaster.Runner/watch',
+                request_serializer=rpc_dot_command__pb2.StatusFilter.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.WatchEvent.FromString,
+                _registered_method=True)
+        self.batch = channel.unary_unary(
+                '/TaskMaster.Runner/batch',
+                request_serializer=rpc_dot_command__pb2.BatchRequest.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.BatchResult.FromString,
+                _registered_method=True)
+        self.metrics = channel.unary_unary(
+                '/TaskMaster.Runner/metrics',
+                request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.Metrics.FromString,
+                _registered_method=True)
+        self.tasks = channel.unary_unary(
+                '/TaskMaster.Runner/tasks',
+                request_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.TaskDumps.FromString,
+                _registered_method=True)
+        self.profile = channel.unary_unary(
+                '/TaskMaster.Runner/profile',
+                request_serializer=rpc_dot_command__pb2.ProfileRequest.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.Profile.FromString,
+                _registered_method=True)
+        self.slow_callbacks = channel.unary_unary(
+                '/TaskMaster.Runner/slow_callbacks',
+                request_serializer=rpc_dot_command__pb2.SlowCallbacksRequest.SerializeToString,
+                response_deserializer=rpc_dot_command__pb2.SlowCallbacks.FromString,
+                _registered_method=True)
 
 
 class RunnerServicer(object):
@@ -117,6 +162,60 @@ class RunnerServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def tail(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def follow(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def snapshot(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def watch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def batch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def metrics(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def tasks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def profile(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def slow_callbacks(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_RunnerServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -138,7 +237,7 @@ def add_RunnerServicer_to_server(servicer, server):
             'reload': grpc.unary_unary_rpc_method_handler(
                     servicer.reload,
                     request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                    response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+                    response_serializer=rpc_dot_command__pb2.ReloadResult.SerializeToString,
             ),
             'shutdown': grpc.unary_unary_rpc_method_handler(
                     servicer.shutdown,
@@ -155,6 +254,51 @@ def add_RunnerServicer_to_server(servicer, server):
                     request_deserializer=rpc_dot_command__pb2.Target.FromString,
                     response_serializer=rpc_dot_command__pb2.TaskStatus.SerializeToString,
             ),
+            'tail': grpc.unary_stream_rpc_method_handler(
+                    servicer.tail,
+                    request_deserializer=rpc_dot_command__pb2.OutputRequest.FromString,
+                    response_serializer=rpc_dot_command__pb2.Output.SerializeToString,
+            ),
+            'follow': grpc.unary_stream_rpc_method_handler(
+                    servicer.follow,
+                    request_deserializer=rpc_dot_command__pb2.OutputRequest.FromString,
+                    response_serializer=rpc_dot_command__pb2.Output.SerializeToString,
+            ),
+            'snapshot': grpc.unary_unary_rpc_method_handler(
+                    servicer.snapshot,
+                    request_deserializer=rpc_dot_command__pb2.StatusFilter.FromString,
+                    response_serializer=rpc_dot_command__pb2.StatusSnapshot.SerializeToString,
+            ),
+            'watch': grpc.unary_stream_rpc_method_handler(
+                    servicer.watch,
+                    request_deserializer=rpc_dot_command__pb2.StatusFilter.FromString,
+                    response_serializer=rpc_dot_command__pb2.WatchEvent.SerializeToString,
+            ),
+            'batch': grpc.unary_unary_rpc_method_handler(
+                    servicer.batch,
+                    request_deserializer=rpc_dot_command__pb2.BatchRequest.FromString,
+                    response_serializer=rpc_dot_command__pb2.BatchResult.SerializeToString,
+            ),
+            'metrics': grpc.unary_unary_rpc_method_handler(
+                    servicer.metrics,
+                    request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                    response_serializer=rpc_dot_command__pb2.Metrics.SerializeToString,
+            ),
+            'tasks': grpc.unary_unary_rpc_method_handler(
+                    servicer.tasks,
+                    request_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                    response_serializer=rpc_dot_command__pb2.TaskDumps.SerializeToString,
+            ),
+            'profile': grpc.unary_unary_rpc_method_handler(
+                    servicer.profile,
+                    request_deserializer=rpc_dot_command__pb2.ProfileRequest.FromString,
+                    response_serializer=rpc_dot_command__pb2.Profile.SerializeToString,
+            ),
+            'slow_callbacks': grpc.unary_unary_rpc_method_handler(
+                    servicer.slow_callbacks,
+                    request_deserializer=rpc_dot_command__pb2.SlowCallbacksRequest.FromString,
+                    response_serializer=rpc_dot_command__pb2.SlowCallbacks.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'TaskMaster.Runner', rpc_method_handlers)
@@ -263,7 +407,7 @@ class Runner(object):
             target,
             '/TaskMaster.Runner/reload',
             google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
-            google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+            rpc_dot_command__pb2.ReloadResult.FromString,
             options,
             channel_credentials,
             insecure,
@@ -354,3 +498,246 @@ class Runner(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def tail(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/TaskMaster.Runner/tail',
+            rpc_dot_command__pb2.OutputRequest.SerializeToString,
+            rpc_dot_command__pb2.Output.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def follow(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/TaskMaster.Runner/follow',
+            rpc_dot_command__pb2.OutputRequest.SerializeToString,
+            rpc_dot_command__pb2.Output.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def snapshot(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/snapshot',
+            rpc_dot_command__pb2.StatusFilter.SerializeToString,
+            rpc_dot_command__pb2.StatusSnapshot.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def watch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/TaskMaster.Runner/watch',
+            rpc_dot_command__pb2.StatusFilter.SerializeToString,
+            rpc_dot_command__pb2.WatchEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def batch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/batch',
+            rpc_dot_command__pb2.BatchRequest.SerializeToString,
+            rpc_dot_command__pb2.BatchResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def metrics(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/metrics',
+            google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            rpc_dot_command__pb2.Metrics.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def tasks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/tasks',
+            google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            rpc_dot_command__pb2.TaskDumps.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def profile(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/profile',
+            rpc_dot_command__pb2.ProfileRequest.SerializeToString,
+            rpc_dot_command__pb2.Profile.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def slow_callbacks(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/TaskMaster.Runner/slow_callbacks',
+            rpc_dot_command__pb2.SlowCallbacksRequest.SerializeToString,
+            rpc_dot_command__pb2.SlowCallbacks.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import fnmatch
+
+from typing import Optional
+
+
+# Characters making a task name a glob
+GLOB_CHARACTERS = frozenset("*?[")
+
+
+class SelectorError(Exception):
+    pass
+
+
+class Requirement:
+    """One term of a label selector: `key=value`, `key!=value` or `key`."""
+
+    key: str
+    # None when only the key has to be there
+    value: Optional[str]
+    negated: bool
+
+    def __init__(self, key: str, value: Optional[str], negated: bool):
+        self.key = key
+        self.value = value
+        self.negated = negated
+
+    @staticmethod
+    def parse(term: str) -> Requirement:
+        if "!=" in term:
+            (key, value) = term.split("!=", 1)
+            negated = True
+        elif "=" in term:
+            (key, value) = term.split("=", 1)
+            # Also accept `==`
+            value = value.removeprefix("=")
+            negated = False
+        else:
+            (key, value) = (term, None)
+            negated = term.startswith("!")
+            key = key.removeprefix("!")
+
+        key = key.strip()
+        if key == "":
+            raise SelectorError(f"missing label in {term!r}")
+        if value is not None:
+            value = value.strip()
+        return Requirement(key, value, negated)
+
+
+def parse_labels(selector: str) -> list[Requirement]:
+    """Comma separated requirements, all of them have to be met."""
+    return [
+        Requirement.parse(term)
+        for term in selector.split(",")
+        if term.strip() != ""
+    ]
+
+
+class LabelIndex:
+    """Names of the tasks having each label, and each label value."""
+
+    names: set[str]
+    labels: dict[str, dict[str, str]]
+    by_key: dict[str, set[str]]
+    by_label: dict[tuple[str, str], set[str]]
+
+    def __init__(self):
+        self.names = set()
+        self.labels = {}
+        self.by_key = {}
+        self.by_label = {}
+
+    def add(self, name: str, labels: dict[str, str]):
+        self.remove(name)
+        self.names.add(name)
+        self.labels[name] = labels
+        for key, value in labels.items():
+            self.by_key.setdefault(key, set()).add(name)
+            self.by_label.setdefault((key, value), set()).add(name)
+
+    def remove(self, name: str):
+        labels = self.labels.pop(name, None)
+        if labels is None:
+            return
+        self.names.discard(name)
+        for key, value in labels.items():
+            discard(self.by_key, key, name)
+            discard(self.by_label, (key, value), name)
+
+    def matching(self, requirement: Requirement) -> set[str]:
+        if requirement.value is None:
+            names = self.by_key.get(requirement.key, set())
+        else:
+            label = (requirement.key, requirement.value)
+            names = self.by_label.get(label, set())
+        if requirement.negated:
+            return self.names - names
+        return names
+
+    def select(self, pattern: str = "", labels: str = "") -> list[str]:
+        """
+        Names of the tasks matching a name or glob, and a label selector.
+        Either can be empty, not both: `*` selects every task.
+        """
+
+        selected: Optional[set[str]] = None
+        # Most selective first, the others only filter it down
+        requirements = sorted(
+            parse_labels(labels), key=lambda r: len(self.matching(r))
+        )
+        if pattern == "" and len(requirements) == 0:
+            raise SelectorError("empty selector, use * for every task")
+        for requirement in requirements:
+            names = self.matching(requirement)
+            selected = set(names) if selected is None else selected & names
+
+        if pattern != "":
+            candidates = self.names if selected is None else selected
+            if GLOB_CHARACTERS.isdisjoint(pattern):
+                selected = {pattern} if pattern in candidates else set()
+            else:
+                selected = set(fnmatch.filter(candidates, pattern))
+
+        assert selected is not None
+        return sorted(selected)
+
+
+def discard(index: dict, key, name: str):
+    names = index.get(key)
+    if names is not None:
+        names.discard(name)
+        if len(names) == 0:
+            del index[key]
@@ -0,0 +1,77 @@
+import pytest
+
+from selector import LabelIndex, Requirement, SelectorError, parse_labels
+
+
+def index() -> LabelIndex:
+    labels = LabelIndex()
+    labels.add("web-1", {"tier": "front", "zone": "a"})
+    labels.add("web-2", {"tier": "front", "zone": "b"})
+    labels.add("db", {"tier": "back"})
+    labels.add("cron", {})
+    return labels
+
+
+@pytest.mark.parametrize(
+    "term, key, value, negated",
+    [
+        ("tier=front", "tier", "front", False),
+        ("tier==front", "tier", "front", False),
+        ("tier!=front", "tier", "front", True),
+        (" tier = front ", "tier", "front", False),
+        ("tier", "tier", None, False),
+        ("!tier", "tier", None, True),
+    ],
+)
+def test_requirement_parse(term, key, value, negated):
+    requirement = Requirement.parse(term)
+    assert (requirement.key, requirement.value) == (key, value)
+    assert requirement.negated == negated
+
+
+@pytest.mark.parametrize("term", ["=front", "!=front", "!", " "])
+def test_requirement_missing_key(term):
+    with pytest.raises(SelectorError):
+        Requirement.parse(term)
+
+
+def test_parse_labels_skips_empty_terms():
+    assert [r.key for r in parse_labels("tier=front,, zone")] == [
+        "tier",
+        "zone",
+    ]
+
+
+@pytest.mark.parametrize(
+    "pattern, labels, names",
+    [
+        ("db", "", ["db"]),
+        ("nope", "", []),
+        ("web-*", "", ["web-1", "web-2"]),
+        ("*", "", ["cron", "db", "web-1", "web-2"]),
+        ("", "tier=front", ["web-1", "web-2"]),
+        ("", "tier=front,zone=b", ["web-2"]),
+        ("", "tier!=front", ["cron", "db"]),
+        ("", "!tier", ["cron"]),
+        ("", "zone", ["web-1", "web-2"]),
+        ("w*", "zone=a", ["web-1"]),
+        ("db", "tier=front", []),
+    ],
+)
+def test_select(pattern, labels, names):
+    assert index().select(pattern, labels) == names
+
+
+@pytest.mark.parametrize("labels", ["", " , "])
+def test_select_empty_selector(labels):
+    with pytest.raises(SelectorError):
+        index().select("", labels)
+
+
+def test_select_after_remove():
+    labels = index()
+    labels.remove("web-1")
+    labels.add("db", {"tier": "front"})
+    assert labels.select("", "tier=front") == ["db", "web-2"]
+    assert labels.select("", "tier=back") == []
+    assert labels.by_label.get(("tier", "back")) is None
@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 
 import os
-import rpc
-import asyncio
-import logging
 
-from signal import Signals
-from task_master import TaskMaster
-from argparse import ArgumentParser, Namespace
+# Children exec right away, gRPC's fork handlers are of no use to them and
+# log a line for every process spawned with a `preexec_fn`
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "false")
+
+import rpc  # noqa: E402
+import asyncio  # noqa: E402
+import logging  # noqa: E402
+import metrics  # noqa: E402
+import cgroups  # noqa: E402
+import resources  # noqa: E402
+import introspection  # noqa: E402
+
+from signal import Signals  # noqa: E402
+from task_master import TaskMaster  # noqa: E402
+from spawn_scheduler import DEFAULT_MAX_CONCURRENT_SPAWNS  # noqa: E402
+from argparse import ArgumentParser, Namespace  # noqa: E402
 
 
 cla = ArgumentParser(description="sum the integers at the command line")
@@ -29,6 +39,57 @@ cla.add_argument(
     default=50051,
 )
 
+cla.add_argument(
+    "-m",
+    "--metrics-port",
+    type=int,
+    help="serve Prometheus metrics over http on this port",
+    default=None,
+)
+
+cla.add_argument(
+    "--slow-callback",
+    type=float,
+    help="report event loop callbacks slower than that many seconds,"
+    " 0 (default) to only time them once asked to over rpc, timing every"
+    " callback has a cost",
+    default=0,
+)
+
+cla.add_argument(
+    "--sample-interval",
+    type=float,
+    help="seconds between two samples of the processes' cpu, memory,"
+    " file descriptors and threads, 0 to not sample them",
+    default=resources.DEFAULT_SAMPLE_INTERVAL,
+)
+
+cla.add_argument(
+    "--cgroup",
+    type=str,
+    help="cgroup v2 directory to put each task in a group of its own under,"
+    " `auto` for the one systemd delegated to taskmaster, `none` (default)"
+    " to not use any",
+    default=cgroups.NONE,
+)
+
+cla.add_argument(
+    "-s",
+    "--max-concurrent-spawns",
+    type=int,
+    help="maximum number of processes starting at the same time,"
+    " 0 for no limit",
+    default=DEFAULT_MAX_CONCURRENT_SPAWNS,
+)
+
+cla.add_argument(
+    "-w",
+    "--watch",
+    action="store_true",
+    help="reload when the configuration files change",
+    default=False,
+)
+
 cla.add_argument(
     "--allow-root",
     action="store_true",
@@ -81,9 +142,17 @@ async def start(arguments: Namespace):
 
     logger = logging.getLogger()
 
+    if 0 < arguments.slow_callback:
+        introspection.slow_callbacks.threshold = arguments.slow_callback
+        introspection.slow_callbacks.install()
+
     task_master = TaskMaster(
         logger,
         arguments.config_file,
+        arguments.max_concurrent_spawns,
+        arguments.watch,
+        arguments.sample_interval,
+        arguments.cgroup,
     )
 
     event_loop = asyncio.get_event_loop()
@@ -92,13 +161,17 @@ async def start(arguments: Namespace):
         event_loop.create_task(task_master.shutdown())
 
     def on_sighup():
-        event_loop.create_task(task_master.reload())
+        task_master.request_reload()
 
     event_loop.add_signal_handler(Signals.SIGINT, on_sigint)
     event_loop.add_signal_handler(Signals.SIGHUP, on_sighup)
 
     rpc_server = rpc.Server(task_master)
 
+    metrics_server = None
+    if arguments.metrics_port is not None:
+        metrics_server = await metrics.serve_http(arguments.metrics_port)
+
     task_master_wait = event_loop.create_task(task_master.run())
     serve_rpc = event_loop.create_task(rpc_server.serve(arguments.port))
     (done, pending) = await asyncio.wait(
@@ -122,6 +195,9 @@ async def start(arguments: Namespace):
 
     await asyncio.wait(pending)
 
+    if metrics_server is not None:
+        metrics_server.close()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import os
+import shlex
+
+from typing import Any, Mapping, Optional
+from types import MappingProxyType
+from subprocess import Popen
+from reaper import Child, get_reaper
+from output import LogFile, OutputRing, capture_pipe, get_output_writer
+from dataclasses import dataclass, replace
+from config import TaskDescription, SpawnMode
+from spawn_scheduler import SpawnQueue
+from restart_policy import CircuitBreaker
+from child_setup import ChildSetup
+from cgroups import TaskGroup
+
+
+# Anything that would make bash do more than split words and strip quotes
+SHELL_METACHARACTERS = frozenset("|&;<>()$`\\*?[]{}~#!\n")
+
+# Words that only mean something to a shell, from `compgen -b -k`
+SHELL_BUILTINS = frozenset(
+    ". : [ [[ ]] { } ! alias bg bind break builtin caller case cd command"
+    " compgen complete compopt continue coproc declare dirs disown do done"
+    " echo elif else enable esac eval exec exit export false fc fg fi for"
+    " function getopts hash help history if in jobs kill let local logout"
+    " mapfile popd printf pushd pwd read readarray readonly return select"
+    " set shift shopt source suspend test then time times trap true type"
+    " typeset ulimit umask unalias unset until wait while".split()
+)
+
+
+def shell_arguments(command: str) -> list[str]:
+    return ["/bin/bash", "-c", command]
+
+
+def command_arguments(desc: TaskDescription) -> list[str]:
+    """Argument vector used to spawn the task's program."""
+
+    if desc.exec is not None:
+        return list(desc.exec)
+
+    assert desc.command is not None
+    if desc.spawn_mode == SpawnMode.SHELL:
+        return shell_arguments(desc.command)
+
+    if any(c in SHELL_METACHARACTERS for c in desc.command):
+        return shell_arguments(desc.command)
+
+    try:
+        argv = shlex.split(desc.command)
+    except ValueError:
+        # Unbalanced quotes, let bash report it
+        return shell_arguments(desc.command)
+
+    # Empty commands, builtins and `VAR=value command` need a shell
+    if len(argv) == 0 or argv[0] in SHELL_BUILTINS or "=" in argv[0]:
+        return shell_arguments(desc.command)
+
+    return argv
+
+
+@dataclass(frozen=True)
+class SpawnContext:
+    """
+    Everything needed to spawn a task's process, computed once per
+    description and shared by all its instances.
+    """
+
+    name: str
+    desc: TaskDescription
+    argv: tuple[str, ...]
+    arguments: Mapping[str, Any]
+    # Shared by every instance of the task
+    spawn_queue: SpawnQueue
+    circuit_breaker: CircuitBreaker
+    # Output files by path, opened on first use
+    log_files: dict[str, LogFile]
+    # Recent output by replica, kept across restarts
+    output_rings: dict[int, OutputRing]
+    # Cgroup, affinity, priorities and limits, None when there are none
+    child_setup: Optional[ChildSetup]
+    # Set on the copies given to each instance
+    replica: int = 0
+
+    @staticmethod
+    def build(
+        name: str, desc: TaskDescription, cgroup: Optional[TaskGroup] = None
+    ) -> SpawnContext:
+        # A session and process group of its own, signalled as a whole
+        arguments: dict[str, Any] = {"start_new_session": True}
+        if desc.environment is not None:
+            arguments["env"] = MappingProxyType(
+                os.environ | desc.environment
+            )
+
+        if desc.pwd is not None:
+            # In the arguments it is called `cwd` for current working directory
+            arguments["cwd"] = os.path.abspath(desc.pwd)
+
+        if desc.umask is not None:
+            arguments["umask"] = desc.umask
+
+        return SpawnContext(
+            name=name,
+            desc=desc,
+            argv=tuple(command_arguments(desc)),
+            arguments=MappingProxyType(arguments),
+            spawn_queue=SpawnQueue(desc),
+            circuit_breaker=CircuitBreaker(desc.crash_loop),
+            log_files={},
+            output_rings={},
+            child_setup=ChildSetup.build(desc, cgroup),
+        )
+
+    def with_description(self, desc: TaskDescription) -> SpawnContext:
+        """Same spawn parameters for a description that does not alter them."""
+        self.spawn_queue.update(desc)
+        self.circuit_breaker.crash_loop = desc.crash_loop
+        for log_file in self.log_files.values():
+            log_file.rotation = desc.log_rotation
+        return replace(self, desc=desc)
+
+    def for_replica(self, replica: int) -> SpawnContext:
+        return replace(self, replica=replica)
+
+    def close(self):
+        for log_file in self.log_files.values():
+            log_file.close()
+        self.log_files.clear()
+
+    def output_ring(self) -> Optional[OutputRing]:
+        if self.desc.output_buffer == 0:
+            return None
+
+        ring = self.output_rings.get(self.replica)
+        if ring is None:
+            ring = OutputRing(self.desc.output_buffer)
+            self.output_rings[self.replica] = ring
+        return ring
+
+    def keep_output_rings(self, previous: SpawnContext):
+        """Carry the recent output of a previous context over."""
+
+        for replica, ring in previous.output_rings.items():
+            same_size = ring.capacity == self.desc.output_buffer
+            if replica <= self.desc.replicas and same_size:
+                self.output_rings[replica] = ring
+
+    def log_file(self, template: str) -> LogFile:
+        path = template.format(name=self.name, replica=self.replica)
+        log_file = self.log_files.get(path)
+        if log_file is None:
+            log_file = LogFile(
+                path, self.desc.log_rotation, get_output_writer()
+            )
+            self.log_files[path] = log_file
+        return log_file
+
+    async def create_subprocess(self) -> Child:
+        preexec_fn = None
+        procs = None
+        if self.child_setup is not None:
+            (preexec_fn, procs) = self.child_setup.prepare(self.replica)
+
+        # Output goes through pipes read by the event loop
+        ring = self.output_ring()
+        redirections = (
+            ("stdout", self.desc.stdout, 1),
+            ("stderr", self.desc.stderr, 2),
+        )
+        streams: dict[str, int] = {}
+        try:
+            for stream, template, inherited in redirections:
+                if template is not None:
+                    log_file = self.log_file(template)
+                elif ring is not None:
+                    # Still shows up in taskmaster's own output
+                    writer = get_output_writer()
+                    log_file = writer.inherited_log_file(inherited)
+                else:
+                    continue
+                streams[stream] = capture_pipe(log_file, ring)
+
+            arguments: dict[str, Any] = {**self.arguments, **streams}
+            popen = Popen(self.argv, preexec_fn=preexec_fn, **arguments)
+        finally:
+            # The child has its own copy
+            for fd in streams.values():
+                os.close(fd)
+            if procs is not None:
+                os.close(procs)
+
+        # Reaped by our own reaper rather than asyncio's child watcher
+        return get_reaper().register(popen)
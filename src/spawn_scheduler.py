@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import heapq
+import asyncio
+
+from collections import deque
+from typing import Optional
+from config import TaskDescription
+from timer_wheel import get_timer_wheel
+
+
+# No limit: a permit is held for the whole start timeout, a limit
+# would pace every deployment by it
+DEFAULT_MAX_CONCURRENT_SPAWNS = 0
+
+
+class SpawnPermit:
+    """Right to have one process starting, until released."""
+
+    scheduler: SpawnScheduler
+    released: bool
+
+    def __init__(self, scheduler: SpawnScheduler):
+        self.scheduler = scheduler
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.scheduler.release()
+
+
+class SpawnQueue:
+    """
+    Instances of one task waiting to spawn, with the task's priority and
+    token bucket rate limit (at most one spawn banked).
+    """
+
+    priority: int
+    # Spawns per second, None for unlimited
+    rate: Optional[float]
+    tokens: float
+    last_refill: float
+    waiters: deque[asyncio.Future[SpawnPermit]]
+    # Either in the scheduler's ready heap or waiting for a token
+    scheduled: bool
+
+    def __init__(self, desc: TaskDescription):
+        self.waiters = deque()
+        self.scheduled = False
+        self.tokens = 1
+        self.last_refill = 0
+        self.update(desc)
+
+    def update(self, desc: TaskDescription):
+        self.priority = desc.priority
+        self.rate = desc.spawn_rate
+
+    def refill(self, now: float):
+        if self.rate is not None:
+            elapsed = now - self.last_refill
+            self.tokens = min(1, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def pending(self) -> bool:
+        while len(self.waiters) != 0 and self.waiters[0].done():
+            # Cancelled while waiting
+            self.waiters.popleft()
+        return len(self.waiters) != 0
+
+
+class SpawnScheduler:
+    """
+    Global limit of processes starting at the same time, if any.
+
+    Queues are served by decreasing priority, round robin between queues
+    of the same priority, and each queue is paced by its own rate.
+    """
+
+    # 0 for no limit
+    max_concurrent: int
+    starting: int
+    ready: list[tuple[int, int, SpawnQueue]]
+    # Queues with waiters, ready or waiting for a token
+    queues: set[SpawnQueue]
+    # Tie breaker keeping the heap FIFO within a priority
+    sequence: int
+    dispatching: Optional[asyncio.Handle]
+
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT_SPAWNS):
+        self.max_concurrent = max_concurrent
+        self.starting = 0
+        self.ready = []
+        self.queues = set()
+        self.sequence = 0
+        self.dispatching = None
+
+    def acquire(self, queue: SpawnQueue) -> asyncio.Future[SpawnPermit]:
+        """Future resolved once the caller may spawn, cancel to give up."""
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.waiters.append(waiter)
+        if not queue.scheduled:
+            self.push(queue)
+        self.schedule_dispatch()
+        return waiter
+
+    def release(self):
+        self.starting -= 1
+        self.schedule_dispatch()
+
+    def push(self, queue: SpawnQueue):
+        queue.scheduled = True
+        self.queues.add(queue)
+        self.sequence += 1
+        heapq.heappush(self.ready, (-queue.priority, self.sequence, queue))
+
+    def unpark(self, queue: SpawnQueue):
+        self.push(queue)
+        self.schedule_dispatch()
+
+    def schedule_dispatch(self):
+        """
+        Dispatch once the loop is done with the current callbacks, so
+        requests made at the same time are served by priority.
+        """
+
+        if self.dispatching is None:
+            loop = asyncio.get_running_loop()
+            self.dispatching = loop.call_soon(self.dispatch)
+
+    def dispatch(self):
+        self.dispatching = None
+        timer_wheel = get_timer_wheel()
+        while self.has_room() and len(self.ready) != 0:
+            (_, _, queue) = heapq.heappop(self.ready)
+            if not queue.pending():
+                self.unschedule(queue)
+                continue
+
+            queue.refill(timer_wheel.now())
+            if queue.tokens < 1:
+                # Stays scheduled, back in the heap once a token is there
+                assert queue.rate is not None
+                delay = (1 - queue.tokens) / queue.rate
+                timer_wheel.schedule(delay, self.unpark, queue)
+                continue
+
+            if queue.rate is not None:
+                queue.tokens -= 1
+            self.starting += 1
+            queue.waiters.popleft().set_result(SpawnPermit(self))
+
+            if queue.pending():
+                self.push(queue)
+            else:
+                self.unschedule(queue)
+
+    def has_room(self) -> bool:
+        return self.max_concurrent == 0 or self.starting < self.max_concurrent
+
+    def unschedule(self, queue: SpawnQueue):
+        queue.scheduled = False
+        self.queues.discard(queue)
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "spawn_max_concurrent": self.max_concurrent,
+            "spawn_starting": self.starting,
+            "spawn_waiting": sum(len(queue.waiters) for queue in self.queues),
+        }
+
+
+spawn_schedulers: dict[asyncio.AbstractEventLoop, SpawnScheduler] = {}
+
+
+def get_spawn_scheduler() -> SpawnScheduler:
+    """Spawn scheduler of the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    spawn_scheduler = spawn_schedulers.get(loop)
+    if spawn_scheduler is None:
+        spawn_scheduler = SpawnScheduler()
+        spawn_schedulers[loop] = spawn_scheduler
+    return spawn_scheduler
@@ -0,0 +1,54 @@
+import asyncio
+
+from config import TaskDescription
+from spawn_scheduler import SpawnQueue, SpawnScheduler
+
+
+def queue(**fields) -> SpawnQueue:
+    return SpawnQueue(TaskDescription.build({"command": "true", **fields}))
+
+
+async def settle():
+    # Dispatching happens once the current callbacks are done
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_unlimited_by_default():
+    async def main():
+        scheduler = SpawnScheduler()
+        requests = [scheduler.acquire(queue()) for _ in range(200)]
+        await settle()
+        assert all(request.done() for request in requests)
+        assert scheduler.starting == 200
+
+    asyncio.run(main())
+
+
+def test_limit_until_released():
+    async def main():
+        scheduler = SpawnScheduler(max_concurrent=2)
+        shared = queue()
+        requests = [scheduler.acquire(shared) for _ in range(3)]
+        await settle()
+        assert [request.done() for request in requests] == [True, True, False]
+
+        requests[0].result().release()
+        # Releasing twice gives back a single slot
+        requests[0].result().release()
+        await settle()
+        assert requests[2].done()
+        assert scheduler.starting == 2
+
+    asyncio.run(main())
+
+
+def test_priority_first():
+    async def main():
+        scheduler = SpawnScheduler(max_concurrent=1)
+        low = scheduler.acquire(queue(priority=0))
+        high = scheduler.acquire(queue(priority=10))
+        await settle()
+        assert high.done() and not low.done()
+
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import pytest
+
+from config import TaskDescription
+from spawn import command_arguments
+
+
+def arguments(command: str, **fields) -> list[str]:
+    return command_arguments(
+        TaskDescription.build({"command": command, **fields})
+    )
+
+
+@pytest.mark.parametrize(
+    "command, argv",
+    [
+        ("sleep 10", ["sleep", "10"]),
+        ("  sleep   10 ", ["sleep", "10"]),
+        ("echo-server --port 80", ["echo-server", "--port", "80"]),
+        ("python3 -c 'import this'", ["python3", "-c", "import this"]),
+        ('grep "a b" file', ["grep", "a b", "file"]),
+        ("env A=b cmd", ["env", "A=b", "cmd"]),
+    ],
+)
+def test_exec_directly(command, argv):
+    assert arguments(command) == argv
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        # Builtins and keywords
+        "exit 1",
+        "return",
+        "read line",
+        "export A=b",
+        "cd /tmp",
+        "echo hi",
+        "printf %s hi",
+        "test -f file",
+        "[ -f file ]",
+        "[[ -f file ]]",
+        "shopt -s nullglob",
+        "builtin echo hi",
+        "command -v ls",
+        "local a",
+        "declare -i a",
+        "time sleep 1",
+        "until false",
+        "select a",
+        "coproc cat",
+        "true",
+        # Assignments before the command
+        "VAR=x cmd",
+        "A=b",
+        # Metacharacters
+        "cat file | grep a",
+        "sleep 1 && echo done",
+        "sleep 1; echo done",
+        "echo $HOME",
+        "echo `date`",
+        "ls *.py",
+        "cat < input",
+        "echo a > output",
+        "cd ~",
+        "sleep 1 # comment",
+        "echo a\necho b",
+        # Unbalanced quotes, left to bash to report
+        "echo 'unterminated",
+        'echo "unterminated',
+        # Empty commands
+        "",
+        "   ",
+    ],
+)
+def test_through_shell(command):
+    assert arguments(command) == ["/bin/bash", "-c", command]
+
+
+def test_shell_mode():
+    assert arguments("sleep 10", spawn_mode="shell") == [
+        "/bin/bash",
+        "-c",
+        "sleep 10",
+    ]
+
+
+def test_exec_as_is():
+    argv = ["/bin/echo", "$HOME", "a | b"]
+    desc = TaskDescription.build({"exec": argv})
+    assert command_arguments(desc) == argv
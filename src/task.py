@@ -1,11 +1,16 @@
 import asyncio
 import logging
 
+from collections import deque
 from dataclasses import dataclass
 from instance import Instance
+from spawn import SpawnContext
 from logging import Logger
 from typing import List, Optional
 from config import TaskDescription
+from command_queue import CommandQueue
+from resources import TaskResources
+from cgroups import CgroupTree, TaskGroup
 
 
 class Command:
@@ -30,36 +35,95 @@ class Start(Command):
 class Stop(Command):
     instance: int
 
+
 @dataclass
 class Restart(Command):
     instance: int
 
+
+@dataclass
+class RollingRestart(Command):
+    instances: List[int]
+
+
+def instance_of(command: Command) -> Optional[int]:
+    """Instance a command is about, None for commands about the task."""
+    match command:
+        case Start() | Stop() | Restart():
+            return command.instance
+    return None
+
+
+def merge(pending: Command, command: Command) -> Optional[Command]:
+    """Latest command for an instance wins, but starting is no restart."""
+    if isinstance(pending, Restart) and isinstance(command, Start):
+        return None
+    return command
+
+
 class Task:
     logger: Logger
+    name: str
     desc: TaskDescription
+    spawn_context: SpawnContext
     instances: List[Instance]
-    command_queue: asyncio.Queue[Command]
+    command_queue: CommandQueue[Command]
     shutting_down: bool
-
-    def __init__(self, logger: Logger, desc: TaskDescription):
+    instance_runs: List[asyncio.Task[None]]
+    # Replacements started ahead of the instances they replace
+    surging: set[Instance]
+    # Ongoing rollouts by instance
+    restarting: dict[int, asyncio.Task[None]]
+    # Commands for a restarting instance, run once it is replaced
+    backlog: dict[int, deque[Start | Stop | Restart]]
+    # Latest update, run once the ongoing rollouts are over
+    deferred: Optional[Update]
+    # Why the last rollout stopped short, None unless it did
+    halted: Optional[str]
+    # Latest usage of each replica's process
+    resources: TaskResources
+    # None without a cgroup subtree to put tasks in
+    cgroup: Optional[TaskGroup]
+
+    def __init__(
+        self,
+        logger: Logger,
+        name: str,
+        desc: TaskDescription,
+        cgroup_tree: Optional[CgroupTree] = None,
+    ):
         self.logger = logger
+        self.name = name
         self.desc = desc
-        self.command_queue = asyncio.Queue()
+        self.cgroup = None
+        if cgroup_tree is not None:
+            self.cgroup = cgroup_tree.task_group(name, desc.cgroup, logger)
+        self.spawn_context = SpawnContext.build(name, desc, self.cgroup)
+        self.command_queue = CommandQueue(key=instance_of, merge=merge)
         self.shutting_down = False
         self.instances = []
+        self.instance_runs = []
+        self.surging = set()
+        self.restarting = {}
+        self.backlog = {}
+        self.deferred = None
+        self.halted = None
+        self.resources = TaskResources(desc.replicas)
 
         for _ in range(desc.replicas):
             self.add_instance()
 
-    def add_instance(self) -> Instance:
-        id = len(self.instances) + 1
+    def new_instance(self, id: int) -> Instance:
         logger = logging.getLogger(f"{self.logger.name}:{id}")
-        instance = Instance(self.desc, logger)
+        return Instance(self.spawn_context.for_replica(id), logger)
+
+    def add_instance(self) -> Instance:
+        instance = self.new_instance(len(self.instances) + 1)
         self.instances.append(instance)
         return instance
 
     def stop(self):
-        for instance in self.instances:
+        for instance in [*self.instances, *self.surging]:
             instance.shutdown()
 
     def shutdown(self):
@@ -67,8 +131,17 @@ class Task:
         self.stop()
 
     def update_description(self, desc: TaskDescription):
-        for instance in self.instances:
-            instance.update_description(desc)
+        """Switch to a description that does not require a restart."""
+
+        self.spawn_context = self.spawn_context.with_description(desc)
+        rings = self.spawn_context.output_rings
+        for replica in list(rings):
+            if desc.replicas < replica:
+                del rings[replica]
+        self.desc = desc
+
+        for id, instance in enumerate(self.instances, start=1):
+            instance.update_context(self.spawn_context.for_replica(id))
 
     def instance(self, instance: int) -> Optional[Instance]:
         if 1 <= instance <= len(self.instances):
@@ -76,99 +149,265 @@ class Task:
         self.logger.warn(f"Unknown instance {instance}")
         return None
 
+    def pids(self) -> List[int]:
+        """Pid of each replica, 0 for those without a process."""
+        return [instance.pid for instance in self.instances]
+
     def requires_restart(self, desc: TaskDescription) -> bool:
         return (
             desc.command != self.desc.command
+            or desc.exec != self.desc.exec
+            or desc.spawn_mode != self.desc.spawn_mode
             or desc.stdout != self.desc.stdout
             or desc.stderr != self.desc.stderr
             or desc.environment != self.desc.environment
             or desc.pwd != self.desc.pwd
             or desc.umask != self.desc.umask
+            or desc.cpu_affinity != self.desc.cpu_affinity
+            or desc.nice != self.desc.nice
+            or desc.ionice != self.desc.ionice
+            or desc.rlimits != self.desc.rlimits
         )
 
+    def handle(self, command: Start | Stop | Restart):
+        """Run an instance's command, after its restart if there is one."""
+
+        id = command.instance
+        if id in self.restarting:
+            self.backlog.setdefault(id, deque()).append(command)
+            return
+
+        instance = self.instance(id)
+        if instance is None:
+            return
+
+        match command:
+            case Start():
+                instance.start()
+            case Stop():
+                instance.stop()
+            case Restart():
+                self.roll([id])
+
+    def restart_many(self, ids: List[int]):
+        """Restart instances together, within the rollout limits."""
+
+        to_roll = []
+        for id in ids:
+            if id in self.restarting:
+                self.backlog.setdefault(id, deque()).append(Restart(id))
+            elif self.instance(id) is not None:
+                to_roll.append(id)
+        if len(to_roll) != 0:
+            self.roll(to_roll)
+
+    def roll(
+        self, ids: List[int], previous: Optional[SpawnContext] = None
+    ):
+        """
+        Replace instances in the background, closing the `previous`
+        context they used once done.
+        """
+
+        self.halted = None
+        rollout = asyncio.create_task(self.rollout(ids, previous))
+        for id in ids:
+            self.restarting[id] = rollout
+
+    async def rollout(
+        self, ids: List[int], previous: Optional[SpawnContext]
+    ):
+        settings = self.desc.rollout
+        surge = settings.max_surge
+        unavailable = settings.max_unavailable
+        if unavailable is None:
+            unavailable = len(ids)
+        pending = deque(ids)
+        replacing: dict[asyncio.Task[bool], tuple[int, bool]] = {}
+        halted = False
+
+        while True:
+            while len(pending) != 0 and not halted and not self.shutting_down:
+                # Rather on top of the replicas than in their place
+                if 0 < surge:
+                    surge -= 1
+                    on_top = True
+                elif 0 < unavailable:
+                    unavailable -= 1
+                    on_top = False
+                else:
+                    break
+                id = pending.popleft()
+                replacement = asyncio.create_task(self.replace(id, on_top))
+                replacing[replacement] = (id, on_top)
+
+            if len(replacing) == 0:
+                break
+
+            (done, _) = await asyncio.wait(
+                replacing, return_when=asyncio.FIRST_COMPLETED
+            )
+            for replacement in done:
+                (id, on_top) = replacing.pop(replacement)
+                if on_top:
+                    surge += 1
+                else:
+                    unavailable += 1
+                if not replacement.result() and not halted:
+                    halted = True
+                    self.halted = (
+                        f"rollout halted, instance {id} did not start, "
+                        f"{len(pending)} left as they were"
+                    )
+                    self.logger.error(self.halted)
+                self.replaced(id)
+
+        for id in pending:
+            self.replaced(id)
+        if previous is not None:
+            previous.close()
+
+    async def replace(self, id: int, on_top: bool) -> bool:
+        """Swap an instance for a new one, False if that one did not start."""
+
+        index = id - 1
+        old = self.instances[index]
+        old_run = self.instance_runs[index]
+        was_active = old.is_active()
+
+        if on_top and was_active:
+            new = self.new_instance(id)
+            new_run = asyncio.create_task(new.run())
+            self.surging.add(new)
+            new.start()
+            started = await new.wait_started()
+            if not started or self.shutting_down:
+                self.surging.discard(new)
+                new.shutdown()
+                await new_run
+                return started
+
+            # Still surging until swapped in, so that a shutdown meanwhile
+            # reaches it
+            old.shutdown()
+            await old_run
+            self.surging.discard(new)
+            if self.shutting_down:
+                new.shutdown()
+                await new_run
+                return True
+
+            self.instances[index] = new
+            self.instance_runs[index] = new_run
+            return True
+
+        old.shutdown()
+        await old_run
+        if self.shutting_down:
+            return True
+
+        new = self.new_instance(id)
+        self.instances[index] = new
+        self.instance_runs[index] = asyncio.create_task(new.run())
+        if not was_active:
+            # Stopped instances stay as the description says
+            return True
+        new.start()
+        return await new.wait_started()
+
+    def replaced(self, id: int):
+        del self.restarting[id]
+        backlog = self.backlog.pop(id, deque())
+        if self.shutting_down:
+            return
+
+        # Queued again behind any restart among them
+        for command in backlog:
+            self.handle(command)
+
+        if len(self.restarting) == 0 and self.deferred is not None:
+            self.command_queue.put_nowait(self.deferred, force=True)
+            self.deferred = None
+
+    async def settle(self):
+        """Wait for every ongoing rollout."""
+        while len(self.restarting) != 0:
+            await asyncio.wait(list(self.restarting.values()))
+
+    async def scale_down(self, replicas: int):
+        to_stop = self.instances[replicas:]
+        for instance in to_stop:
+            instance.shutdown()
+
+        if len(to_stop) != 0:
+            await asyncio.wait(self.instance_runs[replicas:])
+
+        del self.instances[replicas:]
+        del self.instance_runs[replicas:]
+        if self.cgroup is not None:
+            await self.cgroup.prune(replicas)
+
+    def scale_up(self):
+        while len(self.instances) < self.desc.replicas:
+            instance = self.add_instance()
+            self.instance_runs.append(asyncio.create_task(instance.run()))
+
+    async def update(self, desc: TaskDescription):
+        self.logger.debug("updating description")
+        await self.scale_down(desc.replicas)
+        if self.cgroup is not None:
+            # Limits change without restarting anything
+            self.cgroup.configure(desc.cgroup)
+        if self.requires_restart(desc):
+            self.logger.info("rolling out new processes")
+            previous = self.spawn_context
+            self.spawn_context = SpawnContext.build(
+                self.name, desc, self.cgroup
+            )
+            self.spawn_context.keep_output_rings(previous)
+            self.desc = desc
+            ids = list(range(1, len(self.instances) + 1))
+            if len(ids) != 0:
+                self.roll(ids, previous)
+            else:
+                previous.close()
+        else:
+            self.logger.info("updating all processes")
+            self.update_description(desc)
+        self.scale_up()
+
     async def run(self):
-        instance_runs = [
+        self.instance_runs = [
             asyncio.create_task(instance.run()) for instance in self.instances
         ]
         while not self.shutting_down:
-            while True:
-                command = await self.command_queue.get()
-                self.logger.debug(f"Command: {command}")
-                match command:
-                    case Start():
-                        command: Start
-                        instance = self.instance(command.instance)
-                        if instance is not None:
-                            instance.start()
-                    case Stop():
-                        command: Stop
-                        instance = self.instance(command.instance)
-                        if instance is not None:
-                            instance.stop()
-                    case Restart():
-                        command: Restart
-                        instance = self.instance(command.instance)
-                        if instance is None:
-                            continue
-
-                        instance.shutdown()
-
-                        index = command.instance - 1
-                        await instance_runs[index]
-                        logger = logging.getLogger(f"{self.logger.name}:{command.instance}")
-                        new_instance = Instance(self.desc, logger)
-                        self.instances[index] = new_instance
-
-                        instance_runs[index] = asyncio.create_task(
-                            new_instance.run()
-                        )
-
-                    case Update():
-                        command: Update
-                        self.logger.debug("updating description")
-                        if self.requires_restart(command.desc):
-                            self.logger.info("restarting all processes")
-                            self.stop()
-                            await asyncio.wait(instance_runs)
-                            self.desc = command.desc
-                            self.instances = []
-                            instance_runs = []
-                            while len(self.instances) < self.desc.replicas:
-                                instance = self.add_instance()
-                                instance_runs.append(
-                                    asyncio.create_task(instance.run())
-                                )
-                        else:
-                            self.logger.info("updating all processes")
-
-                            to_stop = self.instances[
-                                command.desc.replicas: self.desc.replicas
-                            ]
-
-                            for instance in to_stop:
-                                instance.shutdown()
-
-                            if len(to_stop) != 0:
-                                await asyncio.wait(instance_runs[
-                                    command.desc.replicas: self.desc.replicas
-                                ])
-
-                            while command.desc.replicas < len(self.instances):
-                                self.instances.pop()
-
-
-                            self.update_description(command.desc)
-                            self.desc = command.desc
-
-                            while len(self.instances) < self.desc.replicas:
-                                instance = self.add_instance()
-                                instance_runs.append(
-                                    asyncio.create_task(instance.run())
-                                )
-
-                    case Shutdown():
-                        self.logger.info("Shutting down")
-                        self.shutdown()
-                        break
-
-        await asyncio.wait(instance_runs)
+            command = await self.command_queue.get()
+            self.logger.debug(f"Command: {command}")
+            match command:
+                case Start() | Stop() | Restart():
+                    # Instances restart concurrently, without blocking
+                    # commands for the others
+                    self.handle(command)
+
+                case RollingRestart():
+                    command: RollingRestart
+                    self.restart_many(command.instances)
+
+                case Update():
+                    command: Update
+                    if len(self.restarting) != 0:
+                        # Updates replace instances, so they wait for the
+                        # rollouts, without holding up other commands
+                        self.deferred = command
+                    else:
+                        await self.update(command.desc)
+
+                case Shutdown():
+                    self.logger.info("Shutting down")
+                    self.shutdown()
+
+        await self.settle()
+        await asyncio.wait(self.instance_runs)
+        self.spawn_context.close()
+        if self.cgroup is not None:
+            await self.cgroup.remove()
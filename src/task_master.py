@@ -1,20 +1,33 @@
 import asyncio
 import logging
+import cgroups
 import task
 
 from dataclasses import dataclass
 from task import Task
 from logging import Logger
-from typing import Optional, List
-from config import Configuration
+from typing import Iterator, Optional, List
+from config import Configuration, ConfigurationDiff
+from output import get_output_writer
+from timer_wheel import get_timer_wheel
+from metrics import LoopLagMonitor, registry
+from selector import LabelIndex
+from resources import DEFAULT_SAMPLE_INTERVAL, Processes, ResourceSampler
+from config_watcher import ConfigWatcher
+from command_queue import CommandQueue, CommandQueueFull
+from spawn_scheduler import get_spawn_scheduler, DEFAULT_MAX_CONCURRENT_SPAWNS
 
 
 class Command:
     pass
 
 
+@dataclass
 class Reload(Command):
-    pass
+    # What changed, set once the file is loaded
+    diff: Optional[asyncio.Future[ConfigurationDiff]]
+    # Only these files changed, any of them when None
+    files: Optional[set[str]] = None
 
 
 class Shutdown(Command):
@@ -38,32 +51,110 @@ class Restart(Command):
     task: str
     instances: List[int]
 
+
 class TaskMaster:
     config_file: str
+    max_concurrent_spawns: int
+    configuration: Configuration
     tasks: dict[str, Task]
-    command_queue: asyncio.Queue[Command]
+    # Task names by label, kept in sync with `tasks`
+    labels: LabelIndex
+    running_tasks: dict[str, asyncio.Task[None]]
+    # Latest reload, each one waits for the previous
+    reloading: Optional[asyncio.Task[None]]
+    command_queue: CommandQueue[Command]
     logger: Logger
-
-    def __init__(self, logger: Logger, config_file: str):
+    # Reload on changes to the configuration files
+    watch: bool
+    watcher: Optional[ConfigWatcher]
+    # Seconds between two samples of the processes' usage, 0 to not sample
+    sample_interval: float
+    # Cgroup to put tasks under, `auto` for a delegated one or `none`
+    cgroup: str
+    cgroup_tree: Optional[cgroups.CgroupTree]
+
+    def __init__(
+        self,
+        logger: Logger,
+        config_file: str,
+        max_concurrent_spawns: int = DEFAULT_MAX_CONCURRENT_SPAWNS,
+        watch: bool = False,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        cgroup: str = cgroups.NONE,
+    ):
         self.tasks = {}
+        self.labels = LabelIndex()
+        self.running_tasks = {}
+        self.reloading = None
         self.config_file = config_file
-        self.command_queue = asyncio.Queue()
+        self.max_concurrent_spawns = max_concurrent_spawns
+        self.command_queue = CommandQueue()
         self.logger = logger
+        self.watch = watch
+        self.watcher = None
+        self.sample_interval = sample_interval
+        self.cgroup = cgroup
+        self.cgroup_tree = None
 
     async def start(self, name: str, instances: List[int]):
-        await self.command_queue.put(Start(name, instances))
+        self.submit(name, Start(name, instances))
 
     async def stop(self, name: str,  instances: List[int]):
-        await self.command_queue.put(Stop(name, instances))
+        self.submit(name, Stop(name, instances))
 
     async def restart(self, name: str,  instances: List[int]):
-        await self.command_queue.put(Restart(name, instances))
-
-    async def reload(self):
-        await self.command_queue.put(Reload())
+        self.submit(name, Restart(name, instances))
+
+    async def reload(self) -> ConfigurationDiff:
+        """Reload the configuration file, returns what changed in it."""
+        diff = asyncio.get_running_loop().create_future()
+        self.command_queue.put_nowait(Reload(diff))
+        return await diff
+
+    def request_reload(self, files: Optional[set[str]] = None):
+        """Reload without waiting for the outcome, which is logged."""
+        try:
+            self.command_queue.put_nowait(Reload(None, files))
+        except CommandQueueFull as error:
+            self.logger.error(f"Dropped reload: {error}")
+
+    def start_watching(self):
+        self.watcher = ConfigWatcher.create(
+            self.configuration.is_watched, self.request_reload
+        )
+        if self.watcher is None:
+            self.logger.warning("Cannot watch the configuration files")
+        else:
+            self.watcher.watch(self.configuration.watched_directories())
 
     async def shutdown(self):
-        await self.command_queue.put(Shutdown())
+        # Always accepted
+        self.command_queue.put_nowait(Shutdown(), force=True)
+
+    def submit(self, name: str, command: Command):
+        """Queue a command for a task, refused if it is lagging behind."""
+
+        t = self.tasks.get(name)
+        if t is not None and t.command_queue.full():
+            t.command_queue.rejected += 1
+            raise CommandQueueFull(
+                f"{name}: {t.command_queue.qsize()} commands already pending"
+            )
+        self.command_queue.put_nowait(command)
+
+    def metrics(self) -> dict[str, float]:
+        metrics = self.command_queue.metrics()
+        metrics.update(get_spawn_scheduler().metrics())
+        metrics.update(get_timer_wheel().metrics())
+        for t in self.tasks.values():
+            for name, value in t.command_queue.metrics().items():
+                name = f"task_{name}"
+                metrics[name] = metrics.get(name, 0) + value
+        return metrics
+
+    def processes(self) -> Iterator[Processes]:
+        for name, t in self.tasks.items():
+            yield (name, t.resources, t.pids(), t.cgroup)
 
     def task(self, name: str) -> Optional[Task]:
         result = self.tasks.get(name)
@@ -71,122 +162,209 @@ class TaskMaster:
             self.logger.warn(f'Unknown task: "{name}"')
         return result
 
+    def select(self, pattern: str = "", labels: str = "") -> List[str]:
+        """Names of the tasks matching a name or glob and a label selector."""
+        return self.labels.select(pattern, labels)
+
+    def dispatch(self, name: str, instances: List[int], command):
+        """Queue a command for each instance of a task, without waiting."""
+
+        t = self.task(name)
+        if t is None:
+            return
+        if len(instances) == 0:
+            instances = list(range(1, t.desc.replicas + 1))
+        for instance_id in instances:
+            try:
+                t.command_queue.put_nowait(command(instance_id))
+            except CommandQueueFull as error:
+                self.logger.error(f"Dropped {command.__name__}: {error}")
+
+    async def apply(
+        self,
+        new_configuration: Configuration,
+        diff: ConfigurationDiff,
+        previous: Optional[asyncio.Task[None]],
+    ):
+        """Move to a new configuration, once the previous reload is done."""
+
+        if previous is not None:
+            await previous
+
+        to_shutdown = diff.removed
+        to_update = diff.changed
+        to_start = diff.added
+
+        tasks_shutting_down = []
+
+        for name in to_shutdown:
+            self.logger.debug(f"Shutting down {name}")
+            self.tasks[name].command_queue.put_nowait(
+                task.Shutdown(), force=True
+            )
+            tasks_shutting_down.append(self.running_tasks[name])
+
+        for name in to_update:
+            self.logger.debug(f"Updating {name}")
+            command = task.Update(new_configuration.tasks[name])
+            self.tasks[name].command_queue.put_nowait(command, force=True)
+            self.labels.add(name, new_configuration.tasks[name].labels)
+
+        for name in to_start:
+            self.logger.debug(f"Starting {name}")
+            logger = logging.getLogger(f"{self.logger.name}:{name}")
+            self.tasks[name] = Task(
+                logger, name, new_configuration.tasks[name], self.cgroup_tree
+            )
+            self.labels.add(name, new_configuration.tasks[name].labels)
+
+        if len(tasks_shutting_down) != 0:
+            await asyncio.wait(tasks_shutting_down)
+
+        for name in to_shutdown:
+            del self.tasks[name]
+            del self.running_tasks[name]
+            self.labels.remove(name)
+
+        for name in to_start:
+            self.running_tasks[name] = asyncio.create_task(
+                self.tasks[name].run()
+            )
+
     async def run(self):
         self.logger.info("Starting")
 
-        configuration = Configuration.load(self.config_file)
+        get_spawn_scheduler().max_concurrent = self.max_concurrent_spawns
+        self.configuration = Configuration.load(self.config_file)
+
+        self.cgroup_tree = cgroups.CgroupTree.create(self.cgroup)
+
+        # Only once nothing left can fail before the loop below, which
+        # stops them
+        registry.add_collector(self.metrics)
+        loop_lag = LoopLagMonitor()
+        loop_lag.start()
+        sampler = None
+        if 0 < self.sample_interval:
+            sampler = ResourceSampler(self.processes, self.sample_interval)
+            sampler.start()
 
         self.tasks = {
-            name: Task(logging.getLogger(f"{self.logger.name}:{name}"), desc)
-            for name, desc in configuration.tasks.items()
+            name: Task(
+                logging.getLogger(f"{self.logger.name}:{name}"),
+                name,
+                desc,
+                self.cgroup_tree,
+            )
+            for name, desc in self.configuration.tasks.items()
         }
+        for name, desc in self.configuration.tasks.items():
+            self.labels.add(name, desc.labels)
 
-        running_tasks = {
+        self.running_tasks = {
             name: asyncio.create_task(task.run())
             for name, task in self.tasks.items()
         }
 
-        # Handle commands until shutdown
+        if self.watch:
+            self.start_watching()
+
+        # Handle commands until shutdown, none of them waits for processes
         while True:
             command = await self.command_queue.get()
             self.logger.debug(f"Command: {command}")
             match command:
                 case Start():
                     command: Start
-                    t = self.task(command.task)
-                    if t is not None:
-                        if len(command.instances) == 0:
-                            command.instances = list(range(1, t.desc.replicas + 1))
-                        for instance_id in command.instances:
-                            await t.command_queue.put(task.Start(instance_id))
-                    else:
-                        self.logger.warn(f'Unknown "{command.task}"')
+                    self.dispatch(command.task, command.instances, task.Start)
+
                 case Stop():
                     command: Stop
-                    t = self.task(command.task)
-                    if t is not None:
-                        if len(command.instances) == 0:
-                            command.instances = list(range(1, t.desc.replicas + 1))
-                        for instance_id in command.instances :
-                            await t.command_queue.put(task.Stop(instance_id))
-                    else:
-                        self.logger.warn(f'Unknown task "{command.task}"')
-                        continue
+                    self.dispatch(command.task, command.instances, task.Stop)
 
                 case Restart():
-                    command: Stop
+                    command: Restart
                     t = self.task(command.task)
-                    if t is not None:
-                        if len(command.instances) == 0:
-                            command.instances = list(range(1, t.desc.replicas + 1))
-                        for instance_id in command.instances :
-                            await t.command_queue.put(task.Restart(instance_id))
+                    instances = command.instances
+                    if t is not None and len(instances) != 1:
+                        # Together, so the rollout limits hold across them
+                        if len(instances) == 0:
+                            instances = list(range(1, t.desc.replicas + 1))
+                        try:
+                            t.command_queue.put_nowait(
+                                task.RollingRestart(instances)
+                            )
+                        except CommandQueueFull as error:
+                            self.logger.error(f"Dropped restart: {error}")
                     else:
-                        self.logger.warn(f'Unknown task "{command.task}"')
-                        continue
+                        self.dispatch(
+                            command.task, command.instances, task.Restart
+                        )
 
                 case Reload():
                     command: Reload
                     self.logger.info("Reloading")
 
                     try:
-                        new_configuration = Configuration.load(self.config_file)
-                    except Exception as e:
-                        self.logger.error(f"skipping update, could not load config: {e}")
-                        continue
-
-
-                    previous_tasks = set(configuration.tasks.keys())
-                    new_tasks = set(new_configuration.tasks.keys())
-
-                    to_shutdown = previous_tasks.difference(new_tasks)
-                    to_update = previous_tasks.intersection(new_tasks)
-                    to_start = new_tasks.difference(previous_tasks)
-
-                    tasks_shutting_down = []
-
-                    for name in to_shutdown:
-                        self.logger.debug(f"Shutting down {name}")
-                        await self.tasks[name].command_queue.put(
-                            task.Shutdown()
-                        )
-                        tasks_shutting_down.append(running_tasks[name])
-
-                    for name in to_update:
-                        self.logger.debug(f"Updating {name}")
-                        command = task.Update(new_configuration.tasks[name])
-                        await self.tasks[name].command_queue.put(command)
-
-                    for name in to_start:
-                        self.logger.debug(f"Starting {name}")
-                        logger = logging.getLogger(
-                            f"{self.logger.name}:{name}"
+                        new_configuration = Configuration.load(
+                            self.config_file, self.configuration, command.files
                         )
-                        self.tasks[name] = Task(
-                            logger, new_configuration.tasks[name]
+                    except Exception as e:
+                        self.logger.error(
+                            f"skipping update, could not load config: {e}"
                         )
+                        if (
+                            command.diff is not None
+                            and not command.diff.done()
+                        ):
+                            command.diff.set_exception(e)
+                        continue
 
-                    if len(tasks_shutting_down) != 0:
-                        await asyncio.wait(tasks_shutting_down)
-
-                    for name in to_shutdown:
-                        del self.tasks[name]
-                        del running_tasks[name]
-
-                    for name in to_start:
-                        running_tasks[name] = asyncio.create_task(
-                            self.tasks[name].run()
+                    diff = new_configuration.diff(self.configuration)
+                    if command.diff is not None and not command.diff.done():
+                        command.diff.set_result(diff)
+                    if new_configuration is self.configuration:
+                        self.logger.info("Configuration file is unchanged")
+                        continue
+                    self.configuration = new_configuration
+                    if self.watcher is not None:
+                        self.watcher.is_watched = new_configuration.is_watched
+                        self.watcher.watch(
+                            new_configuration.watched_directories()
                         )
+                    if not diff.any():
+                        continue
+                    self.logger.info(
+                        f"added {len(diff.added)}, removed"
+                        f" {len(diff.removed)}, changed {len(diff.changed)},"
+                        f" unchanged {len(diff.unchanged)} tasks"
+                    )
 
-                    configuration = new_configuration
+                    # Removed tasks are waited for in the background
+                    self.reloading = asyncio.create_task(
+                        self.apply(new_configuration, diff, self.reloading)
+                    )
 
                 case Shutdown():
                     self.logger.info("Shutting down")
+                    if self.watcher is not None:
+                        self.watcher.close()
+                        self.watcher = None
+                    if self.reloading is not None:
+                        await self.reloading
                     for t in self.tasks.values():
-                        await t.command_queue.put(task.Shutdown())
+                        t.command_queue.put_nowait(task.Shutdown(), force=True)
                     break
 
         self.logger.debug("Waiting for tasks to return")
-        to_wait = list(running_tasks.values())
+        to_wait = list(self.running_tasks.values())
         if len(to_wait) != 0:
             await asyncio.wait(to_wait)
+
+        self.logger.debug("Flushing output")
+        await get_output_writer().close()
+
+        loop_lag.stop()
+        if sampler is not None:
+            sampler.stop()
+        registry.remove_collector(self.metrics)
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import math
+import asyncio
+
+from typing import Any, Callable, Optional
+
+
+class Timer:
+    """A deadline owned by a `TimerWheel`."""
+
+    __slots__ = ("wheel", "tick", "callback", "args", "bucket")
+
+    wheel: TimerWheel
+    tick: int
+    callback: Callable[..., Any]
+    args: tuple
+    # Bucket the timer is waiting in, None once fired or cancelled
+    bucket: Optional[set[Timer]]
+
+    def __init__(
+        self,
+        wheel: TimerWheel,
+        tick: int,
+        callback: Callable[..., Any],
+        args: tuple,
+    ):
+        self.wheel = wheel
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.bucket = None
+
+    def cancel(self):
+        if self.bucket is not None:
+            self.bucket.discard(self)
+            self.bucket = None
+            self.wheel.removed()
+
+
+class TimerWheel:
+    """
+    Hierarchical timer wheel on the event loop's monotonic clock.
+
+    Level 0 has one bucket per tick, every level above covers `slots`
+    times the span of the one below. Scheduling and cancelling are O(1)
+    and the loop is only woken up when a bucket may need processing.
+    """
+
+    loop: asyncio.AbstractEventLoop
+    resolution: float
+    slots: int
+    levels: list[list[set[Timer]]]
+    origin: float
+    # Last processed tick
+    tick: int
+    depth: int
+    wakeup: Optional[asyncio.TimerHandle]
+    wakeup_tick: int
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        resolution: float = 0.01,
+        slots: int = 256,
+        level_count: int = 4,
+    ):
+        self.loop = loop
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = [
+            [set() for _ in range(slots)] for _ in range(level_count)
+        ]
+        self.origin = loop.time()
+        self.tick = 0
+        self.depth = 0
+        self.wakeup = None
+        self.wakeup_tick = 0
+
+    def now(self) -> float:
+        return self.loop.time()
+
+    def current_tick(self) -> int:
+        return math.floor((self.now() - self.origin) / self.resolution)
+
+    def schedule(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> Timer:
+        """Call `callback(*args)` in `delay` seconds."""
+
+        if self.depth == 0:
+            # Nothing to process in between, skip ahead
+            self.tick = max(self.tick, self.current_tick())
+
+        deadline = self.now() + max(delay, 0)
+        tick = math.ceil((deadline - self.origin) / self.resolution)
+        timer = Timer(self, max(tick, self.tick + 1), callback, args)
+        self.insert(timer)
+        self.depth += 1
+        if self.wakeup is None:
+            self.arm()
+        elif timer.tick < self.wakeup_tick:
+            self.wakeup.cancel()
+            self.wake_at(timer.tick)
+        return timer
+
+    def deadline(self, delay: float) -> asyncio.Future[None]:
+        """Future resolved in `delay` seconds, cancel it to drop the timer."""
+
+        future = self.loop.create_future()
+        timer = self.schedule(delay, resolve, future)
+        future.add_done_callback(lambda _: timer.cancel())
+        return future
+
+    def removed(self):
+        self.depth -= 1
+        if self.depth == 0 and self.wakeup is not None:
+            # Nothing left to wake up for
+            self.wakeup.cancel()
+            self.wakeup = None
+
+    def insert(self, timer: Timer):
+        remaining = timer.tick - self.tick
+        span = 1
+        for level in self.levels[:-1]:
+            if remaining < span * self.slots:
+                break
+            span *= self.slots
+        else:
+            level = self.levels[-1]
+            # Beyond the wheel, parked in the furthest bucket and
+            # reinserted when it cascades
+            remaining = min(remaining, span * self.slots - 1)
+
+        bucket = level[((self.tick + remaining) // span) % self.slots]
+        bucket.add(timer)
+        timer.bucket = bucket
+
+    def arm(self):
+        """Schedule the next wake up of the loop if needed."""
+
+        if self.wakeup is not None or self.depth == 0:
+            return
+
+        # Either the next non empty bucket or the next cascade
+        next_tick = self.tick + self.slots - self.tick % self.slots
+        level = self.levels[0]
+        for offset in range(1, self.slots):
+            if level[(self.tick + offset) % self.slots]:
+                next_tick = min(next_tick, self.tick + offset)
+                break
+
+        self.wake_at(next_tick)
+
+    def wake_at(self, tick: int):
+        when = self.origin + tick * self.resolution
+        self.wakeup = self.loop.call_at(when, self.on_wakeup)
+        self.wakeup_tick = tick
+
+    def on_wakeup(self):
+        self.wakeup = None
+        target = self.current_tick()
+        while self.tick < target and self.depth != 0:
+            self.advance()
+        self.tick = max(self.tick, target)
+        self.arm()
+
+    def advance(self):
+        self.tick += 1
+
+        # Cascade higher levels whose bucket started a new round
+        span = self.slots
+        for level in self.levels[1:]:
+            if self.tick % span != 0:
+                break
+            bucket = level[(self.tick // span) % self.slots]
+            timers = list(bucket)
+            bucket.clear()
+            for timer in timers:
+                self.insert(timer)
+            span *= self.slots
+
+        bucket = self.levels[0][self.tick % self.slots]
+        if not bucket:
+            return
+
+        expired = [timer for timer in bucket if timer.tick <= self.tick]
+        for timer in expired:
+            bucket.discard(timer)
+            timer.bucket = None
+            self.depth -= 1
+            timer.callback(*timer.args)
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "timer_wheel_resolution_seconds": self.resolution,
+            "timer_wheel_depth": self.depth,
+        }
+
+
+def resolve(future: asyncio.Future[None]):
+    if not future.done():
+        future.set_result(None)
+
+
+timer_wheels: dict[asyncio.AbstractEventLoop, TimerWheel] = {}
+
+
+def get_timer_wheel() -> TimerWheel:
+    """Timer wheel of the running event loop."""
+
+    loop = asyncio.get_running_loop()
+    timer_wheel = timer_wheels.get(loop)
+    if timer_wheel is None:
+        timer_wheel = TimerWheel(loop)
+        timer_wheels[loop] = timer_wheel
+    return timer_wheel
@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+
+from typing import cast
+from timer_wheel import TimerWheel
+
+
+class Handle:
+    """Like asyncio.TimerHandle."""
+
+    def __init__(self, when: float):
+        self._when = when
+        self.cancelled = False
+
+    def when(self) -> float:
+        return self._when
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+    """Just enough of an event loop, with a clock moved by hand."""
+
+    def __init__(self):
+        self.now = 100.0
+        self.handles = []
+
+    def time(self) -> float:
+        return self.now
+
+    def call_at(self, when: float, callback):
+        handle = Handle(when)
+        self.handles.append(handle)
+        return handle
+
+
+def wheel(loop: FakeLoop) -> TimerWheel:
+    # 10ms ticks, levels spanning 40ms, 160ms and 640ms
+    return TimerWheel(
+        cast(asyncio.AbstractEventLoop, loop),
+        resolution=0.01,
+        slots=4,
+        level_count=3,
+    )
+
+
+def run_until(loop: FakeLoop, timer_wheel: TimerWheel, until: float):
+    """Wake the wheel up whenever it asked to, as the loop would."""
+    while timer_wheel.wakeup is not None:
+        when = timer_wheel.wakeup.when()
+        if until < when:
+            break
+        # Past it, as a real clock would be by the time the loop wakes up
+        loop.now = when + 1e-9
+        timer_wheel.on_wakeup()
+    loop.now = until
+
+
+@pytest.mark.parametrize(
+    "delay, level, slot",
+    [
+        # Deadlines are rounded up to the next tick
+        (0.005, 0, 1),
+        (0.025, 0, 3),
+        (0.045, 1, 1),
+        (0.145, 1, 3),
+        (0.165, 2, 1),
+        # Beyond the wheel, parked in the furthest bucket
+        (60.0, 2, 3),
+    ],
+)
+def test_bucket_placement(delay, level, slot):
+    loop = FakeLoop()
+    timer_wheel = wheel(loop)
+    timer = timer_wheel.schedule(delay, lambda: None)
+    assert timer.bucket is timer_wheel.levels[level][slot]
+    assert timer_wheel.depth == 1
+
+
+def test_fires_in_order_never_early():
+    loop = FakeLoop()
+    timer_wheel = wheel(loop)
+    fired = []
+
+    def record(delay: float):
+        fired.append((delay, loop.now))
+
+    # One per tick, order within a tick is not kept
+    delays = [0.02, 0.5, 0.05, 0.3, 2.0, 0.035, 0.16]
+    for delay in delays:
+        timer_wheel.schedule(delay, record, delay)
+
+    run_until(loop, timer_wheel, 103.0)
+    assert [delay for delay, _ in fired] == sorted(delays)
+    for delay, when in fired:
+        late = when - (100.0 + delay)
+        assert 0 <= late < 0.01 + 1e-6
+    assert timer_wheel.depth == 0
+    assert timer_wheel.wakeup is None
+
+
+def test_cancel():
+    loop = FakeLoop()
+    timer_wheel = wheel(loop)
+    fired = []
+    timer = timer_wheel.schedule(0.05, fired.append, 1)
+    wakeup = timer_wheel.wakeup
+
+    timer.cancel()
+    assert timer.bucket is None
+    assert timer_wheel.depth == 0
+    # Nothing left to wake up for
+    assert wakeup.cancelled and timer_wheel.wakeup is None
+
+    # Cancelling twice, or once fired, does nothing
+    timer.cancel()
+    assert timer_wheel.depth == 0
+    run_until(loop, timer_wheel, 101.0)
+    assert fired == []
+
+
+def test_cancel_among_others():
+    loop = FakeLoop()
+    timer_wheel = wheel(loop)
+    fired = []
+    kept = timer_wheel.schedule(0.2, fired.append, "kept")
+    cancelled = timer_wheel.schedule(0.2, fired.append, "cancelled")
+    cancelled.cancel()
+    run_until(loop, timer_wheel, 101.0)
+    assert fired == ["kept"]
+    assert kept.bucket is None
+
+
+def test_earlier_timer_rearms():
+    loop = FakeLoop()
+    timer_wheel = wheel(loop)
+    timer_wheel.schedule(0.025, lambda: None)
+    later = timer_wheel.wakeup
+    timer_wheel.schedule(0.005, lambda: None)
+    assert later.cancelled
+    assert timer_wheel.wakeup.when() == pytest.approx(100.01)